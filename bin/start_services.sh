@@ -77,4 +77,27 @@ if [ ! -f "$SANDBOX_PROXY_PID_FILE" ]; then
   fi
 fi
 
+# Groq STT worker: resident Python process used by /transcribe when USE_PY_STT
+# is enabled, so uploads skip interpreter startup and reuse warm connections.
+STT_WORKER_PID_FILE="/tmp/ginto-groq-stt.pid"
+if [ -f "$STT_WORKER_PID_FILE" ]; then
+  WPID=$(cat "$STT_WORKER_PID_FILE")
+  if ps -p "$WPID" > /dev/null 2>&1; then
+    echo "Groq STT worker already running (PID: $WPID)"
+  else
+    rm -f "$STT_WORKER_PID_FILE"
+  fi
+fi
+
+if [ ! -f "$STT_WORKER_PID_FILE" ] && [ -n "${USE_PY_STT:-}" ]; then
+  # The worker refuses socket directories it does not own or others can
+  # write to; /run/ginto needs to be provisioned for it when not root.
+  if [ -z "${GROQ_STT_SOCKET:-}" ] && [ ! -w /run/ginto ] && [ ! -w /run ]; then
+    echo "Warning: /run/ginto is not writable; create it (sudo install -d -o \"\$USER\" -m 0750 /run/ginto) or set GROQ_STT_SOCKET"
+  fi
+  echo "Starting Groq STT worker..."
+  (cd tools/groq-mcp && nohup "${PYTHON3_PATH:-python3}" -m src.stt_worker > /tmp/ginto-groq-stt.log 2>&1 & echo $! > "$STT_WORKER_PID_FILE")
+  echo "Groq STT worker started (pid $(cat $STT_WORKER_PID_FILE), log: /tmp/ginto-groq-stt.log)"
+fi
+
 echo "start_services complete"
@@ -59,4 +59,20 @@ else
   echo "No sandbox proxy pid file; nothing to stop."
 fi
 
+# Stop Groq STT worker
+STT_WORKER_PID_FILE="/tmp/ginto-groq-stt.pid"
+if [ -f "$STT_WORKER_PID_FILE" ]; then
+  PID=$(cat "$STT_WORKER_PID_FILE")
+  if ps -p "$PID" > /dev/null 2>&1; then
+    kill "$PID" && echo "Stopped Groq STT worker (pid $PID)"
+    sleep 1
+    if ps -p "$PID" > /dev/null 2>&1; then
+      kill -9 "$PID" || true
+    fi
+  fi
+  rm -f "$STT_WORKER_PID_FILE" || true
+else
+  echo "No Groq STT worker pid file; nothing to stop."
+fi
+
 echo "stop_services complete"
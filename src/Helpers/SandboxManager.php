@@ -105,14 +105,13 @@ class SandboxManager
         // For security we prefer to route exec requests via the root-controlled
         // sandbox broker (socket-activated daemon) rather than executing
         // machinectl directly from the web process. The broker runs as root
-        // and will perform the exec inside the container. The broker currently
-        // performs exec asynchronously and will return an accepted response.
-        // If the broker accepts the request we return a non-blocking success
-        // tuple ([null, '', '']) to indicate the exec was dispatched.
+        // and runs the command over a shell it keeps open inside the
+        // container, streaming stdout/stderr back as event lines before the
+        // reply that carries the exit code.
 
         $socketCandidates = ['/run/ginto-sandboxd.sock', '/run/sandboxd.sock', '/run/ginto/sandboxd.sock'];
         $sanitized = self::canonicalSandboxId($sandboxId);
-        $msg = json_encode(['action' => 'exec', 'sandboxId' => $sanitized, 'originalSandboxId' => $sandboxId, 'command' => $command, 'cwd' => $cwd]);
+        $msg = json_encode(['action' => 'exec', 'sandboxId' => $sanitized, 'originalSandboxId' => $sandboxId, 'command' => $command, 'cwd' => $cwd, 'timeout' => $timeout, 'maxBytes' => $maxBytes]);
         foreach ($socketCandidates as $socketPath) {
             if (!file_exists($socketPath)) continue;
             $ctx = stream_context_create(['socket' => ['timeout' => 0.6]]);
@@ -120,15 +119,31 @@ class SandboxManager
             if ($sock === false) continue;
             stream_set_blocking($sock, true);
             fwrite($sock, $msg . "\n");
-            stream_set_timeout($sock, 1);
-            $resp = stream_get_contents($sock);
+            // The broker enforces the command timeout itself; allow it a
+            // little longer to report back.
+            stream_set_timeout($sock, $timeout + 6);
+            // The daemon keeps connections open for further requests, so
+            // read event lines up to the reply instead of waiting for EOF.
+            $stdout = ''; $stderr = ''; $json = null;
+            while (($resp = fgets($sock)) !== false) {
+                $line = @json_decode(trim($resp), true);
+                if (!is_array($line)) break;
+                if (isset($line['event'])) {
+                    if ($line['event'] === 'stdout') $stdout .= $line['data'];
+                    elseif ($line['event'] === 'stderr') $stderr .= $line['data'];
+                    continue;
+                }
+                $json = $line;
+                break;
+            }
             fclose($sock);
-            if ($resp === false || trim($resp) === '') continue;
-            $json = @json_decode(trim($resp), true);
-            if (is_array($json) && !empty($json['ok'])) {
-                // broker accepted — exec dispatched; this is async so no stdout
-                // is available to return. We indicate dispatched with null code.
-                return [null, '', ''];
+            if ($json === null) {
+                // The command already ran (or is running); do not run it twice.
+                if ($stdout !== '' || $stderr !== '') return [null, $stdout, $stderr];
+                continue;
+            }
+            if (!empty($json['ok'])) {
+                return [$json['exitCode'] ?? null, $stdout, $stderr];
             }
             // broker responded with structured error — unless explicitly
             // disabled, fall back to local exec. If a hardened environment
@@ -265,10 +280,20 @@ class SandboxManager
         // between them in logs if needed.
         $sanitized = self::canonicalSandboxId($sandboxId);
 
-        $msg = json_encode(['action' => 'create', 'sandboxId' => $sanitized, 'originalSandboxId' => $sandboxId, 'hostPath' => $hostPath]);
+        // `claim` hands out a pre-provisioned machine from the daemon's warm
+        // pool (and provisions from scratch when the pool is empty); daemons
+        // without a pool answer "unknown action" and get a plain `create`.
+        $action = 'claim';
+        // The trace id ties this web request to the daemon's install log
+        // and metrics; reuse the proxy's request id when there is one.
+        $traceId = substr(preg_replace('/[^A-Za-z0-9._:-]/', '', (string)($_SERVER['HTTP_X_REQUEST_ID'] ?? '')), 0, 128);
+        if ($traceId === '') $traceId = bin2hex(random_bytes(8));
+        $msg = json_encode(['action' => $action, 'sandboxId' => $sanitized, 'originalSandboxId' => $sandboxId, 'hostPath' => $hostPath, 'traceId' => $traceId]);
         foreach ($socketCandidates as $socketPath) {
             if (!file_exists($socketPath)) continue;
             // Try a few times to connect in case the broker is still starting
+            // (with ginto-sandboxd.socket installed, systemd queues the
+            // connection across restarts and the first attempt succeeds)
             $attempts = 3;
             $connected = false;
             for ($i = 0; $i < $attempts; $i++) {
@@ -285,7 +310,8 @@ class SandboxManager
                 fwrite($sock, $msg . "\n");
                 // read with a short deadline
                 stream_set_timeout($sock, 1);
-                $resp = stream_get_contents($sock);
+                // one reply line per request; the connection stays open
+                $resp = fgets($sock);
                 fclose($sock);
                 if ($resp === false || trim($resp) === '') {
                     // no response — treat as transient failure and try next attempt/socket
@@ -306,10 +332,20 @@ class SandboxManager
                         $note = '[' . date('c') . '] daemon_ok';
                         if ($origId && $origId !== $sId) $note .= " canonical_sandboxId=$sId original=$origId";
                         if ($daemonLog) $note .= " daemon_log=$daemonLog";
+                        if (!empty($json['pooled'])) $note .= ' pooled=' . ($json['poolMachine'] ?? '1');
+                        if (!empty($json['jobId'])) $note .= ' job=' . $json['jobId'];
+                        if (!empty($json['queuePosition'])) $note .= ' queue_position=' . $json['queuePosition'];
+                        $note .= " trace=$traceId";
                         @file_put_contents($logFile, $note . "\n", FILE_APPEND | LOCK_EX);
                     }
                     return true;
                 }
+                if ($action === 'claim' && is_array($json) && ($json['error'] ?? '') === 'unknown action') {
+                    $action = 'create';
+                    $msg = json_encode(['action' => $action, 'sandboxId' => $sanitized, 'originalSandboxId' => $sandboxId, 'hostPath' => $hostPath, 'traceId' => $traceId]);
+                    $i--;
+                    continue;
+                }
                 // If daemon returned a structured error, write to the install log
                 if (is_array($json) && !empty($json['error'])) {
                     $err = '[' . date('c') . '] daemon_error: ' . $json['error'];
@@ -0,0 +1,134 @@
+<?php
+
+namespace Ginto\Helpers;
+
+/**
+ * Client for the resident groq_stt worker (tools/groq-mcp/src/stt_worker.py).
+ *
+ * The worker keeps Python, its imports and the Groq HTTP connection warm, so
+ * talking to it avoids spawning `python -c` for every upload. All methods
+ * return null only when the worker is not running (no socket, or the connect
+ * failed), so callers can fall back to the CLI path. Once a job has been sent
+ * the worker may already be uploading the audio, so a timeout or a missing
+ * reply comes back as an error reply (`ok` false, `timedOut` set on timeout)
+ * instead: falling back then would send the same audio to Groq twice.
+ */
+class SttWorkerClient
+{
+    public const DEFAULT_SOCKET = '/run/ginto/groq-stt.sock';
+
+    public static function socketPath(): string
+    {
+        return getenv('GROQ_STT_SOCKET') ?: ($_ENV['GROQ_STT_SOCKET'] ?? self::DEFAULT_SOCKET);
+    }
+
+    public static function available(): bool
+    {
+        return file_exists(self::socketPath());
+    }
+
+    /**
+     * Send one job to the worker and return the decoded reply, or null when
+     * the worker is unreachable. A worker that does not answer within
+     * $timeout seconds, or answers with something other than a JSON object,
+     * yields ['ok' => false, 'error' => ..., 'timedOut' => bool].
+     *
+     * When $body is a readable stream, $length bytes of it are sent right
+     * after the job line as the audio itself (see stt_worker.py).
+     */
+    public static function request(string $action, array $args, float $timeout = 120.0, $body = null, ?int $length = null): ?array
+    {
+        $socketPath = self::socketPath();
+        if (!file_exists($socketPath)) return null;
+
+        $sock = @stream_socket_client('unix://' . $socketPath, $errno, $errstr, 0.5);
+        if ($sock === false) return null;
+
+        $job = ['id' => bin2hex(random_bytes(6)), 'action' => $action, 'args' => $args];
+        if ($body !== null) $job['content_length'] = $length;
+        stream_set_blocking($sock, true);
+        stream_set_timeout($sock, (int)ceil($timeout));
+        fwrite($sock, json_encode($job) . "\n");
+        if ($body !== null && stream_copy_to_stream($body, $sock, $length) !== $length) {
+            fclose($sock);
+            return self::failure('could not send the audio to the STT worker');
+        }
+        // The worker answers every job with exactly one line.
+        $line = fgets($sock);
+        $timedOut = $line === false && !empty(stream_get_meta_data($sock)['timed_out']);
+        fclose($sock);
+
+        if ($timedOut) return self::failure('STT worker timed out', true);
+        if ($line === false || trim($line) === '') return self::failure('STT worker closed the connection without a reply');
+        $reply = json_decode(trim($line), true);
+        return is_array($reply) ? $reply : self::failure('invalid reply from the STT worker');
+    }
+
+    /** Error reply for a job that reached the worker but got no usable answer. */
+    private static function failure(string $error, bool $timedOut = false): array
+    {
+        return ['ok' => false, 'error' => $error, 'timedOut' => $timedOut];
+    }
+
+    /**
+     * Answer a /transcribe request through the worker: on a reply this sends
+     * the JSON response and exits, removing $path first when $removeFile is
+     * set. Returns false only when the worker is unreachable, so the route
+     * can fall back to the CLI. A worker that timed out may still be
+     * uploading the audio, so its error is reported, never retried.
+     */
+    public static function respond(string $path, string $model, bool $removeFile = false): bool
+    {
+        // Send the audio itself, so the worker never has to read the web
+        // server's temp files.
+        $fh = @fopen($path, 'rb');
+        $res = $fh ? self::transcribeStream($fh, $path, $model) : self::transcribe($path, $model);
+        if ($fh) fclose($fh);
+        if (!is_array($res)) return false;
+        if ($removeFile && is_file($path)) @unlink($path);
+        if (!headers_sent()) header('Content-Type: application/json; charset=utf-8');
+        if (!empty($res['ok'])) {
+            echo json_encode(['success' => true, 'text' => $res['text'] ?? '']);
+            exit;
+        }
+        $error = (string)($res['error'] ?? 'STT worker error');
+        http_response_code(!empty($res['timedOut']) ? 504 : 502);
+        if (stripos($error, 'Audio file is too short') !== false) {
+            echo json_encode(['error' => 'audio_too_short', 'detail' => $error]);
+        } else {
+            echo json_encode(['error' => $error]);
+        }
+        exit;
+    }
+
+    public static function transcribe(string $path, string $model, array $options = []): ?array
+    {
+        $args = array_merge([
+            'input_file_path' => $path,
+            'model' => $model,
+            'response_format' => 'json',
+        ], $options);
+        return self::request('transcribe', $args);
+    }
+
+    /**
+     * Transcribe audio read from a stream (an upload's tmp file handle,
+     * php://input, ...) without writing it to disk first. $filename supplies
+     * the format; $length defaults to the stream's size when it has one.
+     */
+    public static function transcribeStream($stream, string $filename, string $model, array $options = [], ?int $length = null): ?array
+    {
+        if ($length === null) {
+            $stat = @fstat($stream);
+            $length = ($stat && $stat['size'] > 0) ? (int)$stat['size'] : null;
+        }
+        if (!$length) return null;
+
+        $args = array_merge([
+            'filename' => basename($filename),
+            'model' => $model,
+            'response_format' => 'json',
+        ], $options);
+        return self::request('transcribe', $args, 120.0, $stream, $length);
+    }
+}
@@ -349,10 +349,15 @@ HTML;
         } else {
             $copied_tmp = false;
         }
-        // If the uploaded file is not WAV, try to transcode to WAV using ffmpeg
-        // so the local Python STT wrapper gets a widely-compatible file.
+        // The Python wrapper decodes, downmixes and resamples WAV/FLAC/OGG/MP3
+        // in-process (tools/groq-mcp/src/audio_prep.py), so ffmpeg is only
+        // needed for containers libsndfile cannot read (webm, m4a, video).
+        // Set GROQ_STT_FFMPEG=0 to skip the ffmpeg step entirely.
         $current_ct = strtolower($ctype ?? '');
-        $need_wav = (strpos($current_ct, 'wav') === false && strpos($current_ct, 'wave') === false);
+        $py_decodable = (bool)preg_match('/wav|wave|flac|ogg|mpeg|mp3/', $current_ct)
+            || in_array(strtolower($orig_ext), ['wav', 'flac', 'ogg', 'mp3'], true);
+        $ffmpeg_enabled = ($_ENV['GROQ_STT_FFMPEG'] ?? getenv('GROQ_STT_FFMPEG')) !== '0';
+        $need_wav = $ffmpeg_enabled && !$py_decodable;
         if ($need_wav) {
             $ffmpeg = null;
             try { $ffmpeg = trim((string)shell_exec('command -v ffmpeg 2>/dev/null')); } catch (\Throwable $_) { $ffmpeg = null; }
@@ -377,6 +382,12 @@ HTML;
             }
         }
 
+        // Prefer the resident STT worker when it is running: it keeps Python,
+        // its imports and the Groq connection warm instead of paying process
+        // startup on every upload. Fall through to the CLI only when it is
+        // unreachable; a slow or failed worker job is reported as an error.
+        \Ginto\Helpers\SttWorkerClient::respond($tmp_with_ext, $sttModel, !empty($copied_tmp));
+
         $fileArg = escapeshellarg($tmp_with_ext);
         $modelArg = escapeshellarg($sttModel);
         $pyCode = sprintf(
@@ -1931,6 +1942,10 @@ $router->req('/audio/stt', function() {
         } else {
             $copied_tmp = false;
         }
+        // Prefer the resident STT worker (see tools/groq-mcp/src/stt_worker.py)
+        // and only spawn the CLI when it is not running.
+        \Ginto\Helpers\SttWorkerClient::respond($tmp_with_ext, $sttModel, !empty($copied_tmp));
+
         $fileArg = escapeshellarg($tmp_with_ext);
         $modelArg = escapeshellarg($sttModel);
         // Build an inline python -c command that imports the existing groq_stt module
@@ -2,142 +2,123 @@
 """
 ginto_sandboxd - privileged root daemon to create systemd-nspawn sandboxes
 
-This is a minimal, auditable daemon scaffold that accepts a simple JSON
-command over a UNIX domain socket and runs the repository sandbox creation
-helper as root. It validates inputs and writes logs to a controlled location.
+A root daemon that accepts JSON commands over a UNIX domain socket and runs
+the repository sandbox creation helper as root. It validates inputs and
+writes logs to a controlled location. This file is only the entry point;
+the daemon lives in the sandboxd package next to it, one concern per module
+(see sandboxd/__init__.py for the map), so each part can be reviewed on its
+own.
+
+Protocol: one JSON object per line, answered by one JSON line. Connections
+are persistent, so a client may send several requests over one connection;
+a request that carries an "id" gets it echoed in the reply. Connections are
+served concurrently by an asyncio event loop and blocking work runs on a
+thread pool, so a slow or stalled client never holds up anybody else.
+
+    {"action": "create", "sandboxId": "abc", "hostPath": "/home/.../clients/abc"}
+    {"action": "claim", "sandboxId": "abc", "hostPath": "/home/.../clients/abc"}
+    {"action": "pool"}
+    {"action": "templates"}
+    {"action": "release", "sandboxId": "abc"}
+    {"action": "gc", "maxAge": 86400}
+    {"action": "status", "sandboxId": "abc"}
+    {"action": "wait", "sandboxId": "abc", "timeout": 60}
+    {"action": "tail", "sandboxId": "abc", "follow": true}
+    {"action": "exec", "sandboxId": "abc", "command": "ls -la", "cwd": "/home", "timeout": 10}
+    {"action": "stats"}
+    {"action": "list", "state": "ready", "after": "abc", "limit": 100}
+    {"action": "get", "sandboxId": "abc"}
+    {"action": "touch", "sandboxId": "abc"}
+    {"action": "ping"}
+
+Any request may carry a "traceId"; a create's trace id is written into its
+install log and the daemon log lines of its job.
+
+Metrics: counters and histograms (request parse time and latency, errors
+by action, create queue wait and duration, template provisioning, event
+loop lag) plus gauges (connections, children, queue depth) are kept in
+process. "stats" returns them as JSON, and METRICS_LISTEN (a socket path,
+or host:port for TCP) serves them in the Prometheus text format over
+HTTP/1.0.
+
+Index: the daemon records every sandbox it creates, claims or runs commands
+in, in a SQLite database (WAL mode) at STATE_DB: ids, host path, state,
+owner uid, times of creation and last activity, and memory/CPU use sampled
+from the machine's cgroup. "list" pages through it by id and "get" reads
+one row, both through indexes. Activity is batched in memory and written
+every few seconds. The idle reaper is off unless REAP_IDLE_SECONDS is set:
+it then wakes every REAP_INTERVAL and asks the index for the sandboxes idle
+longer than that (oldest first, at most REAP_BATCH), so it never walks the
+whole set; each is stopped or removed according to its "idlePolicy" from
+create/claim, unless its cgroup shows it used CPU since the last look. The
+daemon only sees its own create/claim/exec traffic, so whatever serves the
+sandbox's web preview must send "touch" before the reaper is turned on.
+
+Warm pool: with GINTO_SANDBOXD_POOL_HIGH > 0 the daemon keeps up to that
+many idle machines provisioned ahead of time (CREATE_SCRIPT run with a
+pool-<token> name and a directory under POOL_DIR). "claim" hands one of them
+to a sandbox by running CLAIM_SCRIPT <pool machine> <sandbox id> <host path>,
+which renames/rebinds it, and falls back to a regular create when the pool
+is empty. Refills start when fewer than POOL_LOW machines are idle and stop
+at POOL_HIGH, capped by the memory the host can spare.
+
+Template cache: when TEMPLATE_SCRIPT exists, create does not install from
+scratch. The base root filesystem for the request's "template" and
+"packages" is built once (keyed by a hash of both and of the script), and
+each sandbox gets a btrfs snapshot, reflink copy or overlayfs upper layer of
+it, passed to CREATE_SCRIPT as $GINTO_SANDBOX_ROOTFS. Roots hold references
+on their template; "release" drops one and unreferenced templates are
+garbage collected after TEMPLATE_GC_AGE.
+
+Jobs: every create script the daemon starts is a job in a table holding its
+state, exit code and timings, addressed by the "jobId" from the create reply
+or by sandbox id (its latest job). Children are reaped as soon as they exit,
+through a pidfd per child where the kernel supports it and SIGCHLD otherwise.
+"status" reports a job, "wait" blocks until it ends (or the timeout passes)
+and "tail" sends the install log as {"event": "log", "lines": [...]} lines,
+following it until the job ends when "follow" is set.
+
+Exec: commands run over a shell kept open inside the sandbox (EXEC_SHELL,
+systemd-run --machine ... --pipe /bin/sh by default), so a command costs a
+fork inside the machine instead of a machinectl/nsenter spawn. Each sandbox
+keeps up to EXEC_CHANNELS shells, reused one command at a time and closed
+after EXEC_IDLE_TIMEOUT. Output comes back as {"event": "stdout"|"stderr",
+"data": ...} lines, then a reply with the exit code. A command that runs
+past its timeout is killed; one that writes more than "maxBytes" has its
+shell killed and the reply marked truncated.
+
+Admission control: creates do not all start at once. Each one becomes a
+queued job; at most CREATE_CONCURRENCY run together (half the CPUs, up to
+8, by default) and none are admitted while the host's CPU or I/O pressure
+(PSI) is above CREATE_MAX_PRESSURE. Queued creates are admitted round-robin
+across caller uids, so one busy caller cannot starve the others, and a
+create for an id that already has a queued or running job joins that job
+instead of installing twice. Replies carry the job id and queue position.
 
 INSTALL (manual):
- - Copy this file to /usr/local/bin/ginto_sandboxd.py and make it root-owned.
- - Install the systemd unit included in this repo and enable/start it.
+ - Copy this file and the sandboxd package to /usr/local/lib/ginto-sandboxd/
+   and make them root-owned and not writable by anyone else.
+ - Install the systemd units included in this repo and enable/start
+   ginto-sandboxd.socket (it starts the service on the first connection).
+
+Socket activation: when started by systemd with ginto-sandboxd.socket, the
+daemon serves the socket passed in LISTEN_FDS instead of binding its own.
+The socket then outlives the daemon, so requests made while it restarts
+wait in the kernel's backlog instead of failing.
+
+Paths can be overridden for testing without root through the environment:
+GINTO_SANDBOXD_SOCKET, GINTO_SANDBOXD_LOG_DIR, GINTO_SANDBOXD_CREATE_SCRIPT,
+GINTO_SANDBOXD_CLAIM_SCRIPT and GINTO_SANDBOXD_POOL_DIR.
 
 Security notes:
  - The service must be installed as root and the socket owned by root with
    appropriate permissions. The daemon validates sandbox ids and host paths
    strictly and avoids invoking a shell to prevent injection.
- - The daemon is intentionally small and explicit; review before enabling.
+ - Every module runs as root. Review the whole package, not just this
+   file, before enabling, and keep the install directory root-owned since
+   Python imports the package from next to this script.
 """
-import os
-import sys
-import socket
-import json
-import struct
-import subprocess
-import logging
-from pathlib import Path
-
-SOCKET_PATH = '/run/ginto-sandboxd.sock'
-INSTALL_LOG_DIR = '/var/log/ginto-sandboxd'
-CREATE_SCRIPT = '/home/oliverbob/ginto/scripts/create_nspawn.sh'
-
-logging.basicConfig(filename='/var/log/ginto-sandboxd/ginto_sandboxd.log', level=logging.INFO,
-                    format='%(asctime)s %(levelname)s %(message)s')
-
-
-def get_peer_cred(conn):
-    # Returns (pid, uid, gid) on Linux
-    try:
-        ucred = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
-        pid, uid, gid = struct.unpack('3i', ucred)
-        return pid, uid, gid
-    except Exception:
-        return None
-
-
-def sanitize_sandbox_id(sid: str) -> str:
-    """Return a safe canonical sandbox id: lowercase, replace non-allowed
-    characters with hyphens and trim to 64 characters. Returns empty string
-    when no valid characters remain.
-    """
-    import re
-    if not isinstance(sid, str):
-        return ''
-    canon = re.sub(r'[^a-z0-9-]+', '-', sid.lower())
-    canon = canon.strip('-')
-    if len(canon) > 64:
-        canon = canon[:64]
-    return canon
-
-
-def handle_create(payload: dict, out_fd_path: str = None) -> dict:
-    sandbox_id = payload.get('sandboxId')
-    host_path = payload.get('hostPath')
-
-    if not sandbox_id or not host_path:
-        return {'ok': False, 'error': 'missing sandboxId or hostPath'}
-
-    # Accept mixed-case or slightly messy sandboxId strings from callers
-    # but canonicalize them into lower-case hyphenated ids for machine
-    # naming and log files.
-    sanitized = sanitize_sandbox_id(sandbox_id)
-    if sanitized == '':
-        return {'ok': False, 'error': 'invalid sandboxId after sanitization'}
-
-    # Ensure host path is under the repo clients/ directory for safety
-    host_path = os.path.realpath(host_path)
-    if not host_path.startswith('/home') and not host_path.startswith('/var') and not host_path.startswith('/srv'):
-        return {'ok': False, 'error': 'hostPath not permitted'}
-
-    # Build log path for the install
-    log_dir = Path('/var/log/ginto-sandboxd')
-    log_dir.mkdir(parents=True, exist_ok=True)
-    install_log = log_dir / f'install_{sanitized}.log'
-
-    # Execute the create script directly (no shell) as root. This daemon
-    # runs as root, so it can execute the script without sudo. We pass
-    # arguments directly to avoid shell injection.
-    try:
-        # Use sanitized id to create a predictable machine/log name. Keep
-        # the original id available for callers so the UI can map between
-        # user-provided IDs and the canonical form.
-        cmd = [CREATE_SCRIPT, sanitized, host_path]
-        with open(install_log, 'ab') as lf:
-            lf.write(b'=== create request received ===\n')
-            lf.flush()
-            p = subprocess.Popen(cmd, stdout=lf, stderr=lf)
-        logging.info('Launched create script for %s (pid=%s) writing to %s', sanitized, p.pid, str(install_log))
-        return {'ok': True, 'pid': p.pid, 'sandboxId': sanitized, 'originalSandboxId': sandbox_id, 'log': str(install_log)}
-    except Exception as e:
-        logging.exception('Failed to launch create script')
-        return {'ok': False, 'error': str(e)}
-
-
-def serve():
-    if os.path.exists(SOCKET_PATH):
-        try:
-            os.unlink(SOCKET_PATH)
-        except Exception:
-            pass
-
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.bind(SOCKET_PATH)
-    os.chmod(SOCKET_PATH, 0o660)
-    server.listen(5)
-    logging.info('ginto_sandboxd listening on %s', SOCKET_PATH)
-
-    while True:
-        conn, _ = server.accept()
-        piduid = get_peer_cred(conn)
-        try:
-            data = conn.recv(8192)
-            if not data:
-                conn.close(); continue
-            try:
-                payload = json.loads(data.decode('utf-8'))
-            except Exception:
-                conn.send(b'{"ok":false,"error":"invalid json"}\n')
-                conn.close(); continue
-
-            action = payload.get('action')
-            if action == 'create':
-                res = handle_create(payload)
-                conn.send((json.dumps(res) + '\n').encode('utf-8'))
-            else:
-                conn.send(b'{"ok":false,"error":"unknown action"}\n')
-        except Exception:
-            logging.exception('Error handling connection')
-        finally:
-            try: conn.close()
-            except Exception: pass
+from sandboxd.server import serve
 
 
 if __name__ == '__main__':
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+loadgen - drive the ginto_sandboxd socket protocol and report latency
+
+Opens --concurrency client connections to the daemon and sends a weighted
+mix of requests over them, as fast as the daemon answers, for --duration
+seconds or --requests requests. Reports requests/s, per-action latency
+percentiles and accept latency: the time from connect() to the reply to
+the first request on the new connection, which is what a one-shot client
+such as SandboxManager.php waits for.
+
+Without --socket it needs neither root nor nspawn: the daemon is started
+from this directory with every path under a temporary directory, and the
+stub create and claim scripts in stubs/, which only sleep (--stub-sleep).
+--pool N keeps N warm machines for "claim" requests. The listening socket
+is bound here and passed to the daemon in LISTEN_FDS, the way systemd's ginto-sandboxd.socket does, so
+--restart-every can restart the daemon under load and show whether any
+request failed across the restart.
+
+    python3 loadgen.py --concurrency 64 --duration 10
+    python3 loadgen.py --mix ping=1 --reconnect --json
+    python3 loadgen.py --restart-every 2 --duration 10
+    python3 loadgen.py --socket /run/ginto-sandboxd.sock --mix ping=1,stats=1
+
+Actions in --mix: ping, stats, create, claim, status, list, get, exec ("exec" runs
+`true` through /bin/sh standing in for the machine's shell). status and get
+address the sandboxes this run created.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+DAEMON = Path(__file__).resolve().parent / 'ginto_sandboxd.py'
+STUBS = Path(__file__).resolve().parent / 'stubs'
+DEFAULT_MIX = 'ping=6,status=2,create=1,list=1'
+ACTIONS = ('ping', 'stats', 'create', 'claim', 'status', 'list', 'get', 'exec')
+PERCENTILES = (50, 90, 99, 99.9)
+# Moves the listening socket to fd 3 and execs the daemon, which then sees
+# its own pid in LISTEN_PID, as sd_listen_fds() expects.
+ACTIVATE = ('import os, sys; fd = int(sys.argv[1]); fd != 3 and (os.dup2(fd, 3), os.close(fd)); '
+            'os.environ.update(LISTEN_PID=str(os.getpid()), LISTEN_FDS="1"); '
+            'os.execv(sys.executable, [sys.executable, sys.argv[2]])')
+
+
+def parse_mix(text: str):
+    """'ping=6,create=1' -> (['ping', 'create'], [6.0, 1.0])."""
+    actions, weights = [], []
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f'unknown action {name!r} (one of {", ".join(ACTIONS)})')
+        actions.append(name)
+        weights.append(float(weight or 1))
+    return actions, weights
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summarize(values):
+    """Percentiles and max of a list of seconds, in milliseconds."""
+    if not values:
+        return {'count': 0}
+    out = {'count': len(values)}
+    for p in PERCENTILES:
+        out[f'p{p:g}'] = round(percentile(values, p) * 1000, 3)
+    out['max'] = round(max(values) * 1000, 3)
+    return out
+
+
+class Daemon:
+    """A ginto_sandboxd child serving a socket bound here, restartable in place."""
+
+    def __init__(self, workdir: Path, stub_sleep: float, concurrency: int, pool: int = 0):
+        self.workdir = workdir
+        self.socket_path = str(workdir / 'd.sock')
+        self.proc = None
+        self.restarts = 0
+        self.env = dict(
+            os.environ,
+            GINTO_SANDBOXD_SOCKET=self.socket_path,
+            GINTO_SANDBOXD_LOG_DIR=str(workdir / 'log'),
+            GINTO_SANDBOXD_CREATE_SCRIPT=str(STUBS / 'create.sh'),
+            GINTO_SANDBOXD_CLAIM_SCRIPT=str(STUBS / 'claim.sh'),
+            GINTO_SANDBOXD_TEMPLATE_SCRIPT=str(workdir / 'no-template'),
+            GINTO_SANDBOXD_POOL_HIGH=str(pool),
+            GINTO_SANDBOXD_POOL_MACHINE_MB='0',
+            GINTO_SANDBOXD_POOL_DIR=str(workdir / 'pool'),
+            GINTO_SANDBOXD_STATE_DB=str(workdir / 'state.db'),
+            GINTO_SANDBOXD_METRICS='',
+            GINTO_SANDBOXD_EXEC_SHELL='/bin/sh',
+            GINTO_SANDBOXD_REAP_IDLE_SECONDS='0',
+            GINTO_SANDBOXD_CREATE_MAX_PRESSURE='0',
+            GINTO_SANDBOXD_CREATE_QUEUE_MAX=str(max(256, concurrency * 4)),
+            GINTO_STUB_CREATE_SLEEP=f'{stub_sleep:g}',
+        )
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen(max(128, concurrency * 2))
+
+    def start(self):
+        fd = self.listener.fileno()
+        self.proc = subprocess.Popen([sys.executable, '-c', ACTIVATE, str(fd), str(DAEMON)],
+                                     env=self.env, pass_fds=(fd,))
+
+    def stop(self):
+        if self.proc is None:
+            return
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            self.proc.wait(30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+        self.restarts += 1
+
+    def close(self):
+        self.stop()
+        self.listener.close()
+
+
+class Run:
+    """Counters and latency samples shared by the workers."""
+
+    def __init__(self, mix, deadline, limit):
+        self.actions, self.weights = mix
+        self.deadline = deadline
+        self.limit = limit
+        self.sent = 0
+        self.latency = {name: [] for name in self.actions}
+        self.connect = []
+        self.accept = []
+        self.errors = {}
+        self.created = []
+
+    def next_action(self):
+        if self.limit is not None and self.sent >= self.limit:
+            return None
+        if time.monotonic() >= self.deadline:
+            return None
+        self.sent += 1
+        return random.choices(self.actions, self.weights)[0]
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def build_request(action: str, worker: int, seq: int, run: Run, host_root: str):
+    request = {'action': action, 'id': seq, 'traceId': f'loadgen-{worker}-{seq}'}
+    if action in ('create', 'claim'):
+        sid = f'lg-{worker}-{seq}'
+        request.update(sandboxId=sid, hostPath=f'{host_root}/{sid}', idlePolicy='keep')
+    elif action in ('status', 'get', 'exec'):
+        if not run.created:
+            return {'action': 'ping', 'id': seq}
+        request['sandboxId'] = random.choice(run.created)
+        if action == 'exec':
+            request.update(command='true', timeout=5)
+    elif action == 'list':
+        request['limit'] = 50
+    return request
+
+
+async def worker(n: int, socket_path: str, run: Run, reconnect: bool, host_root: str):
+    reader = writer = None
+    seq = 0
+    while True:
+        action = run.next_action()
+        if action is None:
+            break
+        seq += 1
+        request = build_request(action, n, seq, run, host_root)
+        fresh = writer is None
+        try:
+            started = time.perf_counter()
+            if fresh:
+                reader, writer = await asyncio.open_unix_connection(socket_path, limit=16 * 1024 * 1024)
+                run.connect.append(time.perf_counter() - started)
+            sent = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b'\n')
+            # Intermediate event lines (exec output) come before the reply.
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError('connection closed')
+                reply = json.loads(line)
+                if 'event' not in reply:
+                    break
+            done = time.perf_counter()
+        except (OSError, ConnectionError, ValueError) as e:
+            run.error(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+            continue
+        run.latency.setdefault(request['action'], []).append(done - sent)
+        if fresh:
+            run.accept.append(done - started)
+        if not reply.get('ok'):
+            run.error(f'{request["action"]}: {reply.get("error")}')
+        elif action in ('create', 'claim'):
+            run.created.append(request['sandboxId'])
+        if reconnect:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def wait_ready(socket_path: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            try:
+                writer.write(b'{"action": "ping"}\n')
+                if await asyncio.wait_for(reader.readline(), 1.0):
+                    return
+            finally:
+                writer.close()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        if time.monotonic() > deadline:
+            raise SystemExit(f'daemon did not answer on {socket_path}')
+        await asyncio.sleep(0.05)
+
+
+async def restarter(daemon: Daemon, every: float, run: Run):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(every)
+        if time.monotonic() >= run.deadline:
+            return
+        await loop.run_in_executor(None, daemon.restart)
+
+
+async def main_async(args, socket_path: str, daemon):
+    await wait_ready(socket_path)
+    deadline = time.monotonic() + (args.duration if args.requests is None else 1e9)
+    run = Run(args.mix, deadline, args.requests)
+    host_root = args.host_root
+    restart_task = None
+    if daemon is not None and args.restart_every:
+        restart_task = asyncio.get_running_loop().create_task(restarter(daemon, args.restart_every, run))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n, socket_path, run, args.reconnect, host_root)
+                           for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    if restart_task is not None:
+        restart_task.cancel()
+
+    answered = sum(len(v) for v in run.latency.values())
+    everything = [x for v in run.latency.values() for x in v]
+    return {
+        'concurrency': args.concurrency,
+        'reconnect': args.reconnect,
+        'seconds': round(elapsed, 3),
+        'requests': answered,
+        'requests_per_second': round(answered / elapsed, 1) if elapsed else None,
+        'errors': run.errors,
+        'restarts': daemon.restarts if daemon is not None else 0,
+        'latency_ms': summarize(everything),
+        'latency_by_action_ms': {name: summarize(v) for name, v in run.latency.items()},
+        'connect_ms': summarize(run.connect),
+        'accept_ms': summarize(run.accept),
+    }
+
+
+def print_text(result):
+    for key in ('concurrency', 'reconnect', 'seconds', 'requests', 'requests_per_second', 'restarts'):
+        print(f'{key:22} {result[key]}')
+    print(f'{"errors":22} {sum(result["errors"].values())}')
+    for kind, count in sorted(result['errors'].items()):
+        print(f'  {kind:20} {count}')
+    rows = [('all', result['latency_ms'])]
+    rows += sorted(result['latency_by_action_ms'].items())
+    rows += [('connect', result['connect_ms']), ('accept', result['accept_ms'])]
+    header = ['ms', 'count'] + [f'p{p:g}' for p in PERCENTILES] + ['max']
+    print()
+    print(''.join(f'{h:>10}' for h in header))
+    for name, stats in rows:
+        cells = [name, stats['count']] + [stats.get(h, '-') for h in header[2:]]
+        print(''.join(f'{c:>10}' for c in cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load generator for the ginto_sandboxd socket protocol')
+    parser.add_argument('--socket', help='drive an already running daemon instead of spawning one')
+    parser.add_argument('--concurrency', type=int, default=32, help='client connections (default 32)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run (default 10)')
+    parser.add_argument('--requests', type=int, help='stop after this many requests instead')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'weighted actions (default {DEFAULT_MIX})')
+    parser.add_argument('--reconnect', action='store_true', help='open a new connection for every request')
+    parser.add_argument('--stub-sleep', type=float, default=0.05, help='seconds the stub create script runs')
+    parser.add_argument('--pool', type=int, default=0, help='warm machines the spawned daemon keeps for claim')
+    parser.add_argument('--restart-every', type=float, help='restart the spawned daemon every N seconds')
+    parser.add_argument('--host-root', default='/var/tmp/ginto-loadgen', help='hostPath prefix for creates')
+    parser.add_argument('--keep', action='store_true', help='keep the spawned daemon\'s directory')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    args = parser.parse_args(argv)
+
+    daemon = None
+    workdir = None
+    socket_path = args.socket
+    if socket_path is None:
+        workdir = Path(tempfile.mkdtemp(prefix='ginto-loadgen-'))
+        daemon = Daemon(workdir, args.stub_sleep, args.concurrency, args.pool)
+        daemon.start()
+        socket_path = daemon.socket_path
+    elif args.restart_every:
+        parser.error('--restart-every needs a spawned daemon (no --socket)')
+    try:
+        result = asyncio.run(main_async(args, socket_path, daemon))
+    finally:
+        if daemon is not None:
+            daemon.close()
+        if workdir is not None:
+            if args.keep:
+                print(f'daemon files kept in {workdir}', file=sys.stderr)
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_text(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+ginto_sandboxd, split by concern so each part can be reviewed on its own.
+
+    config         settings read from the environment
+    common         id and path validation shared by every action
+    connection     one client connection and shutdown of all of them
+    metrics        counters and histograms, Prometheus text rendering
+    templates      template root filesystems and copy-on-write clones
+    supervisor     the job table and child reaping for create scripts
+    scheduler      fair, pressure-aware admission of creates
+    index          the SQLite sandbox index and the idle reaper
+    exec_channels  persistent shells inside sandboxes for exec
+    pool           warm pool of pre-provisioned machines
+    handlers       one function per protocol action
+    server         the socket, request framing and the daemon lifecycle
+"""
@@ -0,0 +1,91 @@
+"""
+Helpers shared by the actions: sandbox id, host path and option
+validation, peer credentials, install log paths and running helper
+commands.
+"""
+import os
+import re
+import socket
+import struct
+import subprocess
+from pathlib import Path
+
+from .config import INSTALL_LOG_DIR, IDLE_POLICIES
+
+
+def get_peer_cred(conn):
+    # Returns (pid, uid, gid) on Linux
+    try:
+        ucred = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        pid, uid, gid = struct.unpack('3i', ucred)
+        return pid, uid, gid
+    except Exception:
+        return None
+
+
+SANDBOX_ID_INVALID_RE = re.compile(r'[^a-z0-9-]+')
+HOST_PATH_PREFIXES = ('/home', '/var', '/srv')
+
+
+def sanitize_sandbox_id(sid: str) -> str:
+    """Return a safe canonical sandbox id: lowercase, replace non-allowed
+    characters with hyphens and trim to 64 characters. Returns empty string
+    when no valid characters remain.
+    """
+    if not isinstance(sid, str):
+        return ''
+    canon = SANDBOX_ID_INVALID_RE.sub('-', sid.lower())
+    canon = canon.strip('-')
+    if len(canon) > 64:
+        canon = canon[:64]
+    return canon
+
+
+TRACE_RE = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+def machine_name(sanitized: str) -> str:
+    return f'ginto-sandbox-{sanitized}'
+
+
+def validate_target(payload: dict):
+    """Return (sanitized id, real host path, None) or (None, None, error reply)."""
+    sandbox_id = payload.get('sandboxId')
+    host_path = payload.get('hostPath')
+
+    if not sandbox_id or not host_path:
+        return None, None, {'ok': False, 'error': 'missing sandboxId or hostPath'}
+
+    # Accept mixed-case or slightly messy sandboxId strings from callers
+    # but canonicalize them into lower-case hyphenated ids for machine
+    # naming and log files.
+    sanitized = sanitize_sandbox_id(sandbox_id)
+    if sanitized == '':
+        return None, None, {'ok': False, 'error': 'invalid sandboxId after sanitization'}
+
+    # Ensure host path is under the repo clients/ directory for safety
+    host_path = os.path.realpath(host_path)
+    if not host_path.startswith(HOST_PATH_PREFIXES):
+        return None, None, {'ok': False, 'error': 'hostPath not permitted'}
+    return sanitized, host_path, None
+
+
+def install_log_path(sanitized: str) -> Path:
+    log_dir = Path(INSTALL_LOG_DIR)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    return log_dir / f'install_{sanitized}.log'
+
+
+def validate_options(payload: dict):
+    """Error reply for a bad "traceId" or "idlePolicy" on create/claim, else None."""
+    trace = payload.get('traceId')
+    if trace is not None and (not isinstance(trace, str) or not TRACE_RE.match(trace)):
+        return {'ok': False, 'error': 'invalid traceId'}
+    if payload.get('idlePolicy') not in (None,) + IDLE_POLICIES:
+        return {'ok': False, 'error': 'invalid idlePolicy'}
+    return None
+
+
+def run_checked(cmd, **kwargs):
+    """Run a helper command without a shell; raises CalledProcessError on failure."""
+    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True, **kwargs)
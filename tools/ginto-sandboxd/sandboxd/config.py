@@ -0,0 +1,110 @@
+"""
+Settings, read once from the environment at import.
+"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+SOCKET_PATH = os.environ.get('GINTO_SANDBOXD_SOCKET', '/run/ginto-sandboxd.sock')
+INSTALL_LOG_DIR = os.environ.get('GINTO_SANDBOXD_LOG_DIR', '/var/log/ginto-sandboxd')
+CREATE_SCRIPT = os.environ.get('GINTO_SANDBOXD_CREATE_SCRIPT', '/home/oliverbob/ginto/scripts/create_nspawn.sh')
+CLAIM_SCRIPT = os.environ.get('GINTO_SANDBOXD_CLAIM_SCRIPT', '/home/oliverbob/ginto/scripts/claim_nspawn.sh')
+POOL_DIR = os.environ.get('GINTO_SANDBOXD_POOL_DIR', '/var/lib/ginto-sandboxd/pool')
+
+# Warm pool sizing. POOL_HIGH=0 disables the pool.
+POOL_HIGH = _env_int('GINTO_SANDBOXD_POOL_HIGH', 0)
+POOL_LOW = _env_int('GINTO_SANDBOXD_POOL_LOW', max(1, POOL_HIGH // 2))
+POOL_BUILDERS = _env_int('GINTO_SANDBOXD_POOL_BUILDERS', 2)
+# Every idle machine is assumed to hold this much memory; the pool never
+# grows into the last POOL_RESERVE_MB of available memory.
+POOL_MACHINE_MB = _env_int('GINTO_SANDBOXD_POOL_MACHINE_MB', 256)
+POOL_RESERVE_MB = _env_int('GINTO_SANDBOXD_POOL_RESERVE_MB', 1024)
+POOL_READY_MARKER = '.ginto-pool-ready'
+CLAIM_TIMEOUT = 30.0
+
+# Template cache: TEMPLATE_SCRIPT <name> <rootfs dir> <packages...> installs a
+# base root filesystem once; sandboxes get copy-on-write clones of it. The
+# cache is off unless the script exists. ROOTFS_MODE is auto, btrfs, reflink
+# or overlay.
+TEMPLATE_SCRIPT = os.environ.get('GINTO_SANDBOXD_TEMPLATE_SCRIPT', '/home/oliverbob/ginto/scripts/build_template.sh')
+TEMPLATE_DIR = os.environ.get('GINTO_SANDBOXD_TEMPLATE_DIR', '/var/lib/ginto-sandboxd/templates')
+ROOTS_DIR = os.environ.get('GINTO_SANDBOXD_ROOTS_DIR', '/var/lib/ginto-sandboxd/roots')
+ROOTFS_MODE = os.environ.get('GINTO_SANDBOXD_ROOTFS_MODE', 'auto')
+TEMPLATE_GC_AGE = _env_int('GINTO_SANDBOXD_TEMPLATE_GC_AGE', 24 * 3600)
+TEMPLATE_GC_INTERVAL = 3600
+
+# Requests may be of any reasonable size; the limit only stops a client that
+# never sends a newline from growing the buffer without bound.
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+# A new connection must deliver its first request line within READ_TIMEOUT;
+# after that it may sit idle for IDLE_TIMEOUT between requests.
+READ_TIMEOUT = 10.0
+IDLE_TIMEOUT = 60.0
+# At shutdown, requests in progress get this long to be answered.
+SHUTDOWN_GRACE = 5.0
+# Threads for blocking handlers (process spawns, file I/O).
+WORKER_THREADS = 32
+LISTEN_BACKLOG = 128
+# systemd socket activation passes listening sockets from this descriptor on.
+SD_LISTEN_FDS_START = 3
+
+# Create admission: CREATE_CONCURRENCY=0 picks half the CPUs (1 to 8). No
+# create is admitted while CPU or I/O "some" pressure (PSI avg10, percent)
+# is at or above CREATE_MAX_PRESSURE, unless none is running; 0 turns the
+# check off. At most CREATE_QUEUE_MAX creates wait.
+CREATE_CONCURRENCY = _env_int('GINTO_SANDBOXD_CREATE_CONCURRENCY', 0) or max(1, min(8, (os.cpu_count() or 2) // 2))
+CREATE_MAX_PRESSURE = _env_int('GINTO_SANDBOXD_CREATE_MAX_PRESSURE', 40)
+CREATE_QUEUE_MAX = _env_int('GINTO_SANDBOXD_CREATE_QUEUE_MAX', 256)
+PRESSURE_RECHECK = 2.0
+
+# Sandbox index and idle reaper. The reaper is opt-in: REAP_IDLE_SECONDS=0
+# (the default) disables it.
+# Policies: stop (default) powers the machine off, remove also deletes it,
+# keep leaves it alone. The commands get {machine} filled in.
+STATE_DB = os.environ.get('GINTO_SANDBOXD_STATE_DB', '/var/lib/ginto-sandboxd/state.db')
+INDEX_FLUSH_INTERVAL = 5.0
+REAP_INTERVAL = _env_int('GINTO_SANDBOXD_REAP_INTERVAL', 60)
+REAP_IDLE_SECONDS = _env_int('GINTO_SANDBOXD_REAP_IDLE_SECONDS', 0)
+REAP_BATCH = _env_int('GINTO_SANDBOXD_REAP_BATCH', 50)
+REAP_DEFAULT_POLICY = os.environ.get('GINTO_SANDBOXD_REAP_POLICY', 'stop')
+REAP_STOP_COMMAND = os.environ.get('GINTO_SANDBOXD_STOP_COMMAND', 'machinectl poweroff {machine}')
+REAP_REMOVE_COMMAND = os.environ.get('GINTO_SANDBOXD_REMOVE_COMMAND', 'machinectl remove {machine}')
+REAP_COMMAND_TIMEOUT = 120
+# CPU seconds a sandbox may use between two looks and still count as idle.
+REAP_CPU_SECONDS = 5.0
+IDLE_POLICIES = ('stop', 'remove', 'keep')
+CGROUP_MACHINES = '/sys/fs/cgroup/machine.slice'
+
+# Prometheus text exporter: a UNIX socket path, or host:port for TCP. Off
+# unless set.
+METRICS_LISTEN = os.environ.get('GINTO_SANDBOXD_METRICS', '')
+LOOP_LAG_INTERVAL = 1.0
+
+# Exec channels: EXEC_SHELL is split like a shell command line after
+# {machine} is replaced by the sandbox's machine name, and must run a shell
+# reading commands from stdin inside it.
+EXEC_SHELL = os.environ.get(
+    'GINTO_SANDBOXD_EXEC_SHELL', 'systemd-run --machine={machine} --pipe --quiet --wait --collect /bin/sh'
+)
+EXEC_CHANNELS = _env_int('GINTO_SANDBOXD_EXEC_CHANNELS', 2)
+EXEC_IDLE_TIMEOUT = 300.0
+EXEC_DEFAULT_TIMEOUT = 10
+EXEC_MAX_TIMEOUT = 600
+EXEC_DEFAULT_OUTPUT = 200000
+EXEC_MAX_OUTPUT = 16 * 1024 * 1024
+EXEC_MAX_COMMAND = 256 * 1024
+# Seconds past the command timeout before the daemon gives up on the shell.
+EXEC_KILL_GRACE = 5.0
+EXEC_READ_CHUNK = 64 * 1024
+
+# Finished jobs kept in the job table for status/wait/tail.
+JOB_HISTORY = 1000
+WAIT_MAX_TIMEOUT = 3600.0
+TAIL_CHUNK_BYTES = 64 * 1024
+TAIL_POLL_INTERVAL = 0.25
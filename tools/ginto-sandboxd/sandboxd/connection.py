@@ -0,0 +1,54 @@
+"""
+Client connections: the streams, the peer credentials and the task serving
+each one, and hanging up on all of them at shutdown.
+"""
+import json
+import asyncio
+
+from .common import get_peer_cred
+
+
+class Connection:
+    """One client connection: its streams, the peer credentials and the task serving it."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        sock = writer.get_extra_info('socket')
+        self.peer = get_peer_cred(sock) if sock is not None else None
+        self.task = asyncio.current_task()
+        # A new connection counts as busy until its first reply, so a client
+        # accepted just before shutdown still gets an answer.
+        self.busy = True
+        self.closing = False
+
+    async def send(self, obj: dict):
+        self.writer.write((json.dumps(obj) + '\n').encode('utf-8'))
+        await self.writer.drain()
+
+    async def event(self, payload: dict, obj: dict):
+        """Send an intermediate line for `payload`, tagged with its id like the reply."""
+        if 'id' in payload:
+            obj = {'id': payload['id'], **obj}
+        await self.send(obj)
+
+
+CONNECTIONS = set()
+
+
+async def close_connections(grace: float):
+    """Hang up on idle clients; requests in progress get `grace` seconds to be answered."""
+    # Handlers for connections accepted just before the server closed have
+    # not run yet; let them register first.
+    await asyncio.sleep(0.05)
+    for conn in CONNECTIONS:
+        conn.closing = True
+        if not conn.busy:
+            conn.task.cancel()
+    tasks = [conn.task for conn in CONNECTIONS]
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=grace)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,207 @@
+"""
+Exec: commands run over a shell kept open inside the sandbox (EXEC_SHELL,
+systemd-run --machine ... --pipe /bin/sh by default), so a command costs a
+fork inside the machine instead of a machinectl/nsenter spawn. Each sandbox
+keeps up to EXEC_CHANNELS shells, reused one command at a time and closed
+after EXEC_IDLE_TIMEOUT.
+"""
+import os
+import shlex
+import signal
+import asyncio
+import secrets
+import subprocess
+import collections
+
+from .common import machine_name
+from .config import EXEC_CHANNELS, EXEC_IDLE_TIMEOUT, EXEC_READ_CHUNK, EXEC_SHELL
+
+
+class ExecAborted(Exception):
+    """The channel can no longer be trusted to be in step; it gets killed."""
+
+
+class _ShellProtocol(asyncio.SubprocessProtocol):
+    """Feeds the shell's stdout and stderr into StreamReaders, with flow control."""
+
+    def __init__(self, loop):
+        self.readers = {1: asyncio.StreamReader(), 2: asyncio.StreamReader()}
+        self.exited = loop.create_future()
+
+    def connection_made(self, transport):
+        for fd, reader in self.readers.items():
+            reader.set_transport(transport.get_pipe_transport(fd))
+
+    def pipe_data_received(self, fd, data):
+        self.readers[fd].feed_data(data)
+
+    def pipe_connection_lost(self, fd, exc):
+        if fd in self.readers:
+            self.readers[fd].feed_eof()
+
+    def process_exited(self):
+        if not self.exited.done():
+            self.exited.set_result(None)
+
+
+class ExecChannel:
+    """
+    One shell running inside a sandbox, fed one command at a time.
+
+    Every command is wrapped so that, once it exits, the shell prints a
+    random marker and the exit status on stdout and the marker on stderr.
+    Everything before the markers is the command's output, so both streams
+    can be forwarded as they arrive and the shell stays usable afterwards.
+    Commands run in their own `sh -c` (with stdin from /dev/null), so cd,
+    exit or unbalanced quotes inside them cannot affect the shell.
+    """
+
+    def __init__(self, sandbox: str, transport, protocol):
+        self.sandbox = sandbox
+        self.transport = transport
+        self.protocol = protocol
+        self.stdin = transport.get_pipe_transport(0)
+        self.stdout = protocol.readers[1]
+        self.stderr = protocol.readers[2]
+        self.commands = 0
+        self.idle_handle = None
+
+    @classmethod
+    async def open(cls, sandbox: str):
+        loop = asyncio.get_running_loop()
+        argv = shlex.split(EXEC_SHELL.format(machine=machine_name(sandbox)))
+        transport, protocol = await loop.subprocess_exec(
+            lambda: _ShellProtocol(loop), *argv,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True,
+        )
+        return cls(sandbox, transport, protocol)
+
+    @property
+    def alive(self) -> bool:
+        return self.transport.get_returncode() is None and not self.transport.is_closing()
+
+    def kill(self):
+        """Kill the shell's process group and close our pipe ends.
+
+        Commands under timeout(1) sit in a process group of their own;
+        closing the pipes makes them fail on their next write instead of
+        blocking until the timeout.
+        """
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+        if self.transport.get_returncode() is None:
+            try:
+                os.killpg(self.transport.get_pid(), signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.transport.close()
+
+    async def run(self, command: str, cwd: str, timeout: float, sink):
+        """Run one command, passing output to `sink(stream, bytes)`; returns the exit status."""
+        marker = f'__ginto_exec_{secrets.token_hex(8)}__'.encode('ascii')
+        inner = shlex.quote(command)
+        script = (
+            f'cd -- {shlex.quote(cwd)} && if command -v timeout >/dev/null 2>&1; '
+            f'then timeout -s KILL {timeout:g} sh -c {inner}; else sh -c {inner}; fi </dev/null; '
+            f"printf '%s%d\\n' {marker.decode()} $?; printf '%s' {marker.decode()} >&2\n"
+        )
+        self.commands += 1
+        self.stdin.write(script.encode('utf-8'))
+        pumps = [
+            asyncio.ensure_future(self._pump(self.stdout, marker, 'stdout', sink)),
+            asyncio.ensure_future(self._pump(self.stderr, marker, 'stderr', sink)),
+        ]
+        try:
+            rest, _ = await asyncio.gather(*pumps)
+        finally:
+            for pump in pumps:
+                pump.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+        if not rest.endswith(b'\n'):
+            rest += await self.stdout.readuntil(b'\n')
+        return int(rest.strip())
+
+    @staticmethod
+    async def _pump(stream, marker: bytes, name: str, sink) -> bytes:
+        buf = b''
+        keep = len(marker) - 1
+        while True:
+            chunk = await stream.read(EXEC_READ_CHUNK)
+            if not chunk:
+                raise ExecAborted('exec shell exited')
+            buf += chunk
+            i = buf.find(marker)
+            if i >= 0:
+                if i:
+                    await sink(name, buf[:i])
+                return buf[i + len(marker):]
+            # Hold back what could be the start of a marker split across reads.
+            if len(buf) > keep:
+                await sink(name, buf[:-keep])
+                buf = buf[-keep:]
+
+
+class ExecChannels:
+    """Up to EXEC_CHANNELS idle or busy shells per sandbox."""
+
+    def __init__(self, per_sandbox: int):
+        self.per_sandbox = max(1, per_sandbox)
+        self.idle = collections.defaultdict(list)
+        self.slots = {}
+        self.busy = 0
+        self.opened = 0
+        self.reused = 0
+
+    async def acquire(self, sandbox: str) -> ExecChannel:
+        slots = self.slots.get(sandbox)
+        if slots is None:
+            slots = self.slots[sandbox] = asyncio.Semaphore(self.per_sandbox)
+        await slots.acquire()
+        idle = self.idle[sandbox]
+        while idle:
+            channel = idle.pop()
+            channel.idle_handle.cancel()
+            if channel.alive:
+                self.reused += 1
+                self.busy += 1
+                return channel
+        try:
+            channel = await ExecChannel.open(sandbox)
+        except BaseException:
+            slots.release()
+            raise
+        self.opened += 1
+        self.busy += 1
+        return channel
+
+    def release(self, channel: ExecChannel, reusable: bool):
+        self.busy -= 1
+        if reusable and channel.alive:
+            loop = asyncio.get_running_loop()
+            channel.idle_handle = loop.call_later(EXEC_IDLE_TIMEOUT, self._expire, channel)
+            self.idle[channel.sandbox].append(channel)
+        else:
+            channel.kill()
+        self.slots[channel.sandbox].release()
+
+    def _expire(self, channel: ExecChannel):
+        idle = self.idle.get(channel.sandbox, [])
+        if channel in idle:
+            idle.remove(channel)
+            channel.kill()
+        if not idle:
+            self.idle.pop(channel.sandbox, None)
+
+    async def close_all(self):
+        channels = [channel for idle in self.idle.values() for channel in idle]
+        self.idle.clear()
+        for channel in channels:
+            channel.kill()
+        await asyncio.gather(*(channel.protocol.exited for channel in channels))
+
+    def stats(self) -> dict:
+        return {'idle': sum(len(idle) for idle in self.idle.values()), 'busy': self.busy,
+                'opened': self.opened, 'reused': self.reused}
+
+
+EXEC = ExecChannels(EXEC_CHANNELS)
@@ -0,0 +1,394 @@
+"""
+One function per protocol action, and the table that maps action names to
+them.
+"""
+import os
+import time
+import codecs
+import asyncio
+import logging
+import functools
+from pathlib import Path
+
+from .common import install_log_path, sanitize_sandbox_id, validate_options, validate_target
+from .config import (
+    EXEC_DEFAULT_OUTPUT, EXEC_DEFAULT_TIMEOUT, EXEC_KILL_GRACE, EXEC_MAX_COMMAND, EXEC_MAX_OUTPUT,
+    EXEC_MAX_TIMEOUT, INSTALL_LOG_DIR, TAIL_CHUNK_BYTES, TAIL_POLL_INTERVAL, TEMPLATE_GC_AGE, WAIT_MAX_TIMEOUT,
+)
+from .connection import Connection
+from .exec_channels import EXEC, ExecAborted
+from .index import INDEX, machine_usage
+from .metrics import METRICS
+from .pool import POOL
+from .scheduler import SCHEDULER
+from .supervisor import SUPERVISOR, Job, provision_from_template, run_create
+from .templates import TEMPLATES, TemplateCache
+
+
+def job_info(job: Job) -> dict:
+    return {**job.to_dict(), 'queuePosition': SCHEDULER.position(job) if job.state == 'queued' else None}
+
+
+async def handle_create(payload: dict, conn: Connection = None) -> dict:
+    sandbox_id = payload.get('sandboxId')
+    sanitized, host_path, error = validate_target(payload)
+    if error:
+        return error
+    # Use sanitized id to create a predictable machine/log name. Keep the
+    # original id available for callers so the UI can map between
+    # user-provided IDs and the canonical form.
+    error = validate_options(payload)
+    if error:
+        return error
+    trace = payload.get('traceId')
+    base = {'ok': True, 'sandboxId': sanitized, 'originalSandboxId': sandbox_id}
+
+    job = SCHEDULER.find(sanitized)
+    if job is not None:
+        # A retry or duplicate of a create that is still queued or
+        # installing: hand out the same job rather than install twice.
+        SCHEDULER.merged += 1
+        return {**base, **job_info(job), 'merged': True}
+    if SCHEDULER.full:
+        SCHEDULER.rejected += 1
+        return {'ok': False, 'error': 'create queue full'}
+
+    spec = None
+    if TEMPLATES.enabled:
+        try:
+            spec = TemplateCache.spec_from(payload)
+        except ValueError as e:
+            return {'ok': False, 'error': str(e)}
+        base['template'] = spec[0]
+
+    # Build log path for the install
+    install_log = install_log_path(sanitized)
+    job = SUPERVISOR.new_job('create', sanitized, install_log, trace)
+    if spec is not None:
+        start = functools.partial(provision_from_template, job, host_path, spec)
+    else:
+        start = functools.partial(run_create, job, host_path)
+
+    # Reply right away with the job; the install itself may wait its turn.
+    uid = conn.peer[1] if conn is not None and conn.peer else -1
+    SCHEDULER.submit(uid, job, start)
+    if INDEX.enabled:
+        INDEX.record(sanitized, sandbox_id, host_path, 'creating', spec[0] if spec else None, uid,
+                     payload.get('idlePolicy'), job.id)
+        INDEX.watch(job)
+    return {**base, **job_info(job), 'merged': False}
+
+
+def handle_ping(payload: dict, conn: Connection = None) -> dict:
+    return {'ok': True, 'pid': os.getpid()}
+
+
+async def handle_exec(payload: dict, conn: Connection) -> dict:
+    """Run a command in a sandbox, streaming its output as stdout/stderr events."""
+    sanitized = sanitize_sandbox_id(payload.get('sandboxId'))
+    command = payload.get('command')
+    cwd = payload.get('cwd') or '/'
+    timeout = payload.get('timeout', EXEC_DEFAULT_TIMEOUT)
+    max_bytes = payload.get('maxBytes', EXEC_DEFAULT_OUTPUT)
+    if not sanitized:
+        return {'ok': False, 'error': 'missing sandboxId'}
+    if not isinstance(command, str) or not command.strip() or len(command) > EXEC_MAX_COMMAND or '\0' in command:
+        return {'ok': False, 'error': 'invalid command'}
+    if not isinstance(cwd, str) or not cwd.startswith('/') or '\0' in cwd:
+        return {'ok': False, 'error': 'invalid cwd'}
+    if not isinstance(timeout, (int, float)) or not 0 < timeout <= EXEC_MAX_TIMEOUT:
+        return {'ok': False, 'error': 'invalid timeout'}
+    if not isinstance(max_bytes, int) or not 0 < max_bytes <= EXEC_MAX_OUTPUT:
+        return {'ok': False, 'error': 'invalid maxBytes'}
+
+    decoders = {name: codecs.getincrementaldecoder('utf-8')('replace') for name in ('stdout', 'stderr')}
+    sent = {'stdout': 0, 'stderr': 0}
+
+    async def sink(name: str, data: bytes):
+        room = max_bytes - sent['stdout'] - sent['stderr']
+        if len(data) > room:
+            data = data[:room]
+        if data:
+            sent[name] += len(data)
+            await conn.event(payload, {'event': name, 'data': decoders[name].decode(data)})
+        if sent['stdout'] + sent['stderr'] >= max_bytes:
+            raise ExecAborted('output limit reached')
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        channel = await EXEC.acquire(sanitized)
+    except OSError as e:
+        return {'ok': False, 'error': f'could not open exec shell: {e}'}
+    reusable = False
+    code = None
+    error = None
+    try:
+        code = await asyncio.wait_for(channel.run(command, cwd, timeout, sink), timeout + EXEC_KILL_GRACE)
+        reusable = True
+    except asyncio.TimeoutError:
+        error = 'timeout'
+    except (ExecAborted, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError) as e:
+        error = str(e) or type(e).__name__
+    finally:
+        EXEC.release(channel, reusable)
+    elapsed = loop.time() - started
+    truncated = error == 'output limit reached'
+    if error is not None and not truncated and error != 'timeout':
+        return {'ok': False, 'error': error, 'sandboxId': sanitized}
+    INDEX.touch(sanitized)
+    return {
+        'ok': True,
+        'sandboxId': sanitized,
+        'exitCode': code,
+        # timeout -s KILL makes the command exit with 128 + 9.
+        'timedOut': error == 'timeout' or (code == 137 and elapsed >= timeout),
+        'truncated': truncated,
+        'stdoutBytes': sent['stdout'],
+        'stderrBytes': sent['stderr'],
+        'durationMs': round(elapsed * 1000, 1),
+        'reused': channel.commands > 1,
+    }
+
+
+async def handle_status(payload: dict, conn: Connection) -> dict:
+    if 'jobId' not in payload and 'sandboxId' not in payload:
+        return {'ok': True, **SUPERVISOR.stats(), 'scheduler': SCHEDULER.stats(),
+                'active': [job_info(job) for job in SUPERVISOR.active()]}
+    job = SUPERVISOR.find(payload)
+    if job is None:
+        return {'ok': False, 'error': 'no such job'}
+    return {'ok': True, **job_info(job)}
+
+
+async def handle_wait(payload: dict, conn: Connection) -> dict:
+    """Block until the job ends, or for at most "timeout" seconds."""
+    timeout = payload.get('timeout', 60)
+    if not isinstance(timeout, (int, float)) or timeout < 0:
+        return {'ok': False, 'error': 'invalid timeout'}
+    job = SUPERVISOR.find(payload)
+    if job is None:
+        return {'ok': False, 'error': 'no such job'}
+    done = await SUPERVISOR.wait(job, min(timeout, WAIT_MAX_TIMEOUT))
+    return {'ok': True, 'timedOut': not done, **job_info(job)}
+
+
+async def handle_tail(payload: dict, conn: Connection) -> dict:
+    """
+    Send the job log from "offset" on as "log" events. With "follow" keep
+    sending new lines until the job ends or "timeout" passes. The reply's
+    offset is where the next tail should start; a trailing partial line is
+    left for it.
+    """
+    offset = payload.get('offset', 0)
+    timeout = payload.get('timeout', WAIT_MAX_TIMEOUT)
+    if not isinstance(offset, int) or offset < 0 or not isinstance(timeout, (int, float)):
+        return {'ok': False, 'error': 'invalid offset or timeout'}
+    job = SUPERVISOR.find(payload)
+    if job is not None:
+        log = job.log
+    else:
+        sanitized = sanitize_sandbox_id(payload.get('sandboxId'))
+        log = Path(INSTALL_LOG_DIR) / f'install_{sanitized}.log'
+        if not sanitized or not log.is_file():
+            return {'ok': False, 'error': 'no such job'}
+    follow = bool(payload.get('follow'))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(timeout, WAIT_MAX_TIMEOUT)
+    pending = b''
+    while True:
+        try:
+            with open(log, 'rb') as f:
+                f.seek(offset + len(pending))
+                chunk = f.read(TAIL_CHUNK_BYTES)
+        except FileNotFoundError:
+            chunk = b''
+        if chunk:
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            offset += sum(len(line) + 1 for line in lines)
+            if len(pending) >= TAIL_CHUNK_BYTES:
+                # Pass an overlong line on in pieces instead of buffering it.
+                lines.append(pending)
+                offset += len(pending)
+                pending = b''
+            if lines:
+                await conn.event(payload, {'event': 'log', 'lines': [line.decode('utf-8', 'replace') for line in lines],
+                                           'offset': offset})
+            continue
+        # Check the job before sleeping: a job that ended has written all it will.
+        if not follow or job is None or job.finished or loop.time() >= deadline:
+            break
+        await asyncio.sleep(TAIL_POLL_INTERVAL)
+    if pending and (job is None or job.finished):
+        # The log is complete, so an unterminated last line is final too.
+        offset += len(pending)
+        await conn.event(payload, {'event': 'log', 'lines': [pending.decode('utf-8', 'replace')], 'offset': offset})
+    reply = {'ok': True, 'offset': offset, 'log': str(log)}
+    if job is not None:
+        reply.update(jobId=job.id, state=job.state, exitCode=job.exit_code)
+    return reply
+
+
+async def handle_claim(payload: dict, conn: Connection) -> dict:
+    sanitized, host_path, error = validate_target(payload)
+    if error:
+        return error
+    error = validate_options(payload)
+    if error:
+        return error
+    task = POOL.claiming.get(sanitized)
+    if task is not None:
+        # A retry or duplicate of a claim that is still running: share its
+        # outcome rather than bind a second machine to the same sandbox.
+        POOL.merged += 1
+        return {**await asyncio.shield(task), 'merged': True}
+    # The claim runs as its own task, so a client that hangs up does not
+    # abandon a machine halfway through CLAIM_SCRIPT.
+    task = asyncio.get_running_loop().create_task(claim_sandbox(payload, conn, sanitized, host_path))
+    POOL.claiming[sanitized] = task
+    task.add_done_callback(lambda _: POOL.claiming.pop(sanitized, None))
+    return await asyncio.shield(task)
+
+
+async def claim_sandbox(payload: dict, conn: Connection, sanitized: str, host_path: str) -> dict:
+    started = asyncio.get_running_loop().time()
+    name = await POOL.claim(sanitized, host_path) if POOL.enabled else None
+    POOL.refill()
+    if name is None:
+        # Nothing warm to hand out: provision from scratch like create.
+        reply = await handle_create(payload, conn)
+        return {**reply, 'pooled': False}
+    elapsed_ms = round((asyncio.get_running_loop().time() - started) * 1000, 1)
+    logging.info('Claimed pool machine %s for %s in %.1f ms (trace %s)', name, sanitized, elapsed_ms,
+                 payload.get('traceId'))
+    if INDEX.enabled:
+        INDEX.record(sanitized, payload.get('sandboxId'), host_path, 'ready', None,
+                     conn.peer[1] if conn.peer else -1, payload.get('idlePolicy'))
+    return {
+        'ok': True, 'pooled': True, 'poolMachine': name, 'sandboxId': sanitized,
+        'originalSandboxId': payload.get('sandboxId'), 'log': str(install_log_path(sanitized)),
+        'claimMs': elapsed_ms, 'merged': False,
+    }
+
+
+async def handle_pool(payload: dict, conn: Connection) -> dict:
+    return {'ok': True, **POOL.stats()}
+
+
+def handle_templates(payload: dict, conn: Connection = None) -> dict:
+    return {'ok': True, **TEMPLATES.stats()}
+
+
+def handle_release(payload: dict, conn: Connection = None) -> dict:
+    """Drop a removed sandbox's copy-on-write root and its template reference."""
+    sanitized = sanitize_sandbox_id(payload.get('sandboxId'))
+    if not sanitized:
+        return {'ok': False, 'error': 'missing sandboxId'}
+    released = TEMPLATES.release(sanitized)
+    if INDEX.enabled:
+        INDEX.remove(sanitized)
+    return {'ok': True, 'sandboxId': sanitized, 'released': released}
+
+
+LIST_MAX = 1000
+
+
+async def handle_list(payload: dict, conn: Connection) -> dict:
+    """A page of the index in id order; pass the reply's "next" as "after" for the following page."""
+    state = payload.get('state')
+    after = payload.get('after') or ''
+    limit = payload.get('limit', 100)
+    if not isinstance(limit, int) or not 0 < limit <= LIST_MAX:
+        return {'ok': False, 'error': f'limit must be 1..{LIST_MAX}'}
+    if not isinstance(after, str) or (state is not None and not isinstance(state, str)):
+        return {'ok': False, 'error': 'invalid state or after'}
+    if not INDEX.enabled:
+        return {'ok': False, 'error': 'sandbox index unavailable'}
+    items = INDEX.list(state, after, limit)
+    return {'ok': True, 'sandboxes': items, 'next': items[-1]['sandboxId'] if len(items) == limit else None}
+
+
+async def handle_get(payload: dict, conn: Connection) -> dict:
+    sanitized = sanitize_sandbox_id(payload.get('sandboxId'))
+    if not sanitized:
+        return {'ok': False, 'error': 'missing sandboxId'}
+    if not INDEX.enabled:
+        return {'ok': False, 'error': 'sandbox index unavailable'}
+    item = INDEX.get(sanitized)
+    if item is None:
+        return {'ok': False, 'error': 'no such sandbox'}
+    usage = machine_usage(sanitized)
+    if usage is not None:
+        INDEX.record_usage(sanitized, *usage)
+        item.update(memoryBytes=usage[0], cpuSeconds=usage[1], usageAt=time.time())
+    item['running'] = usage is not None
+    job = SUPERVISOR.find({'sandboxId': sanitized})
+    return {'ok': True, **item, 'job': job_info(job) if job is not None else None}
+
+
+async def handle_touch(payload: dict, conn: Connection) -> dict:
+    """Record activity the daemon cannot see itself (web traffic through the proxy, say)."""
+    sanitized = sanitize_sandbox_id(payload.get('sandboxId'))
+    if not sanitized:
+        return {'ok': False, 'error': 'missing sandboxId'}
+    INDEX.touch(sanitized)
+    return {'ok': True, 'sandboxId': sanitized}
+
+
+def handle_gc(payload: dict, conn: Connection = None) -> dict:
+    max_age = payload.get('maxAge', TEMPLATE_GC_AGE)
+    if not isinstance(max_age, (int, float)) or max_age < 0:
+        return {'ok': False, 'error': 'invalid maxAge'}
+    return {'ok': True, 'removed': TEMPLATES.gc(max_age)}
+
+
+def current_gauges() -> dict:
+    """name: (help, value) for the gauges, read from the live objects."""
+    exec_stats = EXEC.stats()
+    running = sum(1 for job in SUPERVISOR.active() if job.state == 'running')
+    return {
+        'connections_active': ('Open client connections.', METRICS.connections_active),
+        'children': ('Child processes: running create scripts, exec shells and pool builds.',
+                     running + exec_stats['idle'] + exec_stats['busy'] + POOL.building),
+        'create_queue_depth': ('Creates waiting for admission.', SCHEDULER.queued),
+        'creates_running': ('Admitted creates that have not finished.', SCHEDULER.running),
+        'pool_idle': ('Idle warm pool machines.', len(POOL.idle)),
+    }
+
+
+async def handle_stats(payload: dict, conn: Connection) -> dict:
+    return {
+        'ok': True,
+        **METRICS.snapshot(),
+        'gauges': {name: value for name, (_, value) in current_gauges().items()},
+        'jobs': SUPERVISOR.stats(),
+        'scheduler': SCHEDULER.stats(),
+        'pool': POOL.stats(),
+        'exec': EXEC.stats(),
+        'index': INDEX.stats(),
+    }
+
+
+# Plain functions run on the worker thread pool; coroutine functions run on
+# the event loop and may send extra lines through the connection before
+# returning their reply.
+ACTIONS = {
+    'create': handle_create,
+    'claim': handle_claim,
+    'pool': handle_pool,
+    'templates': handle_templates,
+    'release': handle_release,
+    'gc': handle_gc,
+    'status': handle_status,
+    'wait': handle_wait,
+    'tail': handle_tail,
+    'exec': handle_exec,
+    'stats': handle_stats,
+    'list': handle_list,
+    'get': handle_get,
+    'touch': handle_touch,
+    'ping': handle_ping,
+}
+# Resolved once so dispatch does not inspect the handler on every request.
+ASYNC_ACTIONS = frozenset(name for name, handler in ACTIONS.items() if asyncio.iscoroutinefunction(handler))
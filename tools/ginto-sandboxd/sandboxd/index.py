@@ -0,0 +1,306 @@
+"""
+Index: the daemon records every sandbox it creates, claims or runs commands
+in, in a SQLite database (WAL mode) at STATE_DB: ids, host path, state,
+owner uid, times of creation and last activity, and memory/CPU use sampled
+from the machine's cgroup. "list" pages through it by id and "get" reads
+one row, both through indexes. Activity is batched in memory and written
+every few seconds.
+
+The idle reaper is off unless REAP_IDLE_SECONDS is set: it then wakes every
+REAP_INTERVAL and asks the index for the sandboxes idle longer than that
+(oldest first, at most REAP_BATCH), so it never walks the whole set; each
+is stopped or removed according to its "idlePolicy" from create/claim,
+unless its cgroup shows it used CPU since the last look. The daemon only
+sees its own create/claim/exec traffic, so whatever serves the sandbox's
+web preview must send "touch" before the reaper is turned on.
+"""
+import time
+import shlex
+import asyncio
+import logging
+import sqlite3
+import threading
+import subprocess
+from pathlib import Path
+
+from .common import machine_name, run_checked
+from .config import (
+    CGROUP_MACHINES, IDLE_POLICIES, INDEX_FLUSH_INTERVAL, REAP_BATCH, REAP_COMMAND_TIMEOUT, REAP_CPU_SECONDS,
+    REAP_DEFAULT_POLICY, REAP_IDLE_SECONDS, REAP_INTERVAL, REAP_REMOVE_COMMAND, REAP_STOP_COMMAND, STATE_DB,
+)
+from .scheduler import SCHEDULER
+from .supervisor import SUPERVISOR, Job
+from .templates import TEMPLATES
+
+
+def machine_usage(sanitized: str):
+    """(memory bytes, CPU seconds) from the machine's cgroup, or None when it is not running."""
+    # systemd escapes "-" in unit names.
+    scope = Path(CGROUP_MACHINES) / ('machine-' + machine_name(sanitized).replace('-', '\\x2d') + '.scope')
+    try:
+        memory = int((scope / 'memory.current').read_text())
+    except (OSError, ValueError):
+        return None
+    cpu = None
+    try:
+        for line in (scope / 'cpu.stat').read_text().splitlines():
+            if line.startswith('usage_usec '):
+                cpu = int(line.split()[1]) / 1e6
+    except (OSError, ValueError):
+        pass
+    return memory, cpu
+
+
+class SandboxIndex:
+    """
+    Sandboxes known to the daemon, in SQLite (WAL, so reads never wait for
+    the writer and a crash loses at most the last unflushed activity).
+
+    The daemon's own actions keep it current: create/claim insert or reset
+    a row, the job outcome sets ready/failed, exec and touch record
+    activity, the reaper sets stopped or deletes the row, release deletes
+    it. Activity updates are collected in a dict and written in one
+    transaction by flush(), so a busy exec path costs a dict store. The dict
+    has its own lock, which is never held across a query, so touch() on the
+    event loop does not wait for a flush running on the thread pool.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sandboxes (
+            id TEXT PRIMARY KEY,
+            original_id TEXT,
+            host_path TEXT,
+            state TEXT NOT NULL,
+            template TEXT,
+            owner_uid INTEGER,
+            policy TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            last_active REAL NOT NULL,
+            last_job TEXT,
+            exit_code INTEGER,
+            memory_bytes INTEGER,
+            cpu_seconds REAL,
+            usage_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS sandboxes_by_state ON sandboxes (state, id);
+        CREATE INDEX IF NOT EXISTS sandboxes_by_idleness ON sandboxes (state, policy, last_active);
+    """
+
+    def __init__(self, path: str, default_policy: str):
+        self.path = path
+        self.default_policy = default_policy if default_policy in IDLE_POLICIES else 'stop'
+        self.db = None
+        self.stopped = 0
+        self.removed = 0
+        self._touched = {}
+        self._touched_lock = threading.Lock()
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.db is not None
+
+    def open(self):
+        try:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(self.SCHEMA)
+            self.db = db
+        except (OSError, sqlite3.Error):
+            logging.exception('Sandbox index %s unavailable', self.path)
+
+    def close(self):
+        if self.db is not None:
+            self.flush()
+            self.db.close()
+            self.db = None
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def record(self, sandbox: str, original: str, host_path: str, state: str, template, uid: int,
+               policy, job_id=None):
+        now = time.time()
+        self._execute(
+            """INSERT INTO sandboxes (id, original_id, host_path, state, template, owner_uid, policy,
+                                      created_at, updated_at, last_active, last_job)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (id) DO UPDATE SET
+                   original_id = excluded.original_id, host_path = excluded.host_path, state = excluded.state,
+                   template = excluded.template, owner_uid = excluded.owner_uid, policy = excluded.policy,
+                   updated_at = excluded.updated_at, last_active = excluded.last_active,
+                   last_job = excluded.last_job, exit_code = NULL""",
+            (sandbox, original, host_path, state, template, uid, policy or self.default_policy,
+             now, now, now, job_id),
+        )
+
+    def watch(self, job: Job):
+        task = asyncio.get_running_loop().create_task(self._follow(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _follow(self, job: Job):
+        """Set the sandbox to ready or failed when its create job ends."""
+        await SUPERVISOR.wait(job, None)
+        self._execute(
+            'UPDATE sandboxes SET state = ?, exit_code = ?, updated_at = ? WHERE id = ? AND last_job = ?',
+            ('ready' if job.state == 'succeeded' else 'failed', job.exit_code, time.time(), job.sandbox, job.id),
+        )
+
+    def touch(self, sandbox: str):
+        if self.db is not None:
+            with self._touched_lock:
+                self._touched[sandbox] = time.time()
+
+    def pending(self, sandbox: str) -> bool:
+        """Whether activity for the sandbox is waiting to be flushed."""
+        return sandbox in self._touched
+
+    def flush(self):
+        """Write the activity collected since the last flush in one transaction."""
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        if not touched or self.db is None:
+            return
+        # An active sandbox we have no row for (made before the index
+        # existed) is adopted; a stopped one that is used again is running.
+        rows = [(sandbox, self.default_policy, at, at, at) for sandbox, at in touched.items()]
+        with self._lock:
+            self.db.execute('BEGIN')
+            try:
+                self.db.executemany(
+                    """INSERT INTO sandboxes (id, state, policy, created_at, updated_at, last_active)
+                       VALUES (?, 'ready', ?, ?, ?, ?)
+                       ON CONFLICT (id) DO UPDATE SET
+                           last_active = MAX(last_active, excluded.last_active),
+                           state = CASE WHEN state = 'stopped' THEN 'ready' ELSE state END""",
+                    rows,
+                )
+                self.db.execute('COMMIT')
+            except sqlite3.Error:
+                self.db.execute('ROLLBACK')
+                # Keep the activity for the next flush, next to anything
+                # touched while this one ran.
+                with self._touched_lock:
+                    for sandbox, at in touched.items():
+                        if at > self._touched.get(sandbox, 0):
+                            self._touched[sandbox] = at
+                raise
+
+    def set_state(self, sandbox: str, state: str):
+        self._execute('UPDATE sandboxes SET state = ?, updated_at = ? WHERE id = ?', (state, time.time(), sandbox))
+
+    def record_usage(self, sandbox: str, memory: int, cpu):
+        self._execute('UPDATE sandboxes SET memory_bytes = ?, cpu_seconds = ?, usage_at = ? WHERE id = ?',
+                      (memory, cpu, time.time(), sandbox))
+
+    def remove(self, sandbox: str):
+        with self._touched_lock:
+            self._touched.pop(sandbox, None)
+        self._execute('DELETE FROM sandboxes WHERE id = ?', (sandbox,))
+
+    def _row(self, row) -> dict:
+        return {
+            'sandboxId': row['id'], 'originalSandboxId': row['original_id'], 'hostPath': row['host_path'],
+            'state': row['state'], 'template': row['template'], 'ownerUid': row['owner_uid'],
+            'idlePolicy': row['policy'], 'createdAt': row['created_at'], 'updatedAt': row['updated_at'],
+            'lastActive': max(row['last_active'], self._touched.get(row['id'], 0)), 'lastJob': row['last_job'],
+            'exitCode': row['exit_code'], 'memoryBytes': row['memory_bytes'], 'cpuSeconds': row['cpu_seconds'],
+            'usageAt': row['usage_at'],
+        }
+
+    def get(self, sandbox: str):
+        rows = self._execute('SELECT * FROM sandboxes WHERE id = ?', (sandbox,))
+        return self._row(rows[0]) if rows else None
+
+    def list(self, state, after: str, limit: int) -> list:
+        """Keyset pagination by id, optionally within one state; each page is an index range scan."""
+        if state:
+            rows = self._execute('SELECT * FROM sandboxes WHERE state = ? AND id > ? ORDER BY id LIMIT ?',
+                                 (state, after, limit))
+        else:
+            rows = self._execute('SELECT * FROM sandboxes WHERE id > ? ORDER BY id LIMIT ?', (after, limit))
+        return [self._row(row) for row in rows]
+
+    def idle(self, cutoff: float, limit: int) -> list:
+        """Ready sandboxes with a stop/remove policy, idle since before `cutoff`, oldest first."""
+        return self._execute(
+            """SELECT id, policy, cpu_seconds FROM sandboxes
+               WHERE state = 'ready' AND policy IN ('stop', 'remove') AND last_active < ?
+               ORDER BY last_active LIMIT ?""",
+            (cutoff, limit),
+        )
+
+    def stats(self) -> dict:
+        return {'enabled': self.enabled, 'path': self.path, 'pendingActivity': len(self._touched),
+                'stopped': self.stopped, 'removed': self.removed}
+
+
+INDEX = SandboxIndex(STATE_DB, REAP_DEFAULT_POLICY)
+
+
+def reap_sandbox(sandbox: str, policy: str):
+    """Stop (and for the remove policy, delete) one idle sandbox; runs on the thread pool."""
+    machine = machine_name(sandbox)
+    try:
+        if machine_usage(sandbox) is not None:
+            run_checked(shlex.split(REAP_STOP_COMMAND.format(machine=machine)), timeout=REAP_COMMAND_TIMEOUT)
+        if policy == 'remove':
+            run_checked(shlex.split(REAP_REMOVE_COMMAND.format(machine=machine)), timeout=REAP_COMMAND_TIMEOUT)
+            TEMPLATES.release(sandbox)
+            INDEX.remove(sandbox)
+            INDEX.removed += 1
+        else:
+            INDEX.set_state(sandbox, 'stopped')
+            INDEX.stopped += 1
+        logging.info('Idle reaper: %s %s', 'removed' if policy == 'remove' else 'stopped', sandbox)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        # Leave it for another idle period instead of retrying every pass.
+        logging.warning('Idle reaper could not %s %s: %s', policy, sandbox, e)
+        INDEX.touch(sandbox)
+
+
+def sample_usage(sandbox: str):
+    """Read the machine's cgroup and record it in the index; runs on the thread pool."""
+    usage = machine_usage(sandbox)
+    if usage is not None:
+        INDEX.record_usage(sandbox, *usage)
+    return usage
+
+
+async def reap_idle():
+    loop = asyncio.get_running_loop()
+    candidates = await loop.run_in_executor(None, INDEX.idle, time.time() - REAP_IDLE_SECONDS, REAP_BATCH)
+    for row in candidates:
+        sandbox = row['id']
+        if INDEX.pending(sandbox) or SCHEDULER.find(sandbox) is not None:
+            continue
+        usage = await loop.run_in_executor(None, sample_usage, sandbox)
+        if usage is not None:
+            cpu = usage[1]
+            if cpu is not None and (row['cpu_seconds'] is None or cpu - row['cpu_seconds'] > REAP_CPU_SECONDS):
+                # Busy without talking to us (a server, a build), or no
+                # earlier sample to compare with: look again next idle period.
+                INDEX.touch(sandbox)
+                continue
+        await loop.run_in_executor(None, reap_sandbox, sandbox, row['policy'])
+
+
+async def index_loop():
+    loop = asyncio.get_running_loop()
+    next_reap = loop.time() + REAP_INTERVAL
+    while True:
+        await asyncio.sleep(INDEX_FLUSH_INTERVAL)
+        try:
+            await loop.run_in_executor(None, INDEX.flush)
+            if REAP_IDLE_SECONDS > 0 and loop.time() >= next_reap:
+                next_reap = loop.time() + REAP_INTERVAL
+                await reap_idle()
+        except Exception:
+            logging.exception('Sandbox index maintenance failed')
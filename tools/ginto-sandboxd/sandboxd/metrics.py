@@ -0,0 +1,127 @@
+"""
+Metrics: counters and histograms (request parse time and latency, errors
+by action, create queue wait and duration, template provisioning, event
+loop lag) kept in process. Gauges (connections, children, queue depth) are
+read from the live objects when asked for; see handlers.current_gauges.
+"""
+import bisect
+import threading
+import collections
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 3600.0)
+
+# name: (type, help, label names, histogram buckets)
+METRIC_DEFS = {
+    'requests_total': ('counter', 'Requests handled, by action.', ('action',), None),
+    'request_errors_total': ('counter', 'Requests answered with ok=false, by action.', ('action',), None),
+    'connections_total': ('counter', 'Connections accepted.', (), None),
+    'request_parse_seconds': ('histogram', 'Time to decode a request line.', (), LATENCY_BUCKETS),
+    'request_seconds': ('histogram', 'Time from request to reply, by action.', ('action',), LATENCY_BUCKETS),
+    'create_queue_wait_seconds': ('histogram', 'Time creates waited for admission.', (), DURATION_BUCKETS),
+    'create_seconds': ('histogram', 'Create job duration from request to exit, by outcome.', ('outcome',),
+                       DURATION_BUCKETS),
+    'provision_seconds': ('histogram', 'Template build/reuse plus root clone time.', (), DURATION_BUCKETS),
+    'children_reaped_total': ('counter', 'Create script processes reaped.', (), None),
+    'loop_lag_seconds': ('histogram', 'Event loop scheduling delay; accepts wait at least this long.', (),
+                         LATENCY_BUCKETS),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # bisect_left puts a value equal to a bound into that bucket (le).
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """
+    In-process counters and histograms.
+
+    Updates take a lock and a bisect, so they cost well under a microsecond
+    and can come from the thread pool as well as the loop. Gauges are not
+    stored: they are read from the live objects when somebody asks.
+    """
+
+    def __init__(self, defs: dict):
+        self.defs = defs
+        self.counters = collections.Counter()
+        self.histograms = {}
+        self.connections_active = 0
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, labels: tuple = (), value: int = 1):
+        with self._lock:
+            self.counters[name, labels] += value
+
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = Histogram(self.defs[name][3])
+            histogram.observe(value)
+
+    @staticmethod
+    def _labels(names, values, extra=None) -> str:
+        pairs = list(zip(names, values)) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+    def snapshot(self) -> dict:
+        """Counters and histograms as plain data, for the stats action."""
+        with self._lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, {})[','.join(labels) or 'total'] = value
+            histograms = {}
+            for (name, labels), h in sorted(self.histograms.items()):
+                histograms.setdefault(name, {})[','.join(labels) or 'total'] = {
+                    'count': h.count, 'sum': round(h.sum, 6),
+                    'buckets': {('+Inf' if b == float('inf') else repr(b)): n for b, n in h.cumulative()},
+                }
+        return {'counters': counters, 'histograms': histograms}
+
+    def render(self, gauges: dict) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        out = []
+        with self._lock:
+            for name, (kind, help_text, label_names, _) in self.defs.items():
+                full = f'ginto_sandboxd_{name}'
+                out.append(f'# HELP {full} {help_text}')
+                out.append(f'# TYPE {full} {kind}')
+                if kind == 'counter':
+                    for (metric, labels), value in sorted(self.counters.items()):
+                        if metric == name:
+                            out.append(f'{full}{self._labels(label_names, labels)} {value}')
+                    continue
+                for (metric, labels), h in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, total in h.cumulative():
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        out.append(f'{full}_bucket{self._labels(label_names, labels, ("le", le))} {total}')
+                    out.append(f'{full}_sum{self._labels(label_names, labels)} {h.sum}')
+                    out.append(f'{full}_count{self._labels(label_names, labels)} {h.count}')
+        for name, (help_text, value) in gauges.items():
+            full = f'ginto_sandboxd_{name}'
+            out += [f'# HELP {full} {help_text}', f'# TYPE {full} gauge', f'{full} {value}']
+        return '\n'.join(out) + '\n'
+
+
+METRICS = Metrics(METRIC_DEFS)
@@ -0,0 +1,183 @@
+"""
+Warm pool: with GINTO_SANDBOXD_POOL_HIGH > 0 the daemon keeps up to that
+many idle machines provisioned ahead of time (CREATE_SCRIPT run with a
+pool-<token> name and a directory under POOL_DIR). A claim hands one of
+them to a sandbox by running CLAIM_SCRIPT <pool machine> <sandbox id>
+<host path>, which renames/rebinds it. Refills start when fewer than
+POOL_LOW machines are idle and stop at POOL_HIGH, capped by the memory the
+host can spare.
+"""
+import os
+import asyncio
+import logging
+import secrets
+import collections
+from pathlib import Path
+
+from .common import install_log_path
+from .config import (
+    CLAIM_SCRIPT, CLAIM_TIMEOUT, CREATE_SCRIPT, POOL_BUILDERS, POOL_DIR, POOL_HIGH, POOL_LOW, POOL_MACHINE_MB,
+    POOL_READY_MARKER, POOL_RESERVE_MB,
+)
+from .templates import TEMPLATES, TemplateCache
+
+
+def available_memory_mb():
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class WarmPool:
+    """
+    Idle machines provisioned ahead of time, handed out by claim().
+
+    A machine counts as ready once CREATE_SCRIPT exited 0 for it; its pool
+    directory then gets a marker file, so machines built before a restart
+    are adopted again at startup.
+    """
+
+    def __init__(self, high: int, low: int, builders: int, pool_dir: str):
+        self.high = max(0, high)
+        self.low = min(max(0, low), self.high)
+        self.builders = max(1, builders)
+        self.pool_dir = Path(pool_dir)
+        self.idle = collections.deque()
+        self.building = 0
+        self.refilling = False
+        self.claims = 0
+        self.misses = 0
+        self.merged = 0
+        self.build_failures = 0
+        self.claiming = {}
+        self._tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.high > 0
+
+    def target(self) -> int:
+        """POOL_HIGH, reduced to what the available memory can hold."""
+        target = self.high
+        avail = available_memory_mb()
+        if avail is not None and POOL_MACHINE_MB > 0:
+            spare = (avail - POOL_RESERVE_MB) // POOL_MACHINE_MB + len(self.idle) + self.building
+            target = max(0, min(target, spare))
+        return target
+
+    def adopt_existing(self):
+        if not self.pool_dir.is_dir():
+            return
+        for entry in sorted(self.pool_dir.iterdir()):
+            if (entry / POOL_READY_MARKER).exists():
+                self.idle.append(entry.name)
+        if self.idle:
+            logging.info('Adopted %d idle pool machines', len(self.idle))
+
+    def refill(self):
+        """Start builds when below the low watermark, until the high one is reached."""
+        if not self.enabled:
+            return
+        have = len(self.idle) + self.building
+        if not self.refilling and have >= max(self.low, 1):
+            return
+        target = self.target()
+        self.refilling = have < target
+        while self.building < self.builders and len(self.idle) + self.building < target:
+            self.building += 1
+            task = asyncio.get_running_loop().create_task(self._build('pool-' + secrets.token_hex(4)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _build(self, name: str):
+        path = self.pool_dir / name
+        ok = False
+        try:
+            path.mkdir(parents=True, exist_ok=True)
+            with open(install_log_path(name), 'ab') as lf:
+                lf.write(b'=== pool build ===\n')
+                lf.flush()
+                env = None
+                if TEMPLATES.enabled:
+                    rootfs = await asyncio.get_running_loop().run_in_executor(None, self._clone_template, name, lf)
+                    env = dict(os.environ, GINTO_SANDBOX_ROOTFS=str(rootfs))
+                proc = await asyncio.create_subprocess_exec(
+                    CREATE_SCRIPT, name, str(path), stdout=lf, stderr=lf, env=env
+                )
+                ok = await proc.wait() == 0
+            if ok:
+                (path / POOL_READY_MARKER).touch()
+                self.idle.append(name)
+                logging.info('Pool machine %s ready (%d idle)', name, len(self.idle))
+            else:
+                self.build_failures += 1
+                logging.warning('Pool build of %s failed, see %s', name, install_log_path(name))
+        except Exception:
+            self.build_failures += 1
+            logging.exception('Pool build of %s failed', name)
+        finally:
+            self.building -= 1
+            if not ok:
+                # Back off instead of retrying a broken build in a tight loop.
+                self.refilling = False
+            else:
+                self.refill()
+
+    @staticmethod
+    def _clone_template(name: str, log) -> Path:
+        key = TEMPLATES.ensure(*TemplateCache.spec_from({}), log)
+        return TEMPLATES.clone(key, name)
+
+    async def claim(self, sanitized: str, host_path: str):
+        """Bind an idle machine to the sandbox; returns the machine name or None."""
+        while self.idle:
+            name = self.idle.popleft()
+            try:
+                (self.pool_dir / name / POOL_READY_MARKER).unlink()
+            except FileNotFoundError:
+                pass
+            try:
+                with open(install_log_path(sanitized), 'ab') as lf:
+                    lf.write(f'=== claimed pool machine {name} ===\n'.encode('utf-8'))
+                    lf.flush()
+                    proc = await asyncio.create_subprocess_exec(
+                        CLAIM_SCRIPT, name, sanitized, host_path, stdout=lf, stderr=lf
+                    )
+                    try:
+                        code = await asyncio.wait_for(proc.wait(), CLAIM_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        proc.kill()
+                        await proc.wait()
+                        code = None
+            except OSError:
+                logging.exception('Claim of %s for %s failed to start', name, sanitized)
+                code = None
+            if code == 0:
+                self.claims += 1
+                return name
+            logging.warning('Claim of %s for %s failed (exit %s); discarding it', name, sanitized, code)
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'idle': len(self.idle),
+            'building': self.building,
+            'target': self.target() if self.enabled else 0,
+            'high': self.high,
+            'low': self.low,
+            'claims': self.claims,
+            'misses': self.misses,
+            'merged': self.merged,
+            'claiming': len(self.claiming),
+            'buildFailures': self.build_failures,
+        }
+
+
+POOL = WarmPool(POOL_HIGH, POOL_LOW, POOL_BUILDERS, POOL_DIR)
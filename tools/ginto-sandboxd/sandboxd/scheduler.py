@@ -0,0 +1,154 @@
+"""
+Admission control: creates do not all start at once. Each one becomes a
+queued job; at most CREATE_CONCURRENCY run together (half the CPUs, up to
+8, by default) and none are admitted while the host's CPU or I/O pressure
+(PSI) is above CREATE_MAX_PRESSURE. Queued creates are admitted round-robin
+across caller uids, so one busy caller cannot starve the others, and a
+create for an id that already has a queued or running job joins that job
+instead of installing twice.
+"""
+import time
+import asyncio
+import logging
+import collections
+
+from .config import CREATE_CONCURRENCY, CREATE_MAX_PRESSURE, CREATE_QUEUE_MAX, PRESSURE_RECHECK
+from .metrics import METRICS
+from .supervisor import SUPERVISOR, Job
+
+
+def host_pressure():
+    """The highest 10 s "some" stall percentage of CPU and I/O, or None without PSI."""
+    worst = None
+    for resource in ('cpu', 'io'):
+        try:
+            with open(f'/proc/pressure/{resource}') as f:
+                for line in f:
+                    if line.startswith('some '):
+                        avg10 = float(line.split()[1].partition('=')[2])
+                        worst = avg10 if worst is None else max(worst, avg10)
+        except (OSError, ValueError, IndexError):
+            pass
+    return worst
+
+
+class CreateScheduler:
+    """
+    Bounded, fair admission of create jobs.
+
+    Each caller uid has its own FIFO; admission takes the head of the uid at
+    the front and moves that uid to the back, so uids are served
+    round-robin. A job holds its slot until its process exits (template
+    builds and clones included). While the host is under pressure nothing
+    more is admitted, except when nothing is running at all.
+    """
+
+    def __init__(self, limit: int, queue_max: int, max_pressure: int):
+        self.limit = max(1, limit)
+        self.queue_max = queue_max
+        self.max_pressure = max_pressure
+        self.queues = collections.OrderedDict()
+        self.inflight = {}
+        self.queued = 0
+        self.running = 0
+        self.admitted = 0
+        self.merged = 0
+        self.rejected = 0
+        self.deferred = 0
+        self._recheck = None
+        self._tasks = set()
+        self.closed = False
+
+    @property
+    def full(self) -> bool:
+        return self.queued >= self.queue_max
+
+    def find(self, sandbox: str):
+        """The queued or running job for a sandbox, if there is one."""
+        return self.inflight.get(sandbox)
+
+    def submit(self, uid: int, job: Job, start):
+        """Queue `job`; `start()` runs on the thread pool once it is admitted."""
+        job.state = 'queued'
+        self.inflight[job.sandbox] = job
+        self.queues.setdefault(uid, collections.deque()).append((job, start))
+        self.queued += 1
+        self._admit()
+
+    def _under_pressure(self) -> bool:
+        if self.max_pressure <= 0:
+            return False
+        pressure = host_pressure()
+        return pressure is not None and pressure >= self.max_pressure
+
+    def _admit(self):
+        if self.closed:
+            return
+        loop = asyncio.get_running_loop()
+        while self.queued and self.running < self.limit:
+            if self.running and self._under_pressure():
+                self.deferred += 1
+                if self._recheck is None:
+                    self._recheck = loop.call_later(PRESSURE_RECHECK, self._on_recheck)
+                return
+            uid, queue = next(iter(self.queues.items()))
+            job, start = queue.popleft()
+            del self.queues[uid]
+            if queue:
+                self.queues[uid] = queue
+            self.queued -= 1
+            self.running += 1
+            self.admitted += 1
+            job.state = 'preparing'
+            job.admitted = time.time()
+            METRICS.observe('create_queue_wait_seconds', job.admitted - job.created)
+            task = loop.create_task(self._run(job, start))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _on_recheck(self):
+        self._recheck = None
+        self._admit()
+
+    async def _run(self, job: Job, start):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, start)
+            await SUPERVISOR.wait(job, None)
+        except Exception:
+            logging.exception('Create job %s failed', job.id)
+        finally:
+            self.running -= 1
+            if self.inflight.get(job.sandbox) is job:
+                del self.inflight[job.sandbox]
+            self._admit()
+
+    def close(self):
+        """Stop admitting at shutdown; queued jobs are dropped and running ones are left to finish."""
+        self.closed = True
+        if self._recheck is not None:
+            self._recheck.cancel()
+            self._recheck = None
+        if self.queued:
+            logging.warning('Dropping %d queued creates at shutdown', self.queued)
+
+    def position(self, job: Job):
+        """1-based place of a queued job in admission order, else None."""
+        queues = [[queued for queued, _ in queue] for queue in self.queues.values()]
+        place = 0
+        for turn in range(max(map(len, queues), default=0)):
+            for queue in queues:
+                if turn < len(queue):
+                    place += 1
+                    if queue[turn] is job:
+                        return place
+        return None
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit, 'running': self.running, 'queued': self.queued, 'callers': len(self.queues),
+            'admitted': self.admitted, 'merged': self.merged, 'rejected': self.rejected,
+            'deferred': self.deferred, 'pressure': host_pressure(),
+        }
+
+
+SCHEDULER = CreateScheduler(CREATE_CONCURRENCY, CREATE_QUEUE_MAX, CREATE_MAX_PRESSURE)
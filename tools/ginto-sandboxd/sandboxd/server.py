@@ -0,0 +1,256 @@
+"""
+The listening socket, request framing and dispatch, the metrics endpoint
+and the daemon's start and shutdown.
+"""
+import os
+import sys
+import stat
+import json
+import time
+import signal
+import socket
+import asyncio
+import logging
+import concurrent.futures
+
+from .config import (
+    IDLE_TIMEOUT, INSTALL_LOG_DIR, LISTEN_BACKLOG, LOOP_LAG_INTERVAL, MAX_REQUEST_BYTES, METRICS_LISTEN,
+    READ_TIMEOUT, SD_LISTEN_FDS_START, SHUTDOWN_GRACE, SOCKET_PATH, WORKER_THREADS,
+)
+from .connection import CONNECTIONS, Connection, close_connections
+from .exec_channels import EXEC
+from .handlers import ACTIONS, ASYNC_ACTIONS, current_gauges
+from .index import INDEX, index_loop
+from .metrics import METRICS
+from .pool import POOL
+from .scheduler import SCHEDULER
+from .supervisor import SUPERVISOR
+from .templates import TEMPLATES, template_gc_loop
+
+
+async def dispatch(payload: dict, conn: Connection) -> dict:
+    action = payload.get('action')
+    handler = ACTIONS.get(action)
+    # Unknown actions share one label so clients cannot grow the metrics.
+    label = (action if handler is not None else 'unknown',)
+    started = time.perf_counter()
+    if handler is None:
+        reply = {'ok': False, 'error': 'unknown action'}
+    else:
+        try:
+            if action in ASYNC_ACTIONS:
+                reply = await handler(payload, conn)
+            else:
+                loop = asyncio.get_running_loop()
+                reply = await loop.run_in_executor(None, handler, payload, conn)
+        except Exception as e:
+            logging.exception('Error handling %s (trace %s)', action, payload.get('traceId'))
+            reply = {'ok': False, 'error': f'internal error: {e}'}
+    METRICS.observe('request_seconds', time.perf_counter() - started, label)
+    METRICS.inc('requests_total', label)
+    if not reply.get('ok'):
+        METRICS.inc('request_errors_total', label)
+    return reply
+
+
+async def handle_metrics_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Answer any HTTP request with the Prometheus text exposition."""
+    try:
+        await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), READ_TIMEOUT)
+        body = METRICS.render(current_gauges()).encode('utf-8')
+        writer.write(b'HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                     b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+# Sockets are created 0660 from the start instead of chmodded after bind.
+SOCKET_UMASK = 0o117
+
+
+async def start_unix_listener(handler, path: str, **kwargs):
+    """Listen on a UNIX socket at `path`, replacing a stale socket but nothing else."""
+    try:
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise FileExistsError(f'{path} exists and is not a socket')
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    previous = os.umask(SOCKET_UMASK)
+    try:
+        return await asyncio.start_unix_server(handler, path=path, **kwargs)
+    finally:
+        os.umask(previous)
+
+
+async def start_metrics_server(listen: str):
+    """Serve metrics on a UNIX socket path or a host:port; None when disabled or failing."""
+    if not listen:
+        return None
+    try:
+        if listen.startswith('/'):
+            server = await start_unix_listener(handle_metrics_http, listen)
+        else:
+            host, _, port = listen.rpartition(':')
+            server = await asyncio.start_server(handle_metrics_http, host or '127.0.0.1', int(port))
+    except (OSError, ValueError):
+        logging.exception('Could not serve metrics on %s', listen)
+        return None
+    logging.info('Serving metrics on %s', listen)
+    return server
+
+
+async def loop_lag_monitor():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        METRICS.observe('loop_lag_seconds', max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    conn = Connection(reader, writer)
+    CONNECTIONS.add(conn)
+    timeout = READ_TIMEOUT
+    METRICS.inc('connections_total')
+    METRICS.connections_active += 1
+    try:
+        while not conn.closing:
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+            except asyncio.TimeoutError:
+                break
+            except ValueError:
+                # No newline within MAX_REQUEST_BYTES; the framing is lost.
+                await conn.send({'ok': False, 'error': 'request too large'})
+                break
+            if not line:
+                break
+            timeout = IDLE_TIMEOUT
+            if not line.strip():
+                continue
+            conn.busy = True
+            parse_started = time.perf_counter()
+            try:
+                payload = json.loads(line.decode('utf-8'))
+                if not isinstance(payload, dict):
+                    raise ValueError('request must be an object')
+            except ValueError:
+                await conn.send({'ok': False, 'error': 'invalid json'})
+                conn.busy = False
+                continue
+            finally:
+                METRICS.observe('request_parse_seconds', time.perf_counter() - parse_started)
+
+            reply = await dispatch(payload, conn)
+            if 'id' in payload:
+                reply = {'id': payload['id'], **reply}
+            await conn.send(reply)
+            conn.busy = False
+    except (ConnectionError, BrokenPipeError):
+        pass
+    except asyncio.CancelledError:
+        # Hung up at shutdown; ending normally keeps asyncio from logging it.
+        pass
+    except Exception:
+        logging.exception('Error handling connection')
+    finally:
+        CONNECTIONS.discard(conn)
+        METRICS.connections_active -= 1
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except (Exception, asyncio.CancelledError):
+            pass
+
+
+def activated_socket():
+    """Return the listening socket systemd passed in (LISTEN_FDS), or None.
+
+    The LISTEN_* variables are removed either way, so create scripts and
+    exec shells do not inherit them.
+    """
+    pid = os.environ.pop('LISTEN_PID', None)
+    count = os.environ.pop('LISTEN_FDS', None)
+    os.environ.pop('LISTEN_FDNAMES', None)
+    try:
+        if pid is None or int(pid) != os.getpid() or int(count) < 1:
+            return None
+    except (TypeError, ValueError):
+        return None
+    if int(count) > 1:
+        logging.warning('LISTEN_FDS=%s; only the first socket is served', count)
+    try:
+        sock = socket.socket(fileno=SD_LISTEN_FDS_START)
+    except OSError as e:
+        logging.error('Passed socket is unusable: %s', e)
+        return None
+    if sock.family != socket.AF_UNIX or sock.type != socket.SOCK_STREAM:
+        # Peer credentials need a UNIX stream socket.
+        logging.error('Passed socket is not a UNIX stream socket; binding %s instead', SOCKET_PATH)
+        sock.close()
+        return None
+    sock.set_inheritable(False)
+    return sock
+
+
+async def _serve(socket_path: str):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(WORKER_THREADS, thread_name_prefix='sandboxd'))
+    SUPERVISOR.attach(loop)
+    await loop.run_in_executor(None, INDEX.open)
+    # With socket activation systemd owns the socket and keeps it open
+    # across restarts; connections made meanwhile wait in its backlog.
+    sock = activated_socket()
+    if sock is not None:
+        server = await asyncio.start_unix_server(
+            handle_connection, sock=sock, limit=MAX_REQUEST_BYTES, backlog=LISTEN_BACKLOG
+        )
+        logging.info('ginto_sandboxd listening on %s (socket activated)', sock.getsockname())
+    else:
+        server = await start_unix_listener(
+            handle_connection, socket_path, limit=MAX_REQUEST_BYTES, backlog=LISTEN_BACKLOG
+        )
+        logging.info('ginto_sandboxd listening on %s', socket_path)
+    metrics_server = await start_metrics_server(METRICS_LISTEN)
+    index_task = loop.create_task(index_loop()) if INDEX.enabled else None
+    lag_task = loop.create_task(loop_lag_monitor())
+    gc_task = None
+    if TEMPLATES.enabled:
+        await loop.run_in_executor(None, TEMPLATES.remount)
+        gc_task = loop.create_task(template_gc_loop())
+    if POOL.enabled:
+        POOL.adopt_existing()
+        POOL.refilling = True
+        POOL.refill()
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    await close_connections(SHUTDOWN_GRACE)
+    if gc_task is not None:
+        gc_task.cancel()
+    lag_task.cancel()
+    if metrics_server is not None:
+        metrics_server.close()
+    if index_task is not None:
+        index_task.cancel()
+    SCHEDULER.close()
+    await EXEC.close_all()
+    INDEX.close()
+    logging.info('ginto_sandboxd stopped')
+
+
+def serve():
+    try:
+        os.makedirs(INSTALL_LOG_DIR, exist_ok=True)
+        logging.basicConfig(filename=os.path.join(INSTALL_LOG_DIR, 'ginto_sandboxd.log'), level=logging.INFO,
+                            format='%(asctime)s %(levelname)s %(message)s')
+    except OSError:
+        logging.basicConfig(stream=sys.stderr, level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    asyncio.run(_serve(SOCKET_PATH))
@@ -0,0 +1,259 @@
+"""
+Jobs: every create script the daemon starts is a job in a table holding its
+state, exit code and timings, addressed by the "jobId" from the create reply
+or by sandbox id (its latest job). Children are reaped as soon as they exit,
+through a pidfd per child where the kernel supports it and SIGCHLD otherwise.
+"""
+import os
+import time
+import signal
+import asyncio
+import logging
+import threading
+import subprocess
+import collections
+from pathlib import Path
+
+from .common import sanitize_sandbox_id
+from .config import CREATE_SCRIPT, JOB_HISTORY
+from .metrics import METRICS
+from .templates import TEMPLATES
+
+
+class Job:
+    """One supervised create: its process, state and timings."""
+
+    def __init__(self, job_id: str, kind: str, sandbox: str, log: Path, trace: str = None):
+        self.id = job_id
+        self.kind = kind
+        self.sandbox = sandbox
+        self.log = log
+        self.trace = trace
+        # queued -> preparing -> running -> succeeded | failed
+        self.state = 'preparing'
+        self.proc = None
+        self.exit_code = None
+        self.error = None
+        self.created = time.time()
+        self.admitted = None
+        self.started = None
+        self.ended = None
+        self.waiters = []
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ('succeeded', 'failed')
+
+    def banner(self, text: str) -> bytes:
+        """An install log header line, tagged with the trace id if there is one."""
+        trace = f' (trace {self.trace})' if self.trace else ''
+        return f'=== {text}{trace} ===\n'.encode('utf-8')
+
+    def to_dict(self) -> dict:
+        end = self.ended if self.ended is not None else time.time()
+        return {
+            'jobId': self.id,
+            'kind': self.kind,
+            'sandboxId': self.sandbox,
+            'state': self.state,
+            'pid': self.proc.pid if self.proc is not None else None,
+            'exitCode': self.exit_code,
+            'error': self.error,
+            'traceId': self.trace,
+            'createdAt': self.created,
+            'admittedAt': self.admitted,
+            'startedAt': self.started,
+            'endedAt': self.ended,
+            'elapsedSeconds': round(end - self.created, 3),
+            'log': str(self.log),
+        }
+
+
+class Supervisor:
+    """
+    Job table for the processes the daemon starts.
+
+    Jobs are created from any thread; everything after that (reaping, state
+    changes, waking waiters) happens on the event loop. Each child gets a
+    pidfd registered with the loop, which becomes readable when the child
+    exits; without pidfd_open (Python < 3.9 or an old kernel) a SIGCHLD
+    handler polls the running jobs instead. Either way only our own pids
+    are waited for, so asyncio's child watcher keeps working for the
+    subprocesses it started.
+    """
+
+    def __init__(self, history: int):
+        self.history = history
+        self.jobs = collections.OrderedDict()
+        self.latest = {}
+        self.loop = None
+        self.reaped = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._use_pidfd = hasattr(os, 'pidfd_open')
+
+    def attach(self, loop):
+        self.loop = loop
+        if self._use_pidfd:
+            try:
+                os.close(os.pidfd_open(os.getpid()))
+            except OSError:
+                self._use_pidfd = False
+        if not self._use_pidfd:
+            loop.add_signal_handler(signal.SIGCHLD, self._poll_running)
+        logging.info('Reaping children through %s', 'pidfd' if self._use_pidfd else 'SIGCHLD')
+
+    def new_job(self, kind: str, sandbox: str, log: Path, trace: str = None) -> Job:
+        with self._lock:
+            self._seq += 1
+            job = Job(f'{sandbox}-{self._seq}', kind, sandbox, log, trace)
+            self.jobs[job.id] = job
+            self.latest[sandbox] = job
+            self._trim()
+        return job
+
+    def _trim(self):
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job.id]
+            if self.latest.get(job.sandbox) is job:
+                del self.latest[job.sandbox]
+
+    def find(self, payload: dict):
+        """The job named by "jobId", or the latest job of "sandboxId"."""
+        with self._lock:
+            job_id = payload.get('jobId')
+            if isinstance(job_id, str):
+                return self.jobs.get(job_id)
+            return self.latest.get(sanitize_sandbox_id(payload.get('sandboxId')))
+
+    def spawn(self, job: Job, cmd: list, env=None):
+        """Start the job's process with its output going to the job log."""
+        with open(job.log, 'ab') as lf:
+            lf.write(job.banner('create request received'))
+            lf.flush()
+            job.proc = subprocess.Popen(cmd, stdout=lf, stderr=lf, env=env)
+        job.started = time.time()
+        job.state = 'running'
+        self.loop.call_soon_threadsafe(self._watch, job)
+        return job.proc
+
+    def fail(self, job: Job, error: str):
+        """Mark a job that never got to run its process as failed."""
+        self.loop.call_soon_threadsafe(self._finish, job, None, error)
+
+    def _watch(self, job: Job):
+        if self._use_pidfd:
+            try:
+                fd = os.pidfd_open(job.proc.pid)
+            except ProcessLookupError:
+                # Already reaped by someone else; poll() reports what it can.
+                self._check(job)
+                return
+            self.loop.add_reader(fd, self._on_pidfd, job, fd)
+        else:
+            self._check(job)
+
+    def _on_pidfd(self, job: Job, fd: int):
+        self.loop.remove_reader(fd)
+        os.close(fd)
+        job.proc.wait()
+        self._check(job)
+
+    def _poll_running(self):
+        for job in list(self.jobs.values()):
+            if job.state == 'running':
+                self._check(job)
+
+    def _check(self, job: Job):
+        if job.state == 'running' and job.proc.poll() is not None:
+            self.reaped += 1
+            METRICS.inc('children_reaped_total')
+            self._finish(job, job.proc.returncode, None)
+
+    def _finish(self, job: Job, code, error):
+        if job.finished:
+            return
+        job.exit_code = code
+        job.error = error
+        job.ended = time.time()
+        job.state = 'succeeded' if code == 0 else 'failed'
+        logging.info('Job %s %s (exit %s) after %.1fs%s', job.id, job.state, code, job.ended - job.created,
+                     f' trace={job.trace}' if job.trace else '')
+        METRICS.observe('create_seconds', job.ended - job.created, (job.state,))
+        for waiter in job.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        job.waiters = []
+        with self._lock:
+            self._trim()
+
+    async def wait(self, job: Job, timeout: float) -> bool:
+        """Wait on the loop until the job ends; False when the timeout passed first."""
+        if job.finished:
+            return True
+        waiter = self.loop.create_future()
+        job.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def active(self) -> list:
+        with self._lock:
+            return [job for job in self.jobs.values() if not job.finished]
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = collections.Counter(job.state for job in self.jobs.values())
+        return {'jobs': len(self.jobs), 'reaped': self.reaped, 'states': dict(states),
+                'reaper': 'pidfd' if self._use_pidfd else 'sigchld'}
+
+
+SUPERVISOR = Supervisor(JOB_HISTORY)
+
+
+def launch_create(job: Job, host_path: str, env=None):
+    return SUPERVISOR.spawn(job, [CREATE_SCRIPT, job.sandbox, host_path], env)
+
+
+def provision_from_template(job: Job, host_path: str, spec):
+    """Build or reuse the template, clone the sandbox root and run CREATE_SCRIPT on top of it."""
+    sanitized, install_log = job.sandbox, job.log
+    try:
+        with open(install_log, 'ab') as lf:
+            lf.write(job.banner('provisioning'))
+            lf.flush()
+            provision_started = time.time()
+            key = TEMPLATES.ensure(spec[0], spec[1], lf)
+            started = time.time()
+            try:
+                rootfs = TEMPLATES.clone(key, sanitized)
+            except FileNotFoundError:
+                # gc() removed the template between ensure() and clone().
+                key = TEMPLATES.ensure(spec[0], spec[1], lf)
+                rootfs = TEMPLATES.clone(key, sanitized)
+            lf.write(f'=== rootfs {rootfs} from template {key} ({TEMPLATES.mode()}, '
+                     f'{(time.time() - started) * 1000:.0f} ms) ===\n'.encode('utf-8'))
+        METRICS.observe('provision_seconds', time.time() - provision_started)
+        env = dict(os.environ, GINTO_SANDBOX_ROOTFS=str(rootfs), GINTO_SANDBOX_TEMPLATE=key)
+        p = launch_create(job, host_path, env)
+        logging.info('Launched create script for %s on template %s (pid=%s)', sanitized, key, p.pid)
+    except Exception as e:
+        logging.exception('Provisioning %s from a template failed', sanitized)
+        SUPERVISOR.fail(job, str(e))
+        with open(install_log, 'ab') as lf:
+            lf.write(f'=== provisioning failed: {e} ===\n'.encode('utf-8'))
+
+
+def run_create(job: Job, host_path: str):
+    # Execute the create script directly (no shell) as root. This daemon
+    # runs as root, so it can execute the script without sudo. We pass
+    # arguments directly to avoid shell injection.
+    try:
+        p = launch_create(job, host_path)
+        logging.info('Launched create script for %s (pid=%s) writing to %s', job.sandbox, p.pid, str(job.log))
+    except Exception as e:
+        logging.exception('Failed to launch create script')
+        SUPERVISOR.fail(job, str(e))
@@ -0,0 +1,326 @@
+"""
+Template cache: when TEMPLATE_SCRIPT exists, create does not install from
+scratch. The base root filesystem for the request's "template" and
+"packages" is built once (keyed by a hash of both and of the script), and
+each sandbox gets a btrfs snapshot, reflink copy or overlayfs upper layer of
+it, passed to CREATE_SCRIPT as $GINTO_SANDBOX_ROOTFS. Roots hold references
+on their template; "release" drops one and unreferenced templates are
+garbage collected after TEMPLATE_GC_AGE.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import threading
+import subprocess
+from pathlib import Path
+
+from .common import run_checked, sanitize_sandbox_id
+from .config import (
+    ROOTFS_MODE, ROOTS_DIR, TEMPLATE_DIR, TEMPLATE_GC_AGE, TEMPLATE_GC_INTERVAL, TEMPLATE_SCRIPT,
+)
+
+
+PACKAGE_RE = re.compile(r'^[a-z0-9][a-z0-9+.:-]{0,127}$')
+ROOTFS_MODES = ('btrfs', 'reflink', 'overlay')
+
+
+class TemplateCache:
+    """
+    Base root filesystems built once and shared copy-on-write.
+
+    A template is keyed by a hash of its name, its package list and the
+    build script itself, so changing any of them builds a new one. Each
+    sandbox root is a btrfs snapshot, a reflink copy or an overlayfs upper
+    layer on top of its template, and holds a reference (a file under the
+    template's refs/ directory, so counts survive restarts). Templates
+    without references are removed by gc() once unused for TEMPLATE_GC_AGE.
+    """
+
+    def __init__(self, script: str, template_dir: str, roots_dir: str, mode: str = 'auto'):
+        self.script = script
+        self.template_dir = Path(template_dir)
+        self.roots_dir = Path(roots_dir)
+        self.requested_mode = mode
+        self._mode = None
+        self._lock = threading.Lock()
+        # key -> [lock, callers using it]; dropped when the last one is done.
+        self._building = {}
+        self.builds = 0
+        self.build_failures = 0
+        self.hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.script) and os.path.isfile(self.script)
+
+    @staticmethod
+    def spec_from(payload: dict):
+        """Return (template name, sorted packages) from a request, or raise ValueError."""
+        name = sanitize_sandbox_id(payload.get('template') or 'default')
+        packages = payload.get('packages') or []
+        if not name or not isinstance(packages, list) or len(packages) > 500:
+            raise ValueError('invalid template or packages')
+        for package in packages:
+            if not isinstance(package, str) or not PACKAGE_RE.match(package):
+                raise ValueError(f'invalid package name: {package!r}')
+        return name, sorted(set(packages))
+
+    def key_for(self, name: str, packages: list) -> str:
+        digest = hashlib.sha256()
+        with open(self.script, 'rb') as f:
+            digest.update(f.read())
+        digest.update(json.dumps([name, packages]).encode('utf-8'))
+        return f'{name}-{digest.hexdigest()[:16]}'
+
+    def mode(self) -> str:
+        """The clone strategy for this host: the configured one, or the best that works."""
+        if self._mode is None:
+            mode = self.requested_mode
+            if mode not in ROOTFS_MODES:
+                self.template_dir.mkdir(parents=True, exist_ok=True)
+                fstype = run_checked(['stat', '-f', '-c', '%T', str(self.template_dir)]).stdout.decode().strip()
+                if fstype == 'btrfs':
+                    mode = 'btrfs'
+                else:
+                    probe = self.template_dir / '.reflink-probe'
+                    probe.write_bytes(b'x')
+                    try:
+                        run_checked(['cp', '--reflink=always', str(probe), str(probe) + '.copy'])
+                        mode = 'reflink'
+                    except subprocess.CalledProcessError:
+                        mode = 'overlay'
+                    finally:
+                        for p in (probe, Path(str(probe) + '.copy')):
+                            try:
+                                p.unlink()
+                            except FileNotFoundError:
+                                pass
+            self._mode = mode
+            logging.info('Template cache using %s clones', mode)
+        return self._mode
+
+    def ensure(self, name: str, packages: list, log) -> str:
+        """Build the template unless it exists; concurrent callers wait for one build."""
+        key = self.key_for(name, packages)
+        final = self.template_dir / key
+        with self._lock:
+            if (final / 'rootfs').is_dir():
+                self.hits += 1
+                return key
+            building = self._building.setdefault(key, [threading.Lock(), 0])
+            building[1] += 1
+        try:
+            with building[0]:
+                if (final / 'rootfs').is_dir():
+                    self.hits += 1
+                    return key
+                work = self.template_dir / f'.{key}.building'
+                self._discard(work)
+                try:
+                    self._build(name, packages, key, work, log)
+                    os.rename(work, final)
+                except BaseException:
+                    self.build_failures += 1
+                    self._discard(work)
+                    raise
+                self.builds += 1
+        finally:
+            with self._lock:
+                building[1] -= 1
+                if not building[1]:
+                    self._building.pop(key, None)
+        return key
+
+    def _build(self, name: str, packages: list, key: str, work: Path, log):
+        work.mkdir(parents=True)
+        rootfs = work / 'rootfs'
+        if self.mode() == 'btrfs':
+            run_checked(['btrfs', 'subvolume', 'create', str(rootfs)])
+        else:
+            rootfs.mkdir()
+        log.write(f'=== building template {key} ===\n'.encode('utf-8'))
+        log.flush()
+        started = time.time()
+        subprocess.run([self.script, name, str(rootfs)] + packages, stdout=log, stderr=log, check=True)
+        (work / 'refs').mkdir()
+        (work / 'template.json').write_text(json.dumps({
+            'name': name, 'packages': packages, 'builtAt': started, 'buildSeconds': round(time.time() - started, 1),
+        }))
+        logging.info('Built template %s in %.1fs', key, time.time() - started)
+
+    def _discard(self, work: Path):
+        """Remove a partly built template."""
+        if work.exists():
+            self._remove_tree(work / 'rootfs')
+            shutil.rmtree(work, ignore_errors=True)
+
+    def clone(self, key: str, sandbox: str) -> Path:
+        """
+        Give `sandbox` its own copy-on-write root on top of template `key`; returns the root.
+
+        A sandbox that already has a root on the same template gets that
+        root back untouched, so a retried create never wipes a running
+        sandbox. Any other existing root is refused: only release() deletes.
+        Raises FileNotFoundError when gc() removed the template after ensure().
+        """
+        template = self.template_dir / key
+        root = self.roots_dir / sandbox
+        meta_path = self._meta_path(sandbox)
+        mode = self.mode()
+        rootfs = root / 'merged' if mode == 'overlay' else root
+        self.roots_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if meta_path.exists():
+                try:
+                    meta = json.loads(meta_path.read_text())
+                except (OSError, ValueError):
+                    meta = {}
+                if meta.get('ready') and meta.get('template') == key:
+                    return Path(meta['rootfs'])
+                raise RuntimeError(f'sandbox {sandbox} already has a root; release it first')
+            if os.path.lexists(root):
+                raise RuntimeError(f'sandbox {sandbox} has a root without metadata; remove {root} first')
+            # gc() checks refs/ under the same lock, so the template cannot
+            # be deleted once the reference exists.
+            if not (template / 'rootfs').is_dir():
+                raise FileNotFoundError(f'template {key} was removed')
+            (template / 'refs' / sandbox).touch()
+            os.utime(template / 'refs')
+            meta = {'template': key, 'mode': mode, 'rootfs': str(rootfs), 'ready': False}
+            meta_path.write_text(json.dumps(meta))
+        try:
+            if mode == 'btrfs':
+                run_checked(['btrfs', 'subvolume', 'snapshot', str(template / 'rootfs'), str(root)])
+            elif mode == 'reflink':
+                run_checked(['cp', '-a', '--reflink=always', str(template / 'rootfs'), str(root)])
+            else:
+                for part in ('upper', 'work', 'merged'):
+                    (root / part).mkdir(parents=True, exist_ok=True)
+                self._mount_overlay(template, root)
+        except BaseException:
+            # Only the partial root this call made, never one that was there.
+            self.release(sandbox)
+            raise
+        meta['ready'] = True
+        meta_path.write_text(json.dumps(meta))
+        return rootfs
+
+    def _meta_path(self, sandbox: str) -> Path:
+        return self.roots_dir / f'{sandbox}.json'
+
+    def _mount_overlay(self, template: Path, root: Path):
+        options = f'lowerdir={template / "rootfs"},upperdir={root / "upper"},workdir={root / "work"}'
+        run_checked(['mount', '-t', 'overlay', 'overlay', '-o', options, str(root / 'merged')])
+
+    def _remove_tree(self, path: Path):
+        if not path.exists():
+            return
+        if self.mode() == 'btrfs':
+            try:
+                run_checked(['btrfs', 'subvolume', 'delete', str(path)])
+                return
+            except subprocess.CalledProcessError:
+                pass
+        shutil.rmtree(path, ignore_errors=True)
+
+    def release(self, sandbox: str) -> bool:
+        """Remove a sandbox root and drop its template reference."""
+        meta_path = self._meta_path(sandbox)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return False
+        root = self.roots_dir / sandbox
+        if meta.get('mode') == 'overlay':
+            subprocess.run(['umount', str(root / 'merged')], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            shutil.rmtree(root, ignore_errors=True)
+        else:
+            self._remove_tree(root)
+        refs = self.template_dir / meta.get('template', '') / 'refs'
+        try:
+            (refs / sandbox).unlink()
+            os.utime(refs)
+        except OSError:
+            pass
+        meta_path.unlink()
+        return True
+
+    def remount(self):
+        """Overlay mounts do not survive a reboot; restore them at startup."""
+        if not self.roots_dir.is_dir():
+            return
+        for meta_path in self.roots_dir.glob('*.json'):
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                continue
+            merged = self.roots_dir / meta_path.stem / 'merged'
+            if meta.get('mode') == 'overlay' and not os.path.ismount(merged):
+                try:
+                    self._mount_overlay(self.template_dir / meta['template'], self.roots_dir / meta_path.stem)
+                except (subprocess.CalledProcessError, KeyError):
+                    logging.exception('Could not remount overlay root of %s', meta_path.stem)
+
+    def gc(self, max_age: float) -> list:
+        """Delete templates nobody references that were last used more than max_age seconds ago."""
+        removed = []
+        if not self.template_dir.is_dir():
+            return removed
+        now = time.time()
+        for template in self.template_dir.iterdir():
+            if template.name.startswith('.') and template.name.endswith('.deleting'):
+                # Left behind by a gc that was interrupted.
+                self._discard(template)
+                continue
+            refs = template / 'refs'
+            if template.name.startswith('.') or not refs.is_dir():
+                continue
+            doomed = self.template_dir / f'.{template.name}.deleting'
+            with self._lock:
+                if template.name in self._building or any(refs.iterdir()):
+                    continue
+                if now - refs.stat().st_mtime < max_age:
+                    continue
+                # Once renamed, clone() no longer finds the template; the
+                # slow delete then runs without holding up other callers.
+                os.rename(template, doomed)
+            self._discard(doomed)
+            removed.append(template.name)
+            logging.info('Removed unused template %s', template.name)
+        return removed
+
+    def stats(self) -> dict:
+        templates = []
+        if self.template_dir.is_dir():
+            for template in sorted(self.template_dir.iterdir()):
+                refs = template / 'refs'
+                if template.name.startswith('.') or not refs.is_dir():
+                    continue
+                templates.append({'key': template.name, 'refs': sum(1 for _ in refs.iterdir())})
+        return {
+            'enabled': self.enabled,
+            'mode': self._mode,
+            'builds': self.builds,
+            'buildFailures': self.build_failures,
+            'building': len(self._building),
+            'hits': self.hits,
+            'templates': templates,
+        }
+
+
+TEMPLATES = TemplateCache(TEMPLATE_SCRIPT, TEMPLATE_DIR, ROOTS_DIR, ROOTFS_MODE)
+
+
+async def template_gc_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(TEMPLATE_GC_INTERVAL)
+        try:
+            await loop.run_in_executor(None, TEMPLATES.gc, TEMPLATE_GC_AGE)
+        except Exception:
+            logging.exception('Template GC failed')
@@ -0,0 +1,10 @@
+#!/bin/sh
+# Stand-in for scripts/claim_nspawn.sh: claim.sh <pool machine> <sandbox id>
+# <host path>. Records the binding in <pool dir>/<pool machine>/claimed-by,
+# sleeps GINTO_STUB_CLAIM_SLEEP seconds and exits with GINTO_STUB_CLAIM_EXIT.
+echo "stub claim $1 as $2 at $3"
+if [ -n "$GINTO_SANDBOXD_POOL_DIR" ] && [ -d "$GINTO_SANDBOXD_POOL_DIR/$1" ]; then
+    echo "$2" >> "$GINTO_SANDBOXD_POOL_DIR/$1/claimed-by"
+fi
+sleep "${GINTO_STUB_CLAIM_SLEEP:-0}"
+exit "${GINTO_STUB_CLAIM_EXIT:-0}"
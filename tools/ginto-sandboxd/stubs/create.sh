@@ -0,0 +1,7 @@
+#!/bin/sh
+# Stand-in for scripts/create_nspawn.sh when testing ginto_sandboxd without
+# root: create.sh <machine> <host path>. Sleeps GINTO_STUB_CREATE_SLEEP
+# seconds and exits with GINTO_STUB_CREATE_EXIT (default 0).
+echo "stub create $1 at $2"
+sleep "${GINTO_STUB_CREATE_SLEEP:-0}"
+exit "${GINTO_STUB_CREATE_EXIT:-0}"
@@ -0,0 +1,12 @@
+#!/bin/sh
+# Stand-in for scripts/build_template.sh when testing ginto_sandboxd without
+# root: template.sh <name> <rootfs dir> <packages...>. Writes the package list
+# into the rootfs, sleeps GINTO_STUB_TEMPLATE_SLEEP seconds and exits with
+# GINTO_STUB_TEMPLATE_EXIT (default 0).
+name="$1"
+rootfs="$2"
+shift 2
+echo "stub template $name: $*"
+echo "$@" > "$rootfs/packages"
+sleep "${GINTO_STUB_TEMPLATE_SLEEP:-0}"
+exit "${GINTO_STUB_TEMPLATE_EXIT:-0}"
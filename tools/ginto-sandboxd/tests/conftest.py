@@ -0,0 +1,114 @@
+"""
+Fixtures that run ginto_sandboxd as an unprivileged child process.
+
+Every path the daemon uses lives under the test's tmp_path, and the create
+and claim scripts are the stubs in ../stubs, so the tests need neither root
+nor systemd-nspawn. Tests of single classes import the sandboxd package
+directly.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+from pathlib import Path
+
+import pytest
+
+SANDBOXD_DIR = Path(__file__).resolve().parent.parent
+DAEMON = SANDBOXD_DIR / 'ginto_sandboxd.py'
+STUBS = SANDBOXD_DIR / 'stubs'
+# Pure parts of the sandboxd package are also tested in-process.
+if str(SANDBOXD_DIR) not in sys.path:
+    sys.path.insert(0, str(SANDBOXD_DIR))
+
+
+def wait_until(check, timeout: float = 10.0, interval: float = 0.05):
+    """Poll `check()` until it returns something truthy; fail after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = check()
+        if result:
+            return result
+        if time.monotonic() > deadline:
+            raise AssertionError(f'condition not met within {timeout} s')
+        time.sleep(interval)
+
+
+class Sandboxd:
+    """A daemon child and a way to talk to it."""
+
+    def __init__(self, tmp_path: Path, **env):
+        self.tmp_path = tmp_path
+        self.socket_path = str(tmp_path / 'd.sock')
+        self.pool_dir = tmp_path / 'pool'
+        self.log_dir = tmp_path / 'log'
+        self.env = dict(
+            os.environ,
+            GINTO_SANDBOXD_SOCKET=self.socket_path,
+            GINTO_SANDBOXD_LOG_DIR=str(self.log_dir),
+            GINTO_SANDBOXD_CREATE_SCRIPT=str(STUBS / 'create.sh'),
+            GINTO_SANDBOXD_CLAIM_SCRIPT=str(STUBS / 'claim.sh'),
+            GINTO_SANDBOXD_TEMPLATE_SCRIPT=str(tmp_path / 'no-template'),
+            GINTO_SANDBOXD_POOL_DIR=str(self.pool_dir),
+            GINTO_SANDBOXD_POOL_HIGH='0',
+            GINTO_SANDBOXD_POOL_MACHINE_MB='0',
+            GINTO_SANDBOXD_STATE_DB=str(tmp_path / 'state.db'),
+            GINTO_SANDBOXD_METRICS='',
+            GINTO_SANDBOXD_EXEC_SHELL='/bin/sh',
+            GINTO_SANDBOXD_CREATE_MAX_PRESSURE='0',
+        )
+        self.env.update({key: str(value) for key, value in env.items()})
+        self.proc = None
+
+    def start(self):
+        self.proc = subprocess.Popen([sys.executable, str(DAEMON)], env=self.env)
+        wait_until(lambda: self._answers_ping())
+        return self
+
+    def _answers_ping(self) -> bool:
+        try:
+            return self.request({'action': 'ping'}, timeout=1.0).get('ok', False)
+        except OSError:
+            return False
+
+    def stop(self):
+        if self.proc is None:
+            return
+        self.proc.terminate()
+        try:
+            self.proc.wait(15)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+    def request(self, payload: dict, timeout: float = 30.0) -> dict:
+        """Send one request on a new connection and return its reply (event lines are skipped)."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(payload).encode() + b'\n')
+            with sock.makefile('rb') as lines:
+                for line in lines:
+                    reply = json.loads(line)
+                    if 'event' not in reply:
+                        return reply
+        raise ConnectionError('connection closed without a reply')
+
+
+@pytest.fixture
+def sandboxd(tmp_path):
+    """Factory: sandboxd(**env) starts a daemon with extra environment; all are stopped afterwards."""
+    started = []
+
+    def start(**env):
+        daemon = Sandboxd(tmp_path, **env).start()
+        started.append(daemon)
+        return daemon
+
+    yield start
+    for daemon in started:
+        daemon.stop()
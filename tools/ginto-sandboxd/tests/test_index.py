@@ -0,0 +1,90 @@
+"""Sandbox index: a failed flush keeps its activity, and the reaper reads cgroups off the event loop."""
+
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from sandboxd import index as index_module
+from sandboxd.index import SandboxIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SandboxIndex(str(tmp_path / 'state.db'), 'stop')
+    index.open()
+    yield index
+    index.db.close()
+
+
+def last_active(index, sandbox: str):
+    rows = index._execute('SELECT last_active FROM sandboxes WHERE id = ?', (sandbox,))
+    return rows[0]['last_active'] if rows else None
+
+
+def test_failed_flush_keeps_activity(index):
+    during = {}
+
+    def touch_while_flushing():
+        # Runs inside the failing transaction, as an event-loop touch would.
+        index.touch('sb-a')
+        index.touch('sb-c')
+        during.update(index._touched)
+
+    index.db.create_function('touch_while_flushing', 0, touch_while_flushing)
+    index.db.executescript("""
+        CREATE TRIGGER fail_flush BEFORE INSERT ON sandboxes WHEN NEW.id = 'sb-fail'
+        BEGIN SELECT touch_while_flushing(); SELECT RAISE(ABORT, 'flush failed'); END;
+    """)
+    index.touch('sb-a')
+    index.touch('sb-fail')
+    before = dict(index._touched)
+
+    with pytest.raises(sqlite3.Error):
+        index.flush()
+
+    assert set(index._touched) == {'sb-a', 'sb-c', 'sb-fail'}
+    # The newer touch wins over the one merged back.
+    assert index._touched['sb-a'] == during['sb-a'] >= before['sb-a']
+    assert index._touched['sb-fail'] == before['sb-fail']
+    assert last_active(index, 'sb-a') is None
+
+    index.db.execute('DROP TRIGGER fail_flush')
+    index.flush()
+    assert index._touched == {}
+    assert last_active(index, 'sb-a') == during['sb-a']
+    assert last_active(index, 'sb-fail') == before['sb-fail']
+
+
+def test_reaper_samples_usage_off_the_loop(index, monkeypatch):
+    calls = []
+
+    def usage(sandbox):
+        calls.append(('machine_usage', threading.get_ident()))
+        return 64 << 20, None
+
+    def record_usage(sandbox, memory, cpu):
+        calls.append(('record_usage', threading.get_ident()))
+        SandboxIndex.record_usage(index, sandbox, memory, cpu)
+
+    def reap(sandbox, policy):
+        calls.append(('reap', sandbox, policy))
+
+    monkeypatch.setattr(index_module, 'INDEX', index)
+    monkeypatch.setattr(index_module, 'REAP_IDLE_SECONDS', 0)
+    monkeypatch.setattr(index_module, 'machine_usage', usage)
+    monkeypatch.setattr(index, 'record_usage', record_usage)
+    monkeypatch.setattr(index_module, 'reap_sandbox', reap)
+    index.record('sb-idle', 'sb-idle', '/tmp/sb-idle', 'ready', None, 1000, 'remove')
+
+    async def run():
+        loop_thread = threading.get_ident()
+        await index_module.reap_idle()
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert [call[0] for call in calls] == ['machine_usage', 'record_usage', 'reap']
+    assert loop_thread not in (calls[0][1], calls[1][1])
+    assert calls[2][1:] == ('sb-idle', 'remove')
+    assert index.get('sb-idle')['memoryBytes'] == 64 << 20
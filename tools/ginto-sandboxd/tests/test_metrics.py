@@ -0,0 +1,79 @@
+"""Metrics exporter: off by default, private from the moment it binds, and never deletes a non-socket."""
+
+import os
+import sys
+import stat
+import socket
+import asyncio
+import subprocess
+
+from conftest import SANDBOXD_DIR
+from sandboxd import server as server_module
+
+
+def serve_metrics(path, check=None):
+    """Start the exporter on `path`, run `check(server)` while it is up, and return what it returned."""
+    async def run():
+        # A loose umask, to show the socket does not depend on the caller's.
+        previous = os.umask(0o002)
+        try:
+            server = await server_module.start_metrics_server(str(path))
+        finally:
+            os.umask(previous)
+        if server is None:
+            return None
+        try:
+            return await check(server) if check else server
+        finally:
+            server.close()
+            await server.wait_closed()
+    return asyncio.run(run())
+
+
+def test_off_by_default():
+    env = {k: v for k, v in os.environ.items() if k != 'GINTO_SANDBOXD_METRICS'}
+    listen = subprocess.check_output(
+        [sys.executable, '-c', 'from sandboxd.config import METRICS_LISTEN; print(repr(METRICS_LISTEN))'],
+        cwd=SANDBOXD_DIR, env=env, text=True,
+    )
+    assert listen.strip() == "''"
+    assert serve_metrics('') is None
+
+
+def test_socket_is_created_private(tmp_path, monkeypatch):
+    path = tmp_path / 'metrics.sock'
+    start_unix_server = asyncio.start_unix_server
+    bound = []
+
+    async def record_mode(*args, **kwargs):
+        # The mode right after bind, before anyone could chmod it.
+        server = await start_unix_server(*args, **kwargs)
+        bound.append(stat.S_IMODE(os.stat(path).st_mode))
+        return server
+
+    monkeypatch.setattr(asyncio, 'start_unix_server', record_mode)
+
+    async def check(server):
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+        reader, writer = await asyncio.open_unix_connection(str(path))
+        writer.write(b'GET /metrics HTTP/1.0\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+        return mode, response
+
+    mode, response = serve_metrics(path, check)
+    assert bound == [0o660] and mode == 0o660
+    assert response.startswith(b'HTTP/1.0 200 OK')
+
+
+def test_replaces_only_a_stale_socket(tmp_path):
+    stale = tmp_path / 'stale.sock'
+    old = socket.socket(socket.AF_UNIX)
+    old.bind(str(stale))
+    old.close()
+    assert serve_metrics(stale) is not None
+
+    other = tmp_path / 'metrics.txt'
+    other.write_text('keep me')
+    assert serve_metrics(other) is None
+    assert other.read_text() == 'keep me'
@@ -0,0 +1,92 @@
+"""Warm pool: fill, drain, refill, single-flight claims and request validation."""
+
+import concurrent.futures
+
+from conftest import wait_until
+
+
+def pool(daemon) -> dict:
+    return daemon.request({'action': 'pool'})
+
+
+def full(daemon, size: int):
+    """The pool state once `size` machines are idle and nothing is building."""
+    return wait_until(lambda: (lambda p: p if p['idle'] == size and p['building'] == 0 else None)(pool(daemon)))
+
+
+def claim(daemon, sandbox: str, **extra) -> dict:
+    payload = {'action': 'claim', 'sandboxId': sandbox, 'hostPath': f'/var/tmp/ginto-test/{sandbox}'}
+    payload.update(extra)
+    return daemon.request(payload)
+
+
+def test_fill_drain_refill(sandboxd):
+    # Builds take a moment, so the drained pool is still empty for the next claim.
+    daemon = sandboxd(GINTO_SANDBOXD_POOL_HIGH=3, GINTO_SANDBOXD_POOL_LOW=1, GINTO_SANDBOXD_POOL_BUILDERS=2,
+                      GINTO_STUB_CREATE_SLEEP=0.5)
+
+    # Fill: the daemon provisions up to the high mark on its own.
+    state = full(daemon, 3)
+    assert state['target'] == 3
+    ready = sorted(p.name for p in daemon.pool_dir.iterdir() if (p / '.ginto-pool-ready').exists())
+    assert len(ready) == 3
+
+    # Drain: every claim gets a distinct warm machine, bound by the claim script.
+    machines = []
+    for n in range(3):
+        reply = claim(daemon, f'pool-test-{n}')
+        assert reply['ok'] and reply['pooled'], reply
+        machines.append(reply['poolMachine'])
+        assert (daemon.pool_dir / reply['poolMachine'] / 'claimed-by').read_text().split() == [f'pool-test-{n}']
+    assert sorted(machines) == ready
+
+    # With the pool empty a claim falls back to a regular create.
+    reply = claim(daemon, 'pool-test-cold')
+    assert reply['ok'] and not reply['pooled'], reply
+    assert reply['jobId']
+
+    # Refill: dropping below the low mark builds back up to the high mark.
+    state = full(daemon, 3)
+    assert state['claims'] == 3
+    assert state['misses'] == 1
+    assert state['buildFailures'] == 0
+
+
+def test_concurrent_claims_share_one_machine(sandboxd):
+    daemon = sandboxd(GINTO_SANDBOXD_POOL_HIGH=2, GINTO_STUB_CLAIM_SLEEP=1)
+    full(daemon, 2)
+
+    # A client retrying while the claim script still runs must not bind a
+    # second machine to the same sandbox.
+    with concurrent.futures.ThreadPoolExecutor(3) as executor:
+        replies = list(executor.map(lambda _: claim(daemon, 'Same-Sandbox'), range(3)))
+    assert all(reply['ok'] and reply['pooled'] for reply in replies), replies
+    assert len({reply['poolMachine'] for reply in replies}) == 1
+    assert sorted(reply['merged'] for reply in replies) == [False, True, True]
+
+    state = pool(daemon)
+    assert state['claims'] == 1
+    assert state['merged'] == 2
+    assert state['claiming'] == 0
+
+
+def test_claim_validates_options(sandboxd):
+    daemon = sandboxd(GINTO_SANDBOXD_POOL_HIGH=1)
+    full(daemon, 1)
+
+    assert claim(daemon, 'bad-trace', traceId='no spaces allowed') == {'ok': False, 'error': 'invalid traceId'}
+    assert claim(daemon, 'bad-policy', idlePolicy='never') == {'ok': False, 'error': 'invalid idlePolicy'}
+    # Rejected requests leave the warm machine in the pool.
+    assert pool(daemon)['idle'] == 1
+
+    reply = claim(daemon, 'good-trace', traceId='req-1234')
+    assert reply['ok'] and reply['pooled'], reply
+
+
+def test_failed_builds_back_off(sandboxd):
+    daemon = sandboxd(GINTO_SANDBOXD_POOL_HIGH=2, GINTO_STUB_CREATE_EXIT=1)
+
+    state = wait_until(lambda: (lambda p: p if p['buildFailures'] >= 1 and p['building'] == 0 else None)(pool(daemon)))
+    assert state['idle'] == 0
+    # A broken build does not retry in a tight loop.
+    assert pool(daemon)['buildFailures'] <= 2
@@ -0,0 +1,135 @@
+"""Template cache: failed builds clean up, clones never replace a live root, gc races clones."""
+
+import json
+import threading
+
+import pytest
+
+from conftest import STUBS, wait_until
+from sandboxd import templates as templates_module
+from sandboxd.templates import TemplateCache
+
+
+def templates(daemon) -> dict:
+    return daemon.request({'action': 'templates'})
+
+
+def create(daemon, sandbox: str) -> dict:
+    return daemon.request({'action': 'create', 'sandboxId': sandbox, 'hostPath': f'/var/tmp/ginto-test/{sandbox}'})
+
+
+def template_daemon(sandboxd, tmp_path, **env):
+    # reflink clones need no mount; where the filesystem cannot reflink the
+    # clone fails after the build, which these tests do not depend on.
+    return sandboxd(GINTO_SANDBOXD_TEMPLATE_SCRIPT=STUBS / 'template.sh',
+                    GINTO_SANDBOXD_TEMPLATE_DIR=tmp_path / 'templates',
+                    GINTO_SANDBOXD_ROOTS_DIR=tmp_path / 'roots',
+                    GINTO_SANDBOXD_ROOTFS_MODE='reflink', **env)
+
+
+def test_failed_build_is_cleaned_up(sandboxd, tmp_path):
+    daemon = template_daemon(sandboxd, tmp_path, GINTO_STUB_TEMPLATE_EXIT=1)
+
+    assert create(daemon, 'tpl-fail-1')['ok']
+    state = wait_until(lambda: (lambda t: t if t['buildFailures'] == 1 else None)(templates(daemon)))
+    assert state['building'] == 0
+    assert state['builds'] == 0
+    assert state['templates'] == []
+    assert not any((tmp_path / 'templates').glob('.*.building'))
+
+    # The next request tries again rather than waiting on a stale build.
+    assert create(daemon, 'tpl-fail-2')['ok']
+    state = wait_until(lambda: (lambda t: t if t['buildFailures'] == 2 else None)(templates(daemon)))
+    assert state['building'] == 0
+    assert not any((tmp_path / 'templates').glob('.*.building'))
+
+
+def test_concurrent_requests_share_one_build(sandboxd, tmp_path):
+    daemon = template_daemon(sandboxd, tmp_path, GINTO_STUB_TEMPLATE_SLEEP=0.5)
+
+    for n in range(3):
+        assert create(daemon, f'tpl-{n}')['ok']
+    state = wait_until(lambda: (lambda t: t if t['builds'] + t['hits'] == 3 and t['building'] == 0 else None)(
+        templates(daemon)))
+    assert state['builds'] == 1
+    assert state['buildFailures'] == 0
+    built = [p for p in (tmp_path / 'templates').iterdir() if not p.name.startswith('.')]
+    assert len(built) == 1
+    assert json.loads((built[0] / 'template.json').read_text())['name'] == 'default'
+
+
+@pytest.fixture
+def log(tmp_path):
+    with open(tmp_path / 'build.log', 'ab') as f:
+        yield f
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """An in-process cache in reflink mode, with the clone copying plainly (tmpfs and ext4 cannot reflink)."""
+    real = templates_module.run_checked
+
+    def run_checked(cmd, **kwargs):
+        return real([arg for arg in cmd if arg != '--reflink=always'], **kwargs)
+
+    monkeypatch.setattr(templates_module, 'run_checked', run_checked)
+    return TemplateCache(str(STUBS / 'template.sh'), str(tmp_path / 'templates'), str(tmp_path / 'roots'), 'reflink')
+
+
+def test_clone_keeps_an_existing_root(cache, log):
+    key = cache.ensure('default', ['vim'], log)
+    rootfs = cache.clone(key, 'live')
+    (rootfs / 'user-data').write_text('work in progress')
+
+    # A retried create gets the same root back, with the user's files.
+    assert cache.clone(key, 'live') == rootfs
+    assert (rootfs / 'user-data').read_text() == 'work in progress'
+
+    # A create on another template is refused instead of wiping the root.
+    other = cache.ensure('default', ['git'], log)
+    with pytest.raises(RuntimeError):
+        cache.clone(other, 'live')
+    assert (rootfs / 'user-data').exists()
+
+    assert cache.release('live')
+    assert not rootfs.exists()
+    assert cache.clone(other, 'live').is_dir()
+
+
+def test_gc_and_clone_do_not_race(cache, log, tmp_path):
+    key = cache.ensure('default', [], log)
+    results = []
+
+    def clone(n):
+        try:
+            results.append(cache.clone(key, f'race-{n}'))
+        except FileNotFoundError:
+            results.append(None)
+
+    threads = [threading.Thread(target=clone, args=(n,)) for n in range(8)]
+    threads.append(threading.Thread(target=cache.gc, args=(0,)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    template = tmp_path / 'templates' / key
+    cloned = [rootfs for rootfs in results if rootfs is not None]
+    if template.exists():
+        # Every clone that got a root holds a reference on a template that is still there.
+        assert sorted(p.name for p in (template / 'refs').iterdir()) == sorted(p.name for p in cloned)
+    else:
+        # gc won before any clone took a reference; those clones were told so.
+        assert cloned == []
+    assert not any((tmp_path / 'templates').glob('.*.deleting'))
+
+
+def test_gc_removes_only_unreferenced_templates(cache, log, tmp_path):
+    used = cache.ensure('default', ['vim'], log)
+    unused = cache.ensure('default', [], log)
+    cache.clone(used, 'keeps-it')
+
+    assert cache.gc(0) == [unused]
+    assert (tmp_path / 'templates' / used / 'rootfs').is_dir()
+    with pytest.raises(FileNotFoundError):
+        cache.clone(unused, 'too-late')
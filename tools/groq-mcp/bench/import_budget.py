@@ -0,0 +1,108 @@
+"""
+Import-time budget check for groq-mcp
+
+Every upload that falls back to `python -c` in web.php pays for importing
+groq_stt, so that import must stay cheap. This check imports a module in a
+fresh interpreter under `-X importtime`, takes the best of several runs and
+fails when the cumulative import time exceeds the budget, or when a module
+that must only load on first use (httpx, numpy, soundfile, sounddevice,
+rapidfuzz, mcp) was imported eagerly.
+
+tests/test_import_budget.py runs this check as part of the test suite. To
+look at the numbers or try another budget, run from tools/groq-mcp:
+    python -m bench.import_budget
+    python -m bench.import_budget --module src.utils --budget-ms 10
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+GROQ_MCP_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_BUDGET_MS = 60.0
+# What the web.php fallback imports. The worker is meant to preload
+# everything, so it is not held to the budget.
+DEFAULT_MODULES = ["src.groq_stt", "src.utils"]
+LAZY_MODULES = ["httpx", "numpy", "soundfile", "sounddevice", "rapidfuzz", "mcp"]
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+PROBE = (
+    "import json, sys; import {module}; "
+    "print(json.dumps(sorted(m for m in {lazy!r} if m in sys.modules)))"
+)
+
+
+def measure(module: str) -> tuple[float, list[str], list[tuple[float, str]]]:
+    """
+    Import `module` in a fresh interpreter.
+
+    Returns:
+        tuple: (cumulative import time in ms, lazy modules that got loaded,
+        the ten slowest modules imported on its behalf as (ms, name))
+    """
+    env = dict(os.environ)
+    # The import must not depend on credentials being present.
+    env.pop("GROQ_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=GROQ_MCP_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    total = None
+    # -X importtime prints children before their parent, so everything listed
+    # since the previous top-level entry belongs to this import.
+    section: list[tuple[float, str]] = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        if name == module:
+            total = int(cumulative_us) / 1000
+            break
+        if len(indent) == 1:
+            section = []
+        else:
+            section.append((int(self_us) / 1000, name))
+    if total is None:
+        raise RuntimeError(f"no import time reported for {module}")
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return total, loaded, sorted(section, reverse=True)[:10]
+
+
+def best_of(module: str, runs: int = 5) -> tuple[float, list[str], list[tuple[float, str]]]:
+    """measure() `module` in `runs` fresh interpreters and keep the fastest run."""
+    return min((measure(module) for _ in range(max(1, runs))), key=lambda run: run[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail when importing a groq-mcp module gets slow or eager")
+    parser.add_argument("--module", action="append", help=f"module to check (default: {', '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module; the fastest counts")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.module or DEFAULT_MODULES:
+        total, loaded, slowest = best_of(module, args.runs)
+        over = total > args.budget_ms
+        status = "FAIL" if over or loaded else "ok"
+        print(f"{status:4} {module}: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        if loaded:
+            print(f"     eagerly imported: {', '.join(loaded)}")
+        if over:
+            for ms, name in slowest:
+                print(f"     {ms:7.1f} ms  {name}")
+        failed = failed or over or bool(loaded)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
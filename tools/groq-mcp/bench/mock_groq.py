@@ -0,0 +1,316 @@
+"""
+Local stand-in for the Groq speech-to-text API
+
+Implements POST /audio/transcriptions and /audio/translations well enough for
+groq_stt to run against it unchanged (point GROQ_API_BASE at it), with knobs
+for the behaviour a benchmark needs to reproduce:
+
+- fixed latency plus jitter, and extra latency per uploaded megabyte,
+- a requests-per-minute limit answered with 429 and retry-after, and the
+  x-ratelimit-* headers Groq sends on every response,
+- injected 5xx errors and dropped connections at a given rate.
+
+It also counts connections, requests and uploaded bytes; GET /stats returns
+the counters and POST /stats/reset clears them.
+
+Run from tools/groq-mcp:
+    python -m bench.mock_groq --port 8765 --latency-ms 300 --rpm 20 --error-rate 0.05
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import http.server
+from typing import Optional
+
+_FIELD = re.compile(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n')
+
+# Only this much of a request body is kept; the form fields come before the
+# audio part, and the rest is counted and discarded so large uploads do not
+# have to fit in the mock's memory.
+HEAD_BYTES = 65536
+READ_CHUNK = 1024 * 1024
+
+
+class MockState:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        ms_per_mb: float = 0.0,
+        rpm: float = 0.0,
+        error_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_mb = ms_per_mb
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window: list[float] = []
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.bytes_received = 0
+            self.throttled = 0
+            self.errors = 0
+            self.dropped = 0
+            self.window = []
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "connections": self.connections,
+                "requests": self.requests,
+                "bytes_received": self.bytes_received,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "dropped": self.dropped,
+            }
+
+    def admit(self) -> Optional[float]:
+        """Record a request against the sliding one-minute window; return the retry delay when over the limit."""
+        if self.rpm <= 0:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            self.window = [t for t in self.window if now - t < 60.0]
+            if len(self.window) >= self.rpm:
+                self.throttled += 1
+                return max(0.001, 60.0 - (now - self.window[0]))
+            self.window.append(now)
+            return None
+
+    def quota_headers(self) -> dict:
+        """The x-ratelimit-* headers Groq sends on every response, for the current window."""
+        if self.rpm <= 0:
+            return {}
+        now = time.monotonic()
+        with self.lock:
+            used = [t for t in self.window if now - t < 60.0]
+        reset = 60.0 - (now - used[0]) if used else 0.0
+        return {
+            "x-ratelimit-limit-requests": str(int(self.rpm)),
+            "x-ratelimit-remaining-requests": str(max(0, int(self.rpm) - len(used))),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+        }
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+
+def _fields(head: bytes) -> dict:
+    # Only the small text parts matter; the audio part is never decoded.
+    return {name.decode(): value.decode("utf-8", "replace") for name, value in _FIELD.findall(head)}
+
+
+def _result(task: str, fields: dict, size: int) -> tuple[bytes, str]:
+    text = f"mock {task} of {size} bytes"
+    response_format = fields.get("response_format", "json")
+    if response_format == "text":
+        return text.encode("utf-8"), "text/plain; charset=utf-8"
+    payload = {"text": text}
+    if response_format == "verbose_json":
+        duration = round(size / 32000, 3)
+        payload.update(
+            task=task,
+            language=fields.get("language", "en"),
+            duration=duration,
+            segments=[{"id": 0, "start": 0.0, "end": duration, "text": text}],
+        )
+        if "word" in fields.get("timestamp_granularities[]", ""):
+            payload["words"] = [{"word": "mock", "start": 0.0, "end": min(duration, 0.5)}]
+    return json.dumps(payload).encode("utf-8"), "application/json"
+
+
+class MockGroqHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockGroqServer"
+
+    def setup(self):
+        super().setup()
+        self._counted = False
+
+    def _count_connection(self):
+        # Counted on the first API call so /stats polling does not show up.
+        if not self._counted:
+            self._counted = True
+            with self.server.state.lock:
+                self.server.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> tuple[bytes, int]:
+        """Consume the request body; return its first HEAD_BYTES and its total size."""
+        head = bytearray()
+        total = 0
+
+        def consume(size: int) -> None:
+            nonlocal total
+            while size > 0:
+                chunk = self.rfile.read(min(size, READ_CHUNK))
+                if not chunk:
+                    break
+                if len(head) < HEAD_BYTES:
+                    head.extend(chunk[:HEAD_BYTES - len(head)])
+                total += len(chunk)
+                size -= len(chunk)
+
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                consume(size)
+                self.rfile.readline()
+        else:
+            consume(int(self.headers.get("Content-Length", 0)))
+        return bytes(head), total
+
+    def _reply(self, status: int, body: bytes, content_type: str = "application/json", headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, headers: Optional[dict] = None):
+        body = json.dumps({"error": {"message": message, "type": "mock_error"}}).encode("utf-8")
+        self._reply(status, body, headers=headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._reply(200, json.dumps(self.server.state.stats()).encode("utf-8"))
+        else:
+            self._error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        state = self.server.state
+        path = self.path.rstrip("/")
+        if path.endswith("/stats/reset"):
+            self._read_body()
+            state.reset()
+            self._reply(200, b"{}")
+            return
+
+        head, size = self._read_body()
+        self._count_connection()
+        with state.lock:
+            state.requests += 1
+            state.bytes_received += size
+
+        if path.endswith("/audio/transcriptions"):
+            task = "transcribe"
+        elif path.endswith("/audio/translations"):
+            task = "translate"
+        else:
+            self._error(404, f"Unknown path {self.path}")
+            return
+
+        retry_after = state.admit()
+        if retry_after is not None:
+            self._error(429, "Rate limit reached (mock)", {
+                "retry-after": f"{retry_after:.3f}",
+                "x-ratelimit-limit-requests": str(int(state.rpm)),
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-reset-requests": f"{retry_after:.3f}s",
+            })
+            return
+
+        delay = state.latency_ms + state.ms_per_mb * size / 1e6
+        if state.jitter_ms:
+            with state.lock:
+                delay += state.random.uniform(0, state.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if state.roll(state.drop_rate):
+            with state.lock:
+                state.dropped += 1
+            self.close_connection = True
+            return
+        if state.roll(state.error_rate):
+            with state.lock:
+                state.errors += 1
+            self._error(503, "Service unavailable (mock)")
+            return
+
+        content, content_type = _result(task, _fields(head), size)
+        self._reply(200, content, content_type, state.quota_headers())
+
+
+class MockGroqServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, state: Optional[MockState] = None):
+        self.state = state or MockState()
+        super().__init__((host, port), MockGroqHandler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread; call shutdown() to stop."""
+        thread = threading.Thread(target=self.serve_forever, name="mock-groq", daemon=True)
+        thread.start()
+        return thread
+
+
+def add_state_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform random extra latency")
+    parser.add_argument("--ms-per-mb", type=float, default=0.0, help="extra latency per uploaded MB")
+    parser.add_argument("--rpm", type=float, default=0.0, help="requests per minute before 429 (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of connections closed without a reply")
+    parser.add_argument("--seed", type=int, help="seed for jitter and fault injection")
+
+
+def state_from_args(args: argparse.Namespace) -> MockState:
+    return MockState(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        ms_per_mb=args.ms_per_mb,
+        rpm=args.rpm,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Groq speech-to-text API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_state_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockGroqServer(args.host, args.port, state_from_args(args))
+    print(f"mock Groq API on {server.base_url} (set GROQ_API_BASE={server.base_url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Time-to-first-text benchmark for incremental transcription
+
+Plays a WAV file into src.stt_stream through a pipe at real-time speed (or
+faster, with --speed) against the local mock API, and reports when the first
+text arrived relative to the audio length, how many requests and how much
+audio were uploaded, and how long the final text took after the input ended.
+--max-first-text-ratio turns the run into a regression gate for CI.
+
+Run from tools/groq-mcp:
+    python -m bench.stream_bench --seconds 30 --latency-ms 300
+    python -m bench.stream_bench --audio dictation.wav --speed 4 --json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+from bench.mock_groq import MockGroqServer, add_state_arguments, state_from_args
+from bench.stt_bench import GROQ_MCP_DIR, MockStats, make_sample
+
+
+def _play(path: Path, write_fd: int, speed: float, ended: list) -> None:
+    """Write a WAV file to a pipe at `speed` times real time."""
+    import soundfile as sf
+
+    info = sf.info(str(path))
+    bytes_per_second = info.samplerate * info.channels * 2 * speed
+    with open(path, "rb") as f, os.fdopen(write_fd, "wb") as out:
+        started = time.monotonic()
+        sent = 0
+        for chunk in iter(lambda: f.read(4096), b""):
+            out.write(chunk)
+            out.flush()
+            sent += len(chunk)
+            delay = sent / bytes_per_second - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+    ended.append(time.monotonic())
+
+
+def run(audio: Path, speed: float, options: dict) -> dict:
+    import soundfile as sf
+    from src.stt_stream import transcribe_stream
+
+    duration = sf.info(str(audio)).duration
+    read_fd, write_fd = os.pipe()
+    ended: list[float] = []
+    events: list[tuple[float, dict]] = []
+    started = time.monotonic()
+    player = threading.Thread(target=_play, args=(audio, write_fd, speed, ended), daemon=True)
+    player.start()
+    with os.fdopen(read_fd, "rb") as stream:
+        done = transcribe_stream(stream, lambda event: events.append((time.monotonic(), event)), "wav", **options)
+    finished = time.monotonic()
+    player.join()
+
+    first = done["first_text_ms"]
+    return {
+        "audio_seconds": round(duration, 3),
+        "speed": speed,
+        "first_text_ms": first,
+        "first_text_ratio": round(first / 1000 / (duration / speed), 3) if first is not None else None,
+        "partials": sum(1 for _, event in events if event.get("event") == "partial"),
+        "finals": done["segments"],
+        "requests": done["requests"],
+        "final_after_eof_ms": round((finished - ended[0]) * 1000, 1) if ended else None,
+        "elapsed_ms": round((finished - started) * 1000, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental transcription benchmark against a local mock API")
+    parser.add_argument("--audio", help="WAV file to play (default: a generated speech-like WAV)")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of the generated WAV")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed relative to real time")
+    parser.add_argument("--step-seconds", type=float, default=2.0)
+    parser.add_argument("--window-seconds", type=float, default=30.0)
+    parser.add_argument("--base-url", help="use an already running mock instead of starting one")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--max-first-text-ratio", type=float,
+                        help="exit non-zero when first text takes longer than this fraction of the audio")
+    add_state_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockGroqServer(state=state_from_args(args))
+        server.start()
+        base_url = server.base_url
+
+    workdir = Path(tempfile.mkdtemp(prefix="groq-stream-bench-"))
+    audio = Path(args.audio) if args.audio else make_sample(workdir, seconds=args.seconds)
+    os.environ.update({
+        "GROQ_API_BASE": base_url,
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "bench"),
+        "GROQ_STT_CACHE": "0",
+    })
+    os.environ.setdefault("GROQ_RATE_RPM", "0")
+    os.environ.setdefault("GROQ_RATE_AUDIO_SECONDS", "0")
+    sys.path.insert(0, str(GROQ_MCP_DIR))
+
+    stats = MockStats(base_url)
+    try:
+        stats.reset()
+        result = run(audio, args.speed, {"step_seconds": args.step_seconds, "window_seconds": args.window_seconds})
+        server_stats = stats.read()
+        result["bytes_uploaded"] = server_stats["bytes_received"]
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key:20} {value}")
+
+    ratio = result["first_text_ratio"]
+    too_slow = args.max_first_text_ratio is not None and (ratio is None or ratio > args.max_first_text_ratio)
+    return 1 if too_slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+End-to-end latency/throughput benchmark for groq_stt
+
+Drives transcribe_audio / translate_audio against the local mock API
+(bench/mock_groq.py) so runs are reproducible, free and need no network.
+Each mode exercises one way the PHP app can reach groq_stt:
+
+    cold      a fresh `python -c` per request, the CLI fallback in web.php
+    worker    jobs over the resident stt_worker UNIX socket
+    inprocess direct calls from a thread pool in this process
+    async     transcribe_audio_async / translate_audio_async on one event loop
+
+For every mode it reports p50/p95/p99 latency, requests/s, bytes uploaded and
+connections opened (both counted by the mock) and peak RSS of the process
+that did the work. --max-p95-ms turns the run into a regression gate for CI.
+
+Run from tools/groq-mcp:
+    python -m bench.stt_bench --requests 50 --concurrency 4
+    python -m bench.stt_bench --modes cold,worker --latency-ms 200 --rpm 120 --json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import statistics
+import urllib.request
+import concurrent.futures
+from pathlib import Path
+from typing import Callable, Optional
+
+from bench.mock_groq import MockGroqServer, add_state_arguments, state_from_args
+
+GROQ_MCP_DIR = Path(__file__).resolve().parents[1]
+MODES = ["cold", "worker", "inprocess", "async"]
+TASKS = ["transcribe", "translate", "mixed"]
+
+# The inline program web.php runs for every upload when the worker is down.
+COLD_CODE = (
+    "import sys, json; sys.path.insert(0, {root!r}); from src import groq_stt as gs; "
+    "res = gs.{func}({path!r}, model={model!r}, response_format='json', save_to_file=False); "
+    "print(json.dumps({{'success': True, 'text': res.text}}))"
+)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _peak_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    if pid is None:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def make_sample(directory: Path, seconds: float = 5.0, samplerate: int = 44100, channels: int = 2) -> Path:
+    """Write a speech-like test WAV (tone bursts separated by silence)."""
+    import numpy as np
+    import soundfile as sf
+
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    envelope = (np.sin(2 * np.pi * 0.7 * t) > 0).astype(np.float32)
+    signal = 0.3 * envelope * np.sin(2 * np.pi * 220 * t).astype(np.float32)
+    path = directory / "bench_sample.wav"
+    sf.write(path, np.repeat(signal[:, None], channels, axis=1), samplerate, subtype="PCM_16")
+    return path
+
+
+def _job_plan(task: str, count: int) -> list[str]:
+    if task == "mixed":
+        return ["translate" if i % 2 else "transcribe" for i in range(count)]
+    return [task] * count
+
+
+def _model_for(task: str) -> str:
+    # Translation is only offered by whisper-large-v3.
+    return "whisper-large-v3" if task == "translate" else "whisper-large-v3-turbo"
+
+
+class MockStats:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def reset(self) -> None:
+        request = urllib.request.Request(self.base_url + "/stats/reset", data=b"", method="POST")
+        urllib.request.urlopen(request, timeout=5).read()
+
+    def read(self) -> dict:
+        return json.loads(urllib.request.urlopen(self.base_url + "/stats", timeout=5).read())
+
+
+def _run_pool(jobs: list[str], concurrency: int, run_one: Callable[[str], bool]) -> tuple[list[float], int, float]:
+    latencies: list[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    def timed(task: str) -> None:
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            ok = run_one(task)
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            failures += 0 if ok else 1
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, jobs))
+    return latencies, failures, time.perf_counter() - started
+
+
+def bench_cold(jobs, concurrency, audio, env) -> tuple[list[float], int, float, Optional[float]]:
+    def run_one(task: str) -> bool:
+        func = "translate_audio" if task == "translate" else "transcribe_audio"
+        code = COLD_CODE.format(root=str(GROQ_MCP_DIR), func=func, path=str(audio), model=_model_for(task))
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=GROQ_MCP_DIR, env=env, capture_output=True, text=True
+        )
+        return result.returncode == 0 and '"success": true' in result.stdout
+
+    latencies, failures, wall = _run_pool(jobs, concurrency, run_one)
+    # Largest child seen; the interpreters ran one per request.
+    rss = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    return latencies, failures, wall, rss
+
+
+def bench_worker(jobs, concurrency, audio, env) -> tuple[list[float], int, float, Optional[float]]:
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="groq-bench-"), "worker.sock")
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "src.stt_worker", "--socket", socket_path, "--log-level", "WARNING"],
+        cwd=GROQ_MCP_DIR, env=env,
+    )
+    try:
+        deadline = time.monotonic() + 15
+        while not os.path.exists(socket_path):
+            if worker.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("stt_worker did not start")
+            time.sleep(0.02)
+
+        local = threading.local()
+
+        def run_one(task: str) -> bool:
+            # One persistent connection per bench thread, like a PHP-FPM child.
+            if not hasattr(local, "stream"):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(socket_path)
+                local.stream = sock.makefile("rwb")
+            action = "translate" if task == "translate" else "transcribe"
+            job = {"action": action, "args": {"input_file_path": str(audio), "model": _model_for(task), "response_format": "json"}}
+            local.stream.write((json.dumps(job) + "\n").encode("utf-8"))
+            local.stream.flush()
+            return json.loads(local.stream.readline()).get("ok", False)
+
+        latencies, failures, wall = _run_pool(jobs, concurrency, run_one)
+        return latencies, failures, wall, _peak_rss_mb(worker.pid)
+    finally:
+        worker.terminate()
+        worker.wait(timeout=10)
+
+
+def bench_inprocess(jobs, concurrency, audio, env) -> tuple[list[float], int, float, Optional[float]]:
+    from src import groq_stt
+
+    def run_one(task: str) -> bool:
+        func = groq_stt.translate_audio if task == "translate" else groq_stt.transcribe_audio
+        func(str(audio), model=_model_for(task), response_format="json", save_to_file=False)
+        return True
+
+    latencies, failures, wall = _run_pool(jobs, concurrency, run_one)
+    groq_stt.close_clients()
+    return latencies, failures, wall, _peak_rss_mb()
+
+
+def bench_async(jobs, concurrency, audio, env) -> tuple[list[float], int, float, Optional[float]]:
+    from src import groq_stt
+
+    async def run() -> tuple[list[float], int, float]:
+        latencies: list[float] = []
+        failures = 0
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(task: str) -> None:
+            nonlocal failures
+            func = groq_stt.translate_audio_async if task == "translate" else groq_stt.transcribe_audio_async
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    await func(str(audio), model=_model_for(task), response_format="json", save_to_file=False)
+                except Exception:
+                    failures += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(one(task) for task in jobs))
+        finally:
+            await groq_stt.aclose_async_client()
+        return latencies, failures, time.perf_counter() - started
+
+    latencies, failures, wall = asyncio.run(run())
+    return latencies, failures, wall, _peak_rss_mb()
+
+
+RUNNERS = {
+    "cold": bench_cold,
+    "worker": bench_worker,
+    "inprocess": bench_inprocess,
+    "async": bench_async,
+}
+
+
+def summarize(mode: str, latencies: list[float], failures: int, wall: float, rss: Optional[float], server: dict) -> dict:
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "failures": failures,
+        "p50_ms": round(_percentile(latencies, 50), 1),
+        "p95_ms": round(_percentile(latencies, 95), 1),
+        "p99_ms": round(_percentile(latencies, 99), 1),
+        "mean_ms": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        "req_per_s": round(len(latencies) / wall, 2) if wall else 0.0,
+        "bytes_uploaded": server.get("bytes_received", 0),
+        "connections": server.get("connections", 0),
+        "api_requests": server.get("requests", 0),
+        "throttled": server.get("throttled", 0),
+        "peak_rss_mb": rss,
+    }
+
+
+def _print_table(results: list[dict]) -> None:
+    columns = ["mode", "requests", "failures", "p50_ms", "p95_ms", "p99_ms", "req_per_s",
+               "bytes_uploaded", "connections", "api_requests", "peak_rss_mb"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in results:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="groq_stt latency/throughput benchmark against a local mock API")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {','.join(MODES)}")
+    parser.add_argument("--task", default="transcribe", choices=TASKS)
+    parser.add_argument("--requests", type=int, default=20, help="requests per mode")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--audio", help="audio file to upload (default: a generated 5 s WAV)")
+    parser.add_argument("--base-url", help="use an already running mock instead of starting one")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--max-p95-ms", type=float, help="exit non-zero when any mode's p95 exceeds this")
+    add_state_arguments(parser)
+    args = parser.parse_args(argv)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockGroqServer(state=state_from_args(args))
+        server.start()
+        base_url = server.base_url
+
+    workdir = Path(tempfile.mkdtemp(prefix="groq-bench-"))
+    audio = Path(args.audio) if args.audio else make_sample(workdir)
+
+    # Everything the benchmark spawns or imports talks to the mock, with the
+    # response cache off (it would turn every repeat into a hit) and client
+    # side metering off unless the caller set it, so the mock's limits apply.
+    overrides = {
+        "GROQ_API_BASE": base_url,
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "bench"),
+        "GROQ_STT_CACHE": "0",
+        "BASE_OUTPUT_PATH": str(workdir),
+    }
+    os.environ.update(overrides)
+    os.environ.setdefault("GROQ_RATE_RPM", "0")
+    os.environ.setdefault("GROQ_RATE_AUDIO_SECONDS", "0")
+    env = dict(os.environ)
+    sys.path.insert(0, str(GROQ_MCP_DIR))
+
+    stats = MockStats(base_url)
+    results = []
+    try:
+        for mode in modes:
+            stats.reset()
+            latencies, failures, wall, rss = RUNNERS[mode](
+                _job_plan(args.task, args.requests), max(1, args.concurrency), audio, env
+            )
+            results.append(summarize(mode, latencies, failures, wall, rss, stats.read()))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    if args.json:
+        print(json.dumps({"task": args.task, "audio_bytes": audio.stat().st_size, "results": results}, indent=2))
+    else:
+        _print_table(results)
+
+    failed = any(r["failures"] for r in results)
+    too_slow = args.max_p95_ms is not None and any(r["p95_ms"] > args.max_p95_ms for r in results)
+    return 1 if failed or too_slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+Streaming audio playback
+
+Files are never decoded as a whole: a feeder thread reads fixed-size blocks
+with SoundFile.blocks (as float32, or int16 to halve memory again) into a
+bounded ring buffer, and the output stream's callback drains the buffer on
+the audio thread. Memory use is set by the buffer length, not by the length
+of the file, and playback starts as soon as the first block is decoded.
+
+A Playback runs in the background: wait() blocks until it ends, stop()
+cancels it at any time. Once the file is played out the callback stops the
+stream itself and the stream is closed, so a clip nobody waits for does not
+keep the output device open. The device "null" (or GROQ_AUDIO_DEVICE=null) plays
+into a NullOutputStream that drives the same callback from a thread in real
+time without PortAudio, so playback works headless and in CI.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+DEFAULT_BLOCK_FRAMES = 2048
+DEFAULT_BUFFER_SECONDS = 2.0
+NULL_DEVICE = "null"
+
+
+class RingBuffer:
+    """
+    Bounded single-producer, single-consumer frame buffer.
+
+    write() blocks while the buffer is full (until space frees up or the
+    buffer is cancelled); read_into() never blocks, which is what an audio
+    callback needs, and reports how many frames it could copy.
+    """
+
+    def __init__(self, frames: int, channels: int, dtype: str = "float32"):
+        self._data = np.zeros((max(1, frames), channels), dtype=dtype)
+        self._read = 0
+        self._count = 0
+        self._closed = False
+        self._cancelled = False
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def write(self, block: np.ndarray) -> bool:
+        """Append frames, waiting for space; returns False when cancelled."""
+        offset = 0
+        while offset < len(block):
+            with self._cond:
+                while self._count == self.capacity and not self._cancelled:
+                    self._cond.wait()
+                if self._cancelled:
+                    return False
+                n = min(len(block) - offset, self.capacity - self._count)
+                start = (self._read + self._count) % self.capacity
+                first = min(n, self.capacity - start)
+                self._data[start:start + first] = block[offset:offset + first]
+                self._data[: n - first] = block[offset + first:offset + n]
+                self._count += n
+                offset += n
+        return True
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Copy up to len(out) frames into `out`, zero the rest; return the frames copied."""
+        with self._cond:
+            n = min(len(out), self._count)
+            first = min(n, self.capacity - self._read)
+            out[:first] = self._data[self._read:self._read + first]
+            out[first:n] = self._data[: n - first]
+            self._read = (self._read + n) % self.capacity
+            self._count -= n
+            self._cond.notify()
+        out[n:] = 0
+        return n
+
+    def close(self) -> None:
+        """Mark the end of the input; readers drain what is left."""
+        with self._cond:
+            self._closed = True
+
+    def cancel(self) -> None:
+        """Drop buffered frames and release a blocked writer."""
+        with self._cond:
+            self._cancelled = True
+            self._count = 0
+            self._cond.notify_all()
+
+    @property
+    def drained(self) -> bool:
+        with self._cond:
+            return self._cancelled or (self._closed and self._count == 0)
+
+
+class CallbackStop(Exception):
+    """Raised by a NullOutputStream callback to end the stream (as sounddevice.CallbackStop)."""
+
+
+class NullOutputStream:
+    """
+    Stand-in for sounddevice.OutputStream that discards the audio.
+
+    A thread calls the callback with `blocksize` frames at a time, paced to
+    real time (or as fast as possible with realtime=False). Like PortAudio
+    it calls `finished_callback` from that thread once the stream ends,
+    whether the callback raised CallbackStop or stop() was called.
+    """
+
+    def __init__(
+        self, samplerate, blocksize, channels, dtype, callback,
+        finished_callback=None, realtime: bool = True, **_,
+    ):
+        self.samplerate = samplerate
+        self.blocksize = blocksize or DEFAULT_BLOCK_FRAMES
+        self.channels = channels
+        self.dtype = dtype
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.realtime = realtime
+        self.frames_played = 0
+        self.closed = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        out = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+        interval = self.blocksize / self.samplerate
+        try:
+            while not self._stop.wait(interval if self.realtime else 0):
+                try:
+                    self.callback(out, self.blocksize, None, None)
+                except CallbackStop:
+                    self.frames_played += self.blocksize
+                    break
+                self.frames_played += self.blocksize
+        finally:
+            if self.finished_callback is not None:
+                self.finished_callback()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="null-audio-output", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def close(self) -> None:
+        self.stop()
+        self.closed = True
+
+
+class Playback:
+    """
+    One file playing in the background.
+
+    Args:
+        path: Audio file to play
+        device: sounddevice output device, or "null" to play headless
+        dtype: "float32" or "int16" samples in the buffer
+        block_frames: Frames decoded per block and requested per callback
+        buffer_seconds: Decoded audio held ahead of the output
+        realtime: With the null device, pace playback to real time; False
+            plays as fast as the file decodes (for tests)
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        device: Optional[Union[int, str]] = None,
+        dtype: str = "float32",
+        block_frames: int = DEFAULT_BLOCK_FRAMES,
+        buffer_seconds: float = DEFAULT_BUFFER_SECONDS,
+        realtime: bool = True,
+    ):
+        import soundfile as sf
+
+        if dtype not in ("float32", "int16"):
+            raise ValueError(f"unsupported sample type: {dtype}")
+        self.path = Path(path)
+        self._sound = sf.SoundFile(str(self.path))
+        self.samplerate = self._sound.samplerate
+        self.channels = self._sound.channels
+        self.duration = self._sound.frames / self.samplerate
+        self.dtype = dtype
+        self.block_frames = block_frames
+        self.frames_played = 0
+        self.error: Optional[BaseException] = None
+        self._buffer = RingBuffer(
+            max(block_frames * 2, int(buffer_seconds * self.samplerate)), self.channels, dtype
+        )
+        self._done = threading.Event()
+        self._close_lock = threading.Lock()
+        self._stream_closed = False
+
+        device = device if device is not None else os.getenv("GROQ_AUDIO_DEVICE") or None
+        stream_args = dict(
+            samplerate=self.samplerate, blocksize=block_frames, channels=self.channels,
+            dtype=dtype, callback=self._callback, finished_callback=self._finished,
+        )
+        try:
+            if device == NULL_DEVICE:
+                self._callback_stop = CallbackStop
+                self._stream = NullOutputStream(realtime=realtime, **stream_args)
+            else:
+                # sounddevice loads PortAudio and probes devices on import.
+                import sounddevice as sd
+
+                self._callback_stop = sd.CallbackStop
+                self._stream = sd.OutputStream(device=device, **stream_args)
+        except BaseException:
+            self._sound.close()
+            raise
+        self._feeder = threading.Thread(target=self._feed, name="audio-playback-feeder", daemon=True)
+
+    def _feed(self) -> None:
+        try:
+            with self._sound:
+                for block in self._sound.blocks(self.block_frames, dtype=self.dtype, always_2d=True):
+                    if not self._buffer.write(block):
+                        return
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._buffer.close()
+
+    def _callback(self, outdata, frames, time, status) -> None:
+        # Runs on the audio thread: copy what is buffered, never block.
+        self.frames_played += self._buffer.read_into(outdata)
+        if self._buffer.drained:
+            self._done.set()
+            # The stream plays out this last block, then finishes.
+            raise self._callback_stop
+
+    def _finished(self) -> None:
+        # PortAudio calls this on its own thread, where the stream must not
+        # be closed; hand that to a short-lived thread instead.
+        threading.Thread(target=self._close_stream, name="audio-playback-close", daemon=True).start()
+
+    def start(self) -> "Playback":
+        self._feeder.start()
+        self._stream.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until playback ends or is stopped; returns False on timeout."""
+        if not self._done.wait(timeout):
+            return False
+        self._close_stream()
+        return True
+
+    def stop(self) -> None:
+        """Cancel playback; safe to call from any thread and more than once."""
+        self._buffer.cancel()
+        self._done.set()
+        self._close_stream()
+
+    def _close_stream(self) -> None:
+        with self._close_lock:
+            if self._stream_closed:
+                return
+            self._stream.stop()
+            self._stream.close()
+            self._feeder.join()
+            self._stream_closed = True
+
+    @property
+    def closed(self) -> bool:
+        """Whether the output stream has been released."""
+        return self._stream_closed
+
+    @property
+    def active(self) -> bool:
+        return not self._done.is_set()
+
+    @property
+    def position(self) -> float:
+        """Seconds played so far."""
+        return self.frames_played / self.samplerate
+
+    def __enter__(self) -> "Playback":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,259 @@
+"""
+In-process audio compaction before upload
+
+Whisper models consume 16 kHz mono audio, so anything richer than that is
+wasted upload bandwidth. This module decodes audio with soundfile, downmixes
+to mono, resamples to 16 kHz and re-encodes to FLAC (or Ogg/Opus when the
+installed libsndfile supports it) block by block into a SpoolWriter, so short
+inputs never touch the disk and memory stays bounded for long ones.
+
+Optionally the compacted signal is passed through the energy VAD in vad.py
+so silent spans are not uploaded (and not billed). The VAD's noise floor
+depends on the whole recording, so trimming makes two passes over it: one
+that only measures frame energies, and one that encodes the kept spans.
+Neither holds more than a block of samples in memory.
+
+Lossy uploads (MP3, Ogg Vorbis/Opus) are already smaller than 16 kHz FLAC
+would be, so unless silence is trimmed they are sent as they are without
+being decoded. Formats libsndfile cannot decode (webm, m4a, video
+containers) are likewise uploaded as-is with the correct MIME type.
+"""
+
+import io
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+import numpy as np
+import soundfile as sf
+
+from src.audio_source import AudioSource, SpoolWriter
+from src import vad
+from src.vad import OffsetMap
+
+TARGET_SAMPLERATE = 16000
+BLOCK_FRAMES = 65536
+FILTER_TAPS = 33
+
+# Already compressed below what re-encoding to 16 kHz FLAC would give.
+LOSSY_SUFFIXES = {".mp3", ".mpga", ".ogg", ".oga", ".opus"}
+LOSSY_SUBTYPES = {"VORBIS", "OPUS", "MPEG_LAYER_I", "MPEG_LAYER_II", "MPEG_LAYER_III"}
+
+CODECS = {
+    # codec: (soundfile format, subtype, file suffix, MIME type)
+    "flac": ("FLAC", "PCM_16", ".flac", "audio/flac"),
+    "opus": ("OGG", "OPUS", ".ogg", "audio/ogg"),
+}
+
+logger = logging.getLogger("groq_stt")
+
+# Process-wide totals, reported by the worker's stats action.
+PREP_STATS = {
+    "requests": 0,
+    "original_bytes": 0,
+    "uploaded_bytes": 0,
+    "bytes_saved": 0,
+    "seconds_removed": 0.0,
+}
+_stats_lock = threading.Lock()
+
+
+class PreparedAudio(NamedTuple):
+    upload: AudioSource
+    original_bytes: int
+    duration: float
+    # Set when silence trimming ran; maps trimmed times back to the original.
+    offset_map: Optional[OffsetMap] = None
+    seconds_removed: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.upload.size
+
+
+def audio_seconds(source: AudioSource) -> float:
+    """
+    Duration of an upload in seconds, used for rate limiting.
+
+    Falls back to a 128 kbit/s estimate for formats soundfile cannot read.
+    """
+    try:
+        with source.open() as reader, sf.SoundFile(reader) as f:
+            return f.frames / f.samplerate
+    except Exception:
+        return source.size / 16000
+
+
+def _resolve_codec(codec: str) -> str:
+    if codec == "opus" and "OPUS" not in sf.available_subtypes("OGG"):
+        # libsndfile < 1.0.29 has no Opus encoder; FLAC is always available.
+        return "flac"
+    return codec if codec in CODECS else "flac"
+
+
+def _lowpass_kernel(cutoff: float, taps: int = FILTER_TAPS) -> np.ndarray:
+    """Hann-windowed sinc low-pass; `cutoff` is a fraction of the input rate."""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff * n) * np.hanning(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+class StreamResampler:
+    """
+    Block-wise mono resampler: anti-alias FIR followed by linear interpolation.
+
+    State (filter history and fractional read position) is carried between
+    blocks so the output is identical to resampling the whole signal at once.
+    """
+
+    def __init__(self, rate_in: int, rate_out: int):
+        self.step = rate_in / rate_out
+        self.passthrough = rate_in == rate_out
+        self.kernel = _lowpass_kernel(0.45 * rate_out / rate_in) if rate_out < rate_in else None
+        self.history = np.zeros(len(self.kernel) - 1 if self.kernel is not None else 0, dtype=np.float32)
+        self.carry = np.zeros(0, dtype=np.float32)
+        self.base = 0          # input index of carry[0]
+        self.next_pos = 0.0    # next output position in input-sample units
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        if self.passthrough:
+            return block
+        if self.kernel is not None:
+            padded = np.concatenate([self.history, block])
+            if len(self.history):
+                self.history = padded[-len(self.history):]
+            block = np.convolve(padded, self.kernel, mode="valid").astype(np.float32)
+
+        buf = np.concatenate([self.carry, block])
+        last = self.base + len(buf) - 1
+        if self.next_pos > last:
+            self.carry, self.base = buf[-1:], last
+            return np.zeros(0, dtype=np.float32)
+        positions = np.arange(self.next_pos, last + 1e-9, self.step)
+        out = np.interp(positions - self.base, np.arange(len(buf)), buf).astype(np.float32)
+        self.next_pos = positions[-1] + self.step
+        self.carry, self.base = buf[-1:], last
+        return out
+
+
+def compact_samples(samples: np.ndarray, samplerate: int, codec: str = "flac") -> tuple[bytes, str, str]:
+    """
+    Downmix, resample and encode an in-memory block of samples.
+
+    Returns:
+        tuple: (encoded bytes, file suffix, MIME type)
+    """
+    fmt, subtype, suffix, mime = CODECS[_resolve_codec(codec)]
+    mono = samples.mean(axis=1, dtype=np.float32) if samples.ndim > 1 else samples.astype(np.float32)
+    resampled = StreamResampler(samplerate, TARGET_SAMPLERATE).process(mono)
+    buf = io.BytesIO()
+    sf.write(buf, resampled, TARGET_SAMPLERATE, format=fmt, subtype=subtype)
+    return buf.getvalue(), suffix, mime
+
+
+def _mono_blocks(sound: sf.SoundFile):
+    """Yield the whole file as 16 kHz mono float32 blocks, from the start."""
+    sound.seek(0)
+    resampler = StreamResampler(sound.samplerate, TARGET_SAMPLERATE)
+    for block in sound.blocks(blocksize=BLOCK_FRAMES, dtype="float32", always_2d=True):
+        yield resampler.process(block.mean(axis=1, dtype=np.float32))
+
+
+def _gains_nothing(sound: sf.SoundFile) -> bool:
+    """True when re-encoding cannot shrink the upload: lossy, or FLAC already at 16 kHz mono."""
+    if sound.subtype in LOSSY_SUBTYPES:
+        return True
+    return sound.format == "FLAC" and sound.channels == 1 and sound.samplerate <= TARGET_SAMPLERATE
+
+
+def _speech_spans(sound: sf.SoundFile) -> tuple[list[tuple[int, int]], int]:
+    """First trimming pass: VAD spans (16 kHz sample indices) from frame energies alone, and the total."""
+    frame = vad.frame_size(TARGET_SAMPLERATE)
+    energies = []
+    carry = np.zeros(0, dtype=np.float32)
+    total = 0
+    for block in _mono_blocks(sound):
+        total += len(block)
+        # Frames are counted from the first sample, so whole frames carry
+        # over block boundaries exactly as in one pass over the signal.
+        carry = np.concatenate([carry, block])
+        whole = len(carry) // frame * frame
+        energies.append(vad.frame_energy_db(carry[:whole], frame))
+        carry = carry[whole:]
+    energy_db = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+    return vad.kept_spans(vad.spans_from_energy(energy_db, frame, total), total), total
+
+
+def _write_spans(sound: sf.SoundFile, out: sf.SoundFile, spans: list[tuple[int, int]]) -> None:
+    """Second trimming pass: encode only the samples inside `spans`."""
+    position = 0
+    for block in _mono_blocks(sound):
+        end = position + len(block)
+        for start, stop in spans:
+            if stop <= position or start >= end:
+                continue
+            out.write(block[max(start, position) - position:min(stop, end) - position])
+        position = end
+
+
+def prepare_audio(source: AudioSource, codec: str = "flac", trim_silence: bool = False) -> Optional[PreparedAudio]:
+    """
+    Compact audio for upload.
+
+    Args:
+        source: Audio to read
+        codec: "flac" (lossless) or "opus" (smaller, lossy)
+        trim_silence: Drop silent spans with the energy VAD before encoding
+
+    Returns:
+        PreparedAudio, or None when the audio cannot be decoded by soundfile
+        or compaction would not make the upload smaller (lossy input is not
+        even decoded unless trimming). The caller owns the returned upload
+        and should close it.
+    """
+    if not trim_silence and source.suffix in LOSSY_SUFFIXES:
+        return None
+    original_bytes = source.size
+    fmt, subtype, suffix, mime = CODECS[_resolve_codec(codec)]
+    with source.open() as reader:
+        try:
+            sound = sf.SoundFile(reader)
+        except Exception:
+            return None
+
+        spool = SpoolWriter()
+        offset_map = None
+        seconds_removed = 0.0
+        with sound, spool:
+            # Only the header has been read so far.
+            if not trim_silence and _gains_nothing(sound):
+                return None
+            duration = sound.frames / sound.samplerate if sound.samplerate else 0.0
+            spans, total = _speech_spans(sound) if trim_silence else (None, 0)
+            with sf.SoundFile(spool, "w", samplerate=TARGET_SAMPLERATE, channels=1, format=fmt, subtype=subtype) as out:
+                if spans is not None:
+                    _write_spans(sound, out, spans)
+                    offset_map = vad.offset_map_for(spans, TARGET_SAMPLERATE)
+                    kept = sum(stop - start for start, stop in spans)
+                    seconds_removed = (total - kept) / TARGET_SAMPLERATE
+                else:
+                    for block in _mono_blocks(sound):
+                        out.write(block)
+            upload = spool.finish(source.stem + suffix, mime)
+
+    if upload.size >= original_bytes and not seconds_removed:
+        upload.close()
+        return None
+
+    prepared = PreparedAudio(upload, original_bytes, duration, offset_map, seconds_removed)
+    with _stats_lock:
+        PREP_STATS["requests"] += 1
+        PREP_STATS["original_bytes"] += original_bytes
+        PREP_STATS["uploaded_bytes"] += upload.size
+        PREP_STATS["bytes_saved"] += prepared.bytes_saved
+        PREP_STATS["seconds_removed"] += seconds_removed
+    logger.info(
+        "Compacted %s: %d -> %d bytes (saved %d), %.2fs of silence removed",
+        source.name, original_bytes, upload.size, prepared.bytes_saved, seconds_removed,
+    )
+    return prepared
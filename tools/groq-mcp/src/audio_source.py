@@ -0,0 +1,287 @@
+"""
+Upload sources for Groq speech-to-text requests
+
+An AudioSource is the audio behind one request: a file on disk, bytes
+already in memory, or the contents of a pipe (stdin, a socket) spooled on
+arrival. Every consumer (hashing for the cache, compaction, duration probing,
+the multipart upload and its retries) asks the source for a fresh reader
+through open(), which is a context manager, so handles are always closed when
+the consumer is done, and readers never share a file offset.
+
+Readers are seekable and report their size, so httpx sends uploads with a
+known Content-Length and streams them in small chunks instead of buffering
+the whole body. In-memory bytes are wrapped without copying; piped input is
+kept in memory up to GROQ_STT_SPOOL_BYTES (default 16 MiB) and spills to an
+anonymous temporary file beyond that, so a large upload never has to be held
+in memory at once.
+"""
+
+import io
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+DEFAULT_SPOOL_BYTES = 16 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+MIME_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".webm": "audio/webm",
+    ".flac": "audio/flac",
+    ".mp4": "video/mp4",
+    ".avi": "video/x-msvideo",
+    ".mov": "video/quicktime",
+    ".wmv": "video/x-ms-wmv",
+}
+
+
+def mime_type_for(path: Path) -> str:
+    return MIME_TYPES.get(path.suffix.lower(), "application/octet-stream")
+
+
+def _spool_limit() -> int:
+    try:
+        return int(os.getenv("GROQ_STT_SPOOL_BYTES", DEFAULT_SPOOL_BYTES))
+    except ValueError:
+        return DEFAULT_SPOOL_BYTES
+
+
+class _PositionalReader(io.RawIOBase):
+    """
+    Read-only view of a spilled file that uses pread, so any number of
+    readers can use the same descriptor without moving each other's offset.
+
+    fileno() is deliberately not exposed: it keeps consumers from closing or
+    seeking the shared descriptor.
+    """
+
+    def __init__(self, fd: int, size: int):
+        super().__init__()
+        self._fd = fd
+        self._size = size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        want = min(len(buffer), max(0, self._size - self._pos))
+        if want == 0:
+            return 0
+        data = os.pread(self._fd, want, self._pos)
+        buffer[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class SpoolWriter(io.RawIOBase):
+    """
+    Write buffer that lives in memory until it grows past `max_bytes`, then
+    moves to an anonymous temporary file. Seekable, so soundfile can encode
+    into it directly; finish() turns it into an AudioSource.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        super().__init__()
+        self.max_bytes = _spool_limit() if max_bytes is None else max_bytes
+        self._file: BinaryIO = io.BytesIO()
+        self._spilled = False
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def _spill(self) -> None:
+        spill = tempfile.TemporaryFile(prefix="groq-stt-")
+        spill.write(self._file.getbuffer())
+        spill.seek(self._file.tell())
+        self._file = spill
+        self._spilled = True
+
+    def write(self, data) -> int:
+        if not self._spilled and self._file.tell() + len(data) > self.max_bytes:
+            self._spill()
+        return self._file.write(data)
+
+    def readinto(self, buffer) -> int:
+        return self._file.readinto(buffer)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        return self._file.truncate(size)
+
+    def finish(self, name: str, mime_type: Optional[str] = None) -> "AudioSource":
+        """Hand the written bytes over to a new AudioSource; the writer is unusable afterwards."""
+        size = self._file.seek(0, io.SEEK_END)
+        if self._spilled:
+            self._file.flush()
+            source = AudioSource(name, spill=self._file, size=size, mime_type=mime_type)
+        else:
+            source = AudioSource(name, data=self._file.getvalue(), mime_type=mime_type)
+        self._file = io.BytesIO()
+        self._spilled = False
+        return source
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+class AudioSource:
+    """Audio for one request, re-readable as many times as retries need."""
+
+    def __init__(
+        self,
+        name: str,
+        path: Optional[Path] = None,
+        data: Optional[bytes] = None,
+        spill: Optional[BinaryIO] = None,
+        size: Optional[int] = None,
+        mime_type: Optional[str] = None,
+    ):
+        self.name = name
+        self.path = path
+        self._data = data
+        self._spill = spill
+        if size is None:
+            size = path.stat().st_size if path is not None else len(data or b"")
+        self.size = size
+        self.mime_type = mime_type or mime_type_for(Path(name))
+        self._sha256: Optional[str] = None
+
+    @classmethod
+    def from_path(cls, path: Path, mime_type: Optional[str] = None) -> "AudioSource":
+        return cls(path.name, path=path, mime_type=mime_type)
+
+    @classmethod
+    def from_bytes(cls, data: BytesLike, name: str, mime_type: Optional[str] = None) -> "AudioSource":
+        # bytes are used as-is; BytesIO shares their buffer until written to.
+        return cls(name, data=data if isinstance(data, bytes) else bytes(data), mime_type=mime_type)
+
+    @classmethod
+    def from_stream(
+        cls,
+        stream: BinaryIO,
+        name: str,
+        length: Optional[int] = None,
+        mime_type: Optional[str] = None,
+    ) -> "AudioSource":
+        """
+        Drain a pipe or other non-seekable stream into a spool.
+
+        Args:
+            stream: Binary stream to read from
+            name: File name reported to the API (its suffix selects the format)
+            length: Exact number of bytes to read, for framed streams such as
+                a socket that carries more data after the audio; None reads
+                to EOF
+
+        Raises:
+            EOFError: when the stream ends before `length` bytes were read
+        """
+        writer = SpoolWriter()
+        remaining = length
+        try:
+            while remaining is None or remaining > 0:
+                chunk = stream.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                writer.write(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+            if remaining:
+                raise EOFError(f"stream ended {remaining} bytes short of the announced length")
+            return writer.finish(name, mime_type)
+        finally:
+            writer.close()
+
+    def rename(self, name: str) -> None:
+        """Change the name reported to the API, and the MIME type derived from it."""
+        self.name = name
+        self.mime_type = mime_type_for(Path(name))
+
+    @property
+    def suffix(self) -> str:
+        return Path(self.name).suffix.lower()
+
+    @property
+    def stem(self) -> str:
+        return Path(self.name).stem
+
+    def open(self) -> BinaryIO:
+        """Return a new reader positioned at the start; use it as a context manager."""
+        if self.path is not None:
+            return open(self.path, "rb")
+        if self._spill is not None:
+            return _PositionalReader(self._spill.fileno(), self.size)
+        return io.BytesIO(self._data or b"")
+
+    def sha256(self) -> str:
+        """Hex SHA-256 of the audio, computed once (the cache and the transcript store both key on it)."""
+        if self._sha256 is None:
+            digest = hashlib.sha256()
+            if self._data is not None:
+                digest.update(self._data)
+            else:
+                with self.open() as reader:
+                    for chunk in iter(lambda: reader.read(READ_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+            self._sha256 = digest.hexdigest()
+        return self._sha256
+
+    def close(self) -> None:
+        """Release spooled data. Sources backed by a caller's file own nothing."""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._data = None
+
+    def __enter__(self) -> "AudioSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        kind = "file" if self.path is not None else "spill" if self._spill is not None else "memory"
+        return f"AudioSource({self.name!r}, {kind}, {self.size} bytes)"
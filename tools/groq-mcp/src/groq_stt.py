@@ -6,23 +6,41 @@ Each function that makes an API call is marked with a cost warning.
 
 1. Only use functions when explicitly requested by the user
 2. For functions that transcribe audio, consider the length of the audio as it affects costs
+
+Importing this module is kept cheap (it is what every `python -c` fallback
+from web.php pays for): httpx, numpy/soundfile and mcp.types are imported on
+first use, and a missing GROQ_API_KEY is reported when a request is made.
 """
 
+from __future__ import annotations
+
 import os
 import json
-import httpx
+import weakref
+import threading
+import importlib.util
 from pathlib import Path
-from typing import Literal, Optional, List, Union
+from typing import TYPE_CHECKING, BinaryIO, Literal, NamedTuple, Optional, List, Union
 from dotenv import load_dotenv
-from pathlib import Path
-from mcp.types import TextContent
+from src.audio_source import AudioSource, BytesLike
+from src.stt_scheduler import PRIORITY_INTERACTIVE, get_scheduler
+from src.stt_cache import TranscriptionCache, get_cache
+from src.transcript_store import get_store, make_record
 from src.utils import (
     make_error,
     make_output_path,
     make_output_file,
+    make_text_content,
     handle_input_file,
+    check_audio_file,
 )
 
+if TYPE_CHECKING:
+    import asyncio
+    import httpx
+    from mcp.types import TextContent
+    from src.audio_prep import PreparedAudio
+
 # Prefer loading a repository root .env (project root is 2 parents above
 # the module path) so the main PHP app's /.env is automatically used.
 root_env = Path(__file__).resolve().parents[2] / '.env'
@@ -31,20 +49,314 @@ if root_env.exists():
 else:
     load_dotenv()
 
-groq_api_key = os.getenv("GROQ_API_KEY")
 base_path = os.getenv("BASE_OUTPUT_PATH")
 
-if not groq_api_key:
-    raise ValueError("GROQ_API_KEY environment variable is required")
+# Base URL for the OpenAI-compatible Groq API. Overridable so the module can
+# be pointed at a proxy or a local stand-in.
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+
+_client: Optional[httpx.Client] = None
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _client_options() -> dict:
+    """
+    Build the shared httpx client configuration from the environment.
+
+    GROQ_HTTP2                 enable HTTP/2 when the h2 package is installed
+    GROQ_CONNECT_TIMEOUT       seconds to establish a connection (default 5)
+    GROQ_READ_TIMEOUT          seconds to wait for the response (default 120)
+    GROQ_WRITE_TIMEOUT         seconds to send the upload (default 120)
+    GROQ_POOL_TIMEOUT          seconds to wait for a free pooled connection (default 30)
+    GROQ_MAX_CONNECTIONS       pool size (default 20)
+    GROQ_MAX_KEEPALIVE         idle connections kept open (default 10)
+    GROQ_KEEPALIVE_EXPIRY      seconds an idle connection is kept (default 60)
+    """
+    import httpx
+
+    groq_api_key = os.getenv("GROQ_API_KEY")
+    if not groq_api_key:
+        make_error("GROQ_API_KEY environment variable is required")
+
+    http2 = os.getenv("GROQ_HTTP2", "").lower() in ("1", "true", "yes", "on")
+    if http2 and importlib.util.find_spec("h2") is None:
+        # httpx raises at construction time without h2; degrade to HTTP/1.1
+        # keep-alive rather than failing every request.
+        http2 = False
+
+    return {
+        "base_url": GROQ_API_BASE,
+        "headers": {"Authorization": f"Bearer {groq_api_key}"},
+        "http2": http2,
+        "timeout": httpx.Timeout(
+            connect=_env_float("GROQ_CONNECT_TIMEOUT", 5.0),
+            read=_env_float("GROQ_READ_TIMEOUT", 120.0),
+            write=_env_float("GROQ_WRITE_TIMEOUT", 120.0),
+            pool=_env_float("GROQ_POOL_TIMEOUT", 30.0),
+        ),
+        "limits": httpx.Limits(
+            max_connections=_env_int("GROQ_MAX_CONNECTIONS", 20),
+            max_keepalive_connections=_env_int("GROQ_MAX_KEEPALIVE", 10),
+            keepalive_expiry=_env_float("GROQ_KEEPALIVE_EXPIRY", 60.0),
+        ),
+    }
+
+
+def get_client() -> httpx.Client:
+    """Return the process-wide pooled Groq client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        with _client_lock:
+            if _client is None or _client.is_closed:
+                import httpx
+
+                _client = httpx.Client(**_client_options())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the pooled async Groq client for the running event loop.
+
+    httpx async connection pools are bound to the loop that created them, so
+    one client is kept per loop and dropped with it.
+    """
+    import asyncio
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**_client_options())
+        _async_clients[loop] = client
+    return client
+
+
+def close_clients() -> None:
+    """Close the shared sync client. Async clients are closed by aclose_async_client."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose_async_client() -> None:
+    """Close the async client bound to the running event loop, if any."""
+    import asyncio
+
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _raise_for_groq_error(response: httpx.Response) -> None:
+    if response.status_code == 200:
+        return
+    try:
+        error_data = response.json()
+        error_message = error_data.get("error", {}).get("message", "Unknown error occurred")
+    except Exception:
+        error_message = f"HTTP Error: {response.status_code}"
+    make_error(f"Groq API error: {error_message}")
+
+
+def _prep_options(preprocess: Optional[bool], trim_silence: Optional[bool] = None) -> Optional[tuple[str, bool]]:
+    """
+    Return (codec, trim_silence) for the compaction stage, or None when it is off.
+
+    GROQ_STT_PREPROCESS=0 disables compaction unless a caller asks for it
+    explicitly; GROQ_STT_PREPROCESS_CODEC selects "flac" (default) or "opus".
+    GROQ_STT_TRIM_SILENCE=1 turns on VAD trimming by default; trimming needs
+    the decoded signal, so it implies compaction.
+    """
+    if trim_silence is None:
+        trim_silence = os.getenv("GROQ_STT_TRIM_SILENCE", "0").lower() in ("1", "true", "yes", "on")
+    if preprocess is None:
+        preprocess = os.getenv("GROQ_STT_PREPROCESS", "1").lower() not in ("0", "false", "no", "off")
+    if not preprocess and not trim_silence:
+        return None
+    return os.getenv("GROQ_STT_PREPROCESS_CODEC", "flac").lower(), bool(trim_silence)
+
+
+def _cached_response(
+    use_cache: bool,
+    source: AudioSource,
+    endpoint: str,
+    data: dict,
+    prep: Optional[tuple[str, bool]] = None,
+) -> tuple[Optional[TranscriptionCache], Optional[str], Optional[httpx.Response]]:
+    cache = get_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    import httpx
+
+    audio_hash = source.sha256()
+    key = cache.make_key(audio_hash, endpoint, dict(data, _preprocess=list(prep)) if prep else data)
+    entry = cache.get(key)
+    if entry is None:
+        return cache, key, None
+    response = httpx.Response(
+        200,
+        content=entry["body"].encode("utf-8"),
+        headers={"content-type": entry["content_type"]},
+    )
+    return cache, key, response
+
+
+def _store_response(cache: Optional[TranscriptionCache], key: Optional[str], response: httpx.Response) -> None:
+    if cache is None or response.status_code != 200:
+        return
+    try:
+        cache.put(key, response.headers.get("content-type", "application/json"), response.text)
+    except OSError:
+        # A full or read-only cache directory must not fail the request.
+        pass
+
+
+def _upload_source(source: AudioSource, prep: Optional[tuple[str, bool]]) -> tuple[AudioSource, Optional[PreparedAudio]]:
+    """
+    Decide what goes on the wire.
+
+    Returns:
+        tuple: (the source to upload, the PreparedAudio when compaction ran;
+        its upload is then a new source the caller must close)
+    """
+    if prep:
+        from src.audio_prep import prepare_audio
+
+        codec, trim = prep
+        prepared = prepare_audio(source, codec, trim_silence=trim)
+        if prepared is not None:
+            return prepared.upload, prepared
+    return source, None
+
+
+def _restore_timeline(response: httpx.Response, prepared: Optional[PreparedAudio], data: dict) -> httpx.Response:
+    """
+    Map verbose_json timestamps from the silence-trimmed upload back onto the
+    original recording and report how much audio was cut.
+    """
+    if prepared is None or prepared.offset_map is None or response.status_code != 200:
+        return response
+    if data.get("response_format") != "verbose_json":
+        return response
+    import httpx
+    from src.vad import remap_verbose_json
+
+    payload = remap_verbose_json(response.json(), prepared.offset_map)
+    payload["vad"] = {
+        "original_duration": round(prepared.duration, 3),
+        "seconds_removed": round(prepared.seconds_removed, 3),
+    }
+    return httpx.Response(200, json=payload, headers={"content-type": "application/json"})
+
+
+def _upload_seconds(upload: AudioSource, prepared: Optional[PreparedAudio]) -> float:
+    if prepared is not None:
+        return max(0.0, prepared.duration - prepared.seconds_removed)
+    from src.audio_prep import audio_seconds
+
+    return audio_seconds(upload)
+
+
+def _post_audio(
+    endpoint: str,
+    source: AudioSource,
+    data: dict,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> httpx.Response:
+    """
+    Upload audio to a Groq endpoint, consulting the response cache first.
+
+    The audio is compacted to 16 kHz mono first unless preprocessing is
+    disabled, and optionally has its silences trimmed. Each attempt opens a
+    fresh reader on the upload, which httpx streams with a known
+    Content-Length and which is closed as soon as the attempt ends. The
+    request itself runs under the shared rate-limit scheduler, which retries
+    throttled and transient failures.
+    """
+    import httpx
+
+    prep = _prep_options(preprocess, trim_silence)
+    cache, key, response = _cached_response(use_cache, source, endpoint, data, prep)
+    if response is not None:
+        return response
+
+    upload, prepared = _upload_source(source, prep)
+
+    def send() -> httpx.Response:
+        with upload.open() as audio:
+            return get_client().post(endpoint, data=data, files={"file": (upload.name, audio, upload.mime_type)})
+
+    try:
+        response = get_scheduler().call(send, _upload_seconds(upload, prepared), priority)
+    except httpx.TransportError as e:
+        make_error(f"Groq API unreachable: {e}")
+    finally:
+        if prepared is not None:
+            prepared.upload.close()
+    response = _restore_timeline(response, prepared, data)
+    _store_response(cache, key, response)
+    return response
+
+
+async def _apost_audio(
+    endpoint: str,
+    source: AudioSource,
+    data: dict,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> httpx.Response:
+    import asyncio
+    import httpx
+
+    prep = _prep_options(preprocess, trim_silence)
+    # Hashing and compaction read the whole file, keep them off the event loop.
+    cache, key, response = await asyncio.to_thread(_cached_response, use_cache, source, endpoint, data, prep)
+    if response is not None:
+        return response
+
+    upload, prepared = await asyncio.to_thread(_upload_source, source, prep)
+
+    async def send() -> httpx.Response:
+        with upload.open() as audio:
+            return await get_async_client().post(
+                endpoint, data=data, files={"file": (upload.name, audio, upload.mime_type)}
+            )
+
+    try:
+        seconds = await asyncio.to_thread(_upload_seconds, upload, prepared)
+        response = await get_scheduler().acall(send, seconds, priority)
+    except httpx.TransportError as e:
+        make_error(f"Groq API unreachable: {e}")
+    finally:
+        if prepared is not None:
+            prepared.upload.close()
+    response = _restore_timeline(response, prepared, data)
+    _store_response(cache, key, response)
+    return response
 
-# Create a custom httpx client with the Groq API key
-groq_client = httpx.Client(
-    base_url="https://api.groq.com/openai/v1",
-    headers={
-        "Authorization": f"Bearer {groq_api_key}",
-        "Content-Type": "application/json",
-    },
-)
 
 # Define available models
 STT_MODELS = [
@@ -53,17 +365,75 @@ STT_MODELS = [
     "whisper-large-v3",  # High accuracy, multilingual
 ]
 
-def transcribe_audio(
-    input_file_path: str,
-    model: str = "whisper-large-v3-turbo",
-    language: Optional[str] = None,
-    response_format: Literal["json", "verbose_json", "text"] = "verbose_json",
-    prompt: Optional[str] = None,
-    timestamp_granularities: List[Literal["segment", "word"]] = ["segment"],
-    temperature: float = 0.0,
-    output_directory: Optional[str] = None,
-    save_to_file: bool = True,
-) -> TextContent:
+# What transcribe/translate accept as audio: a path, bytes already in memory,
+# a binary stream such as a pipe or stdin, or a prepared AudioSource.
+AudioInput = Union[str, os.PathLike, BytesLike, BinaryIO, AudioSource]
+
+# soundfile format names for in-memory audio that arrives without a file name.
+_SNIFFED_SUFFIXES = {"WAV": ".wav", "FLAC": ".flac", "OGG": ".ogg", "MP3": ".mp3"}
+
+
+def _sniff_suffix(source: AudioSource) -> Optional[str]:
+    import soundfile as sf
+
+    try:
+        with source.open() as reader, sf.SoundFile(reader) as f:
+            return _SNIFFED_SUFFIXES.get(f.format)
+    except Exception:
+        return None
+
+
+def _open_input(input_audio: AudioInput, filename: Optional[str] = None) -> AudioSource:
+    """
+    Turn a transcribe/translate input into an AudioSource.
+
+    Paths go through handle_input_file. Bytes are wrapped without copying and
+    streams are drained into a spool, so a caller such as PHP can hand over
+    an upload without writing a temp file. In-memory audio is named after
+    `filename`, whose suffix tells the API the format; without it the format
+    is sniffed, which only works for the formats libsndfile can read.
+    The returned source is closed by the transcribe/translate call.
+    """
+    if isinstance(input_audio, (str, os.PathLike)):
+        return AudioSource.from_path(handle_input_file(os.fspath(input_audio), audio_content_check=True))
+
+    if filename and not check_audio_file(Path(filename)):
+        make_error(f"File ({filename}) is not an audio or video file")
+    name = os.path.basename(filename) if filename else "audio"
+    if isinstance(input_audio, AudioSource):
+        source = input_audio
+    elif isinstance(input_audio, (bytes, bytearray, memoryview)):
+        source = AudioSource.from_bytes(input_audio, name)
+    elif hasattr(input_audio, "read"):
+        try:
+            source = AudioSource.from_stream(input_audio, name)
+        except OSError as e:
+            make_error(f"Could not read audio stream: {e}")
+    else:
+        make_error(f"Unsupported audio input: {type(input_audio).__name__}")
+
+    if source.size == 0:
+        source.close()
+        make_error("Audio input is empty")
+    if not check_audio_file(Path(source.name)):
+        suffix = _sniff_suffix(source)
+        if suffix is None:
+            source.close()
+            make_error("Cannot tell the format of in-memory audio; pass filename")
+        source.rename(source.stem + suffix)
+    return source
+
+
+def _prepare_transcription(
+    input_file_path: AudioInput,
+    model: str,
+    language: Optional[str],
+    response_format: str,
+    prompt: Optional[str],
+    timestamp_granularities: List[str],
+    temperature: float,
+    filename: Optional[str] = None,
+) -> tuple[AudioSource, dict]:
     # Validate model
     if model not in STT_MODELS:
         make_error(f"Model '{model}' not found. Available models are: {', '.join(STT_MODELS)}")
@@ -76,45 +446,53 @@ def transcribe_audio(
     if response_format != "verbose_json" and timestamp_granularities != ["segment"]:
         make_error("timestamp_granularities can only be used with response_format='verbose_json'")
     
-    # Get the input file
-    file_path = handle_input_file(input_file_path, audio_content_check=True)
+    # Get the input audio
+    source = _open_input(input_file_path, filename)
     
-    # Prepare the files for the multipart request
-    files = {
-        "file": (file_path.name, open(file_path, "rb"), "audio/mpeg"),
-        "model": (None, model),
-        "response_format": (None, response_format),
-        "temperature": (None, str(temperature)),
+    # Form fields for the multipart request
+    data = {
+        "model": model,
+        "response_format": response_format,
+        "temperature": str(temperature),
     }
     
     # Add optional parameters
     if language:
-        files["language"] = (None, language)
+        data["language"] = language
     if prompt:
-        files["prompt"] = (None, prompt)
+        data["prompt"] = prompt
     if timestamp_granularities and response_format == "verbose_json":
-        for granularity in timestamp_granularities:
-            files["timestamp_granularities[]"] = (None, granularity)
-
-    # Make the API request
-    response = httpx.post(
-        "https://api.groq.com/openai/v1/audio/transcriptions",
-        headers={"Authorization": f"Bearer {groq_api_key}"},
-        files=files
-    )
-    
+        data["timestamp_granularities[]"] = list(timestamp_granularities)
+
+    return source, data
+
+
+def _save_to_store(source: AudioSource, task: str, data: dict, result) -> Optional[str]:
+    """Append a result to the transcript store when one is configured; return a description of where it went."""
+    store = get_store()
+    if store is None:
+        return None
+    transcript_id = store.put(make_record(source.sha256(), task, data, result, source.name))
+    return f"transcript #{transcript_id} in {store.path}"
+
+
+def _finish_transcription(
+    response: httpx.Response,
+    source: AudioSource,
+    data: dict,
+    model: str,
+    response_format: str,
+    output_directory: Optional[str],
+    save_to_file: bool,
+) -> TextContent:
     # Check for errors
-    if response.status_code != 200:
-        try:
-            error_data = response.json()
-            error_message = error_data.get("error", {}).get("message", "Unknown error occurred")
-        except Exception:
-            error_message = f"HTTP Error: {response.status_code}"
-        make_error(f"Groq API error: {error_message}")
+    _raise_for_groq_error(response)
+    source_name = source.name
     
     # Process the response
     if response_format == "text":
         transcription = response.text
+        transcription_data = transcription
     else:
         transcription_data = response.json()
         if response_format == "json":
@@ -124,100 +502,359 @@ def transcribe_audio(
             transcription = transcription_data.get("text", "")
             
             # If saving to file, also save the full JSON response
-            if save_to_file:
+            if save_to_file and get_store() is None:
                 output_path = make_output_path(output_directory, base_path)
-                json_file_path = make_output_file("groq-stt-full", file_path.name, output_path, "json")
+                json_file_path = make_output_file("groq-stt-full", source_name, output_path, "json")
                 with open(json_file_path, "w") as f:
                     json.dump(transcription_data, f, indent=2)
     
-    # Save the transcription to a file if requested
+    # Save the transcription to the store, or a file, if requested
     if save_to_file:
+        stored = _save_to_store(source, "transcribe", data, transcription_data)
+        if stored:
+            return make_text_content(f"Success. Transcription saved as {stored}\nModel used: {model}")
+
         output_path = make_output_path(output_directory, base_path)
-        output_file_path = make_output_file("groq-stt", file_path.name, output_path, "txt")
+        output_file_path = make_output_file("groq-stt", source_name, output_path, "txt")
         
         output_file_path.parent.mkdir(parents=True, exist_ok=True)
         with open(output_file_path, "w") as f:
             f.write(transcription)
         
-        return TextContent(
-            type="text",
-            text=f"Success. Transcription saved as: {output_file_path}\nModel used: {model}"
-        )
+        return make_text_content(f"Success. Transcription saved as: {output_file_path}\nModel used: {model}")
     else:
-        return TextContent(
-            type="text",
-            text=transcription
+        return make_text_content(transcription)
+
+
+def transcribe_audio(
+    input_file_path: AudioInput,
+    model: str = "whisper-large-v3-turbo",
+    language: Optional[str] = None,
+    response_format: Literal["json", "verbose_json", "text"] = "verbose_json",
+    prompt: Optional[str] = None,
+    timestamp_granularities: List[Literal["segment", "word"]] = ["segment"],
+    temperature: float = 0.0,
+    output_directory: Optional[str] = None,
+    save_to_file: bool = True,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    filename: Optional[str] = None,
+) -> TextContent:
+    source, data = _prepare_transcription(
+        input_file_path, model, language, response_format, prompt, timestamp_granularities, temperature, filename
+    )
+
+    with source:
+        response = _post_audio(
+            "/audio/transcriptions", source, data, use_cache,
+            preprocess=preprocess, trim_silence=trim_silence, priority=priority,
         )
+        return _finish_transcription(response, source, data, model, response_format, output_directory, save_to_file)
 
-def translate_audio(
-    input_file_path: str,
-    model: str = "whisper-large-v3",
-    response_format: Literal["json", "text"] = "json",
+
+async def transcribe_audio_async(
+    input_file_path: AudioInput,
+    model: str = "whisper-large-v3-turbo",
+    language: Optional[str] = None,
+    response_format: Literal["json", "verbose_json", "text"] = "verbose_json",
+    prompt: Optional[str] = None,
+    timestamp_granularities: List[Literal["segment", "word"]] = ["segment"],
+    temperature: float = 0.0,
+    output_directory: Optional[str] = None,
+    save_to_file: bool = True,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    filename: Optional[str] = None,
+) -> TextContent:
+    import asyncio
+
+    # Draining a stream input reads it to the end, keep that off the event loop.
+    source, data = await asyncio.to_thread(
+        _prepare_transcription,
+        input_file_path, model, language, response_format, prompt, timestamp_granularities, temperature, filename,
+    )
+
+    with source:
+        response = await _apost_audio(
+            "/audio/transcriptions", source, data, use_cache,
+            preprocess=preprocess, trim_silence=trim_silence, priority=priority,
+        )
+        return _finish_transcription(response, source, data, model, response_format, output_directory, save_to_file)
+
+
+class TranscriptionResult(NamedTuple):
+    # The response body: a string for response_format "text", else the decoded JSON.
+    payload: Union[str, dict]
+    # The form fields that were sent (model, response_format, ...).
+    data: dict
+    source_name: str
+    # SHA-256 of the original audio, when asked for.
+    audio_hash: Optional[str] = None
+
+
+async def transcribe_audio_result_async(
+    input_file_path: AudioInput,
+    model: str = "whisper-large-v3-turbo",
+    language: Optional[str] = None,
+    response_format: Literal["json", "verbose_json", "text"] = "json",
+    prompt: Optional[str] = None,
+    timestamp_granularities: List[Literal["segment", "word"]] = ["segment"],
+    temperature: float = 0.0,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    filename: Optional[str] = None,
+    with_hash: bool = False,
+) -> TranscriptionResult:
+    """
+    Transcribe audio and return the response as data instead of TextContent.
+
+    For callers that keep results themselves (stt_batch): nothing is saved,
+    and every step that reads the file runs in a worker thread, so many
+    uploads can share one event loop.
+    """
+    import asyncio
+
+    source, data = await asyncio.to_thread(
+        _prepare_transcription,
+        input_file_path, model, language, response_format, prompt, timestamp_granularities, temperature, filename,
+    )
+
+    with source:
+        response = await _apost_audio(
+            "/audio/transcriptions", source, data, use_cache,
+            preprocess=preprocess, trim_silence=trim_silence, priority=priority,
+        )
+        _raise_for_groq_error(response)
+        payload = response.text if response_format == "text" else response.json()
+        # Already computed for the cache lookup unless caching is off.
+        audio_hash = await asyncio.to_thread(source.sha256) if with_hash else None
+        return TranscriptionResult(payload, data, source.name, audio_hash)
+
+
+def transcribe_audio_chunked(
+    input_file_path: AudioInput,
+    model: str = "whisper-large-v3-turbo",
+    language: Optional[str] = None,
+    response_format: Literal["json", "verbose_json", "text"] = "verbose_json",
     prompt: Optional[str] = None,
+    timestamp_granularities: List[Literal["segment", "word"]] = ["segment"],
     temperature: float = 0.0,
     output_directory: Optional[str] = None,
     save_to_file: bool = True,
+    use_cache: bool = True,
+    chunk_seconds: float = 600.0,
+    overlap_seconds: float = 5.0,
+    silence_search_seconds: float = 10.0,
+    max_concurrency: int = 4,
+    priority: int = PRIORITY_INTERACTIVE,
+    filename: Optional[str] = None,
 ) -> TextContent:
+    """
+    Transcribe long audio as overlapping chunks uploaded concurrently.
+
+    Chunks are cut near silence, compacted to 16 kHz mono, sent through
+    the shared pooled client and stitched back onto one timeline with
+    overlap duplicates removed. Wall-clock time scales with chunk_seconds * chunks / max_concurrency
+    rather than with the length of the whole file.
+    """
+    import httpx
+    import soundfile as sf
+    from src.stt_chunking import plan_chunks, merge_chunk_results
+
+    # Chunks are always requested as verbose_json so their timestamps can be
+    # stitched; the caller's response_format only shapes the final output.
+    granularities = list(timestamp_granularities) if response_format == "verbose_json" else ["segment"]
+    source, data = _prepare_transcription(
+        input_file_path, model, language, "verbose_json", prompt, granularities, temperature, filename
+    )
+
+    with source, source.open() as reader:
+        try:
+            sound = sf.SoundFile(reader)
+        except Exception as e:
+            make_error(f"Chunked transcription cannot decode {source.name}: {e}")
+
+        # Chunks are always compacted to 16 kHz mono; only the codec is configurable.
+        codec, _ = _prep_options(True, False)
+        with sound:
+            sr = sound.samplerate
+            bounds = plan_chunks(sound, chunk_seconds, overlap_seconds, silence_search_seconds)
+            results = _transcribe_chunks(sound, bounds, codec, source.stem, data, use_cache, max_concurrency, priority)
+
+        merged = merge_chunk_results(results, [(start / sr, end / sr) for start, end in bounds])
+        response = httpx.Response(200, json=merged)
+        final_format = "json" if response_format == "text" else response_format
+        return _finish_transcription(response, source, data, model, final_format, output_directory, save_to_file)
+
+
+def _transcribe_chunks(
+    sound,
+    bounds: list[tuple[int, int]],
+    codec: str,
+    stem: str,
+    data: dict,
+    use_cache: bool,
+    max_concurrency: int,
+    priority: int,
+) -> list[dict]:
+    import concurrent.futures
+    from src.stt_chunking import iter_encoded_chunks
+
+    def _transcribe_chunk(index: int, content: bytes, suffix: str, mime_type: str) -> dict:
+        # Chunks are already compacted, so preprocessing is skipped.
+        with AudioSource.from_bytes(content, f"{stem}.chunk{index}{suffix}", mime_type) as chunk:
+            response = _post_audio(
+                "/audio/transcriptions", chunk, data, use_cache,
+                preprocess=False, trim_silence=False, priority=priority,
+            )
+        _raise_for_groq_error(response)
+        return response.json()
+
+    results: list[Optional[dict]] = [None] * len(bounds)
+    max_concurrency = max(1, max_concurrency)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        pending = set()
+        futures = {}
+        # Encode lazily and keep at most max_concurrency chunks in memory.
+        for index, (content, suffix, mime_type) in iter_encoded_chunks(sound, bounds, codec):
+            if len(pending) >= max_concurrency:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    results[futures[future]] = future.result()
+            future = pool.submit(_transcribe_chunk, index, content, suffix, mime_type)
+            futures[future] = index
+            pending.add(future)
+        for future in concurrent.futures.as_completed(pending):
+            results[futures[future]] = future.result()
+    return results
+
+
+def _prepare_translation(
+    input_file_path: AudioInput,
+    model: str,
+    response_format: str,
+    prompt: Optional[str],
+    temperature: float,
+    filename: Optional[str] = None,
+) -> tuple[AudioSource, dict]:
     # Validate model - only whisper-large-v3 supports translation
     if model != "whisper-large-v3":
         make_error("Only 'whisper-large-v3' model supports translation. Other models can only transcribe.")
     
-    # Get the input file
-    file_path = handle_input_file(input_file_path, audio_content_check=True)
+    # Get the input audio
+    source = _open_input(input_file_path, filename)
     
-    # Prepare the files for the multipart request
-    files = {
-        "file": (file_path.name, open(file_path, "rb"), "audio/mpeg"),
-        "model": (None, model),
-        "response_format": (None, response_format),
-        "temperature": (None, str(temperature)),
+    # Form fields for the multipart request
+    data = {
+        "model": model,
+        "response_format": response_format,
+        "temperature": str(temperature),
     }
     
     # Add optional parameters
     if prompt:
-        files["prompt"] = (None, prompt)
-    
-    # Make the API request
-    response = httpx.post(
-        "https://api.groq.com/openai/v1/audio/translations",
-        headers={"Authorization": f"Bearer {groq_api_key}"},
-        files=files
-    )
-    
+        data["prompt"] = prompt
+
+    return source, data
+
+
+def _finish_translation(
+    response: httpx.Response,
+    source: AudioSource,
+    data: dict,
+    model: str,
+    response_format: str,
+    output_directory: Optional[str],
+    save_to_file: bool,
+) -> TextContent:
     # Check for errors
-    if response.status_code != 200:
-        try:
-            error_data = response.json()
-            error_message = error_data.get("error", {}).get("message", "Unknown error occurred")
-        except Exception:
-            error_message = f"HTTP Error: {response.status_code}"
-        make_error(f"Groq API error: {error_message}")
+    _raise_for_groq_error(response)
+    source_name = source.name
     
     # Process the response
     if response_format == "text":
         translation = response.text
+        translation_data = translation
     else:  # json
         translation_data = response.json()
         translation = translation_data.get("text", "")
     
-    # Save the translation to a file if requested
+    # Save the translation to the store, or a file, if requested
     if save_to_file:
+        stored = _save_to_store(source, "translate", data, translation_data)
+        if stored:
+            return make_text_content(f"Success. Translation saved as {stored}\nModel used: {model}")
+
         output_path = make_output_path(output_directory, base_path)
-        output_file_path = make_output_file("groq-translation", file_path.name, output_path, "txt")
+        output_file_path = make_output_file("groq-translation", source_name, output_path, "txt")
         
         output_file_path.parent.mkdir(parents=True, exist_ok=True)
         with open(output_file_path, "w") as f:
             f.write(translation)
         
-        return TextContent(
-            type="text",
-            text=f"Success. Translation saved as: {output_file_path}\nModel used: {model}"
-        )
+        return make_text_content(f"Success. Translation saved as: {output_file_path}\nModel used: {model}")
     else:
-        return TextContent(
-            type="text",
-            text=translation
+        return make_text_content(translation)
+
+
+def translate_audio(
+    input_file_path: AudioInput,
+    model: str = "whisper-large-v3",
+    response_format: Literal["json", "text"] = "json",
+    prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    output_directory: Optional[str] = None,
+    save_to_file: bool = True,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    filename: Optional[str] = None,
+) -> TextContent:
+    source, data = _prepare_translation(input_file_path, model, response_format, prompt, temperature, filename)
+
+    with source:
+        response = _post_audio(
+            "/audio/translations", source, data, use_cache,
+            preprocess=preprocess, trim_silence=trim_silence, priority=priority,
+        )
+        return _finish_translation(response, source, data, model, response_format, output_directory, save_to_file)
+
+
+async def translate_audio_async(
+    input_file_path: AudioInput,
+    model: str = "whisper-large-v3",
+    response_format: Literal["json", "text"] = "json",
+    prompt: Optional[str] = None,
+    temperature: float = 0.0,
+    output_directory: Optional[str] = None,
+    save_to_file: bool = True,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    filename: Optional[str] = None,
+) -> TextContent:
+    import asyncio
+
+    source, data = await asyncio.to_thread(
+        _prepare_translation, input_file_path, model, response_format, prompt, temperature, filename
+    )
+
+    with source:
+        response = await _apost_audio(
+            "/audio/translations", source, data, use_cache,
+            preprocess=preprocess, trim_silence=trim_silence, priority=priority,
         )
+        return _finish_translation(response, source, data, model, response_format, output_directory, save_to_file)
 
 def list_stt_models() -> TextContent:
     models_info = {
@@ -264,7 +901,4 @@ def list_stt_models() -> TextContent:
             f"  Word Error Rate: {info['word_error_rate']}"
         )
     
-    return TextContent(
-        type="text",
-        text="Available Groq Speech-to-Text Models:\n\n" + "\n\n".join(model_details)
-    ) 
\ No newline at end of file
+    return make_text_content("Available Groq Speech-to-Text Models:\n\n" + "\n\n".join(model_details)) 
\ No newline at end of file
@@ -0,0 +1,335 @@
+"""
+Batch transcription for backfills
+
+Transcribes every audio file under a directory, matching a glob, or listed
+in a manifest, running up to `concurrency` uploads at once on the shared
+async Groq client. Uploads run at batch priority, so interactive requests
+served by the same process are scheduled first. Each result is appended to
+one JSONL file as soon as it finishes, so memory use does not grow with the
+number of files, and files already present in the output with "ok": true are
+skipped, which makes an interrupted run resumable by simply starting it
+again. Files are recorded and compared by their resolved absolute path, so
+the resumed run may use another working directory, a relative source or a
+symlink to the same files. With --store the results are also appended to the
+SQLite transcript store in batched transactions, and a successful result
+reaches the JSONL file only once its store batch has committed, so a crash
+never leaves a file marked done whose transcript is missing from the store.
+
+Run from tools/groq-mcp:
+    python -m src.stt_batch /srv/recordings -o transcripts.jsonl --concurrency 16
+    python -m src.stt_batch '/srv/recordings/**/*.wav' -o transcripts.jsonl
+    python -m src.stt_batch manifest.txt -o transcripts.jsonl --store transcripts.db
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Iterator, Optional
+
+from src import groq_stt
+from src.stt_scheduler import PRIORITY_BATCH
+from src.transcript_store import TranscriptStore, make_record
+from src.utils import MCPError, check_audio_file
+
+MANIFEST_SUFFIXES = {".txt", ".lst", ".jsonl"}
+PROGRESS_INTERVAL = 2.0
+
+
+def iter_inputs(source: str) -> Iterator[Path]:
+    """
+    Lazily yield the audio files described by `source`.
+
+    Args:
+        source: A directory (searched recursively), a glob pattern, or a
+            manifest file with one path per line (plain text, or JSONL
+            objects carrying a "path" key)
+    """
+    if any(ch in source for ch in "*?["):
+        for name in glob.iglob(os.path.expanduser(source), recursive=True):
+            path = Path(name)
+            if path.is_file() and check_audio_file(path):
+                yield path
+        return
+
+    path = Path(os.path.expanduser(source))
+    if path.is_dir():
+        stack = [path]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file() and check_audio_file(Path(entry.name)):
+                        yield Path(entry.path)
+        return
+
+    if path.is_file() and path.suffix.lower() in MANIFEST_SUFFIXES:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("{"):
+                    line = json.loads(line).get("path", "")
+                if line:
+                    yield Path(os.path.expanduser(line))
+        return
+
+    raise MCPError(f"Batch source ({source}) is not a directory, glob or manifest")
+
+
+def load_completed(output_path: Path) -> set[str]:
+    """
+    Return the resolved paths already transcribed successfully in an existing output file.
+
+    Records from before paths were resolved may hold relative paths; those
+    are resolved against the current directory, as they were written.
+    """
+    completed = set()
+    if not output_path.exists():
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from an interrupted run.
+                continue
+            if record.get("ok") and record.get("path"):
+                completed.add(str(Path(record["path"]).resolve()))
+    return completed
+
+
+class _Progress:
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.started = time.monotonic()
+        self.last_report = 0.0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bytes = 0
+
+    def report(self, final: bool = False):
+        now = time.monotonic()
+        if not final and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        self.stream.write(
+            f"\r[stt_batch] done={self.done} failed={self.failed} skipped={self.skipped} "
+            f"{self.done / elapsed:.2f} files/s {self.bytes / elapsed / 1e6:.2f} MB/s"
+            + ("\n" if final else "")
+        )
+        self.stream.flush()
+
+    def summary(self) -> dict:
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "bytes": self.bytes,
+            "elapsed_s": round(time.monotonic() - self.started, 3),
+        }
+
+
+def _next_input(inputs: Iterator[Path], default):
+    path = next(inputs, default)
+    return path if path is default else path.resolve()
+
+
+async def _transcribe_one(path: Path, options: dict, store: Optional[TranscriptStore] = None) -> dict:
+    record = {"path": str(path)}
+    started = time.monotonic()
+    try:
+        result = await groq_stt.transcribe_audio_result_async(
+            str(path),
+            options["model"],
+            options["language"],
+            options["response_format"],
+            options["prompt"],
+            options["timestamp_granularities"],
+            options["temperature"],
+            use_cache=options["use_cache"],
+            preprocess=options["preprocess"],
+            trim_silence=options["trim_silence"],
+            priority=PRIORITY_BATCH,
+            with_hash=store is not None,
+        )
+        if options["response_format"] == "text":
+            record.update(ok=True, text=result.payload)
+        else:
+            record.update(ok=True, text=result.payload.get("text", ""))
+            if options["response_format"] == "verbose_json":
+                record["result"] = result.payload
+        if store is not None:
+            record["audio_hash"] = result.audio_hash
+            elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+            store.add(make_record(result.audio_hash, "transcribe", result.data, result.payload, path.name, elapsed_ms))
+    except MCPError as e:
+        record.update(ok=False, error=str(e))
+    except Exception as e:
+        record.update(ok=False, error=f"{type(e).__name__}: {e}")
+    record["model"] = options["model"]
+    record["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return record
+
+
+async def transcribe_many(
+    source: str,
+    output_path: str,
+    concurrency: int = 8,
+    model: str = "whisper-large-v3-turbo",
+    language: Optional[str] = None,
+    response_format: str = "json",
+    prompt: Optional[str] = None,
+    timestamp_granularities: Optional[list[str]] = None,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+    preprocess: Optional[bool] = None,
+    trim_silence: Optional[bool] = None,
+    progress: bool = True,
+    store_path: Optional[str] = None,
+) -> dict:
+    """
+    Transcribe many files concurrently into a single JSONL file.
+
+    Args:
+        source: Directory, glob pattern or manifest (see iter_inputs)
+        output_path: JSONL file to append results to; also used to resume
+        concurrency: Maximum number of uploads in flight
+        store_path: Also append results to this transcript store database
+
+    Returns:
+        dict: Counters for done, failed and skipped files
+    """
+    output = Path(os.path.expanduser(output_path))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    completed = load_completed(output)
+    options = {
+        "model": model,
+        "language": language,
+        "response_format": response_format,
+        "prompt": prompt,
+        "timestamp_granularities": timestamp_granularities or ["segment"],
+        "temperature": temperature,
+        "use_cache": use_cache,
+        "preprocess": preprocess,
+        "trim_silence": trim_silence,
+    }
+    stats = _Progress()
+    store = TranscriptStore(Path(os.path.expanduser(store_path))) if store_path else None
+    concurrency = max(1, concurrency)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def produce():
+        # Directory walking and resolving are blocking I/O; pull the next
+        # path in a thread so a slow filesystem does not stall the uploads
+        # already running.
+        inputs = iter_inputs(source)
+        sentinel = object()
+        while True:
+            path = await asyncio.to_thread(_next_input, inputs, sentinel)
+            if path is sentinel:
+                break
+            if str(path) in completed:
+                stats.skipped += 1
+                continue
+            await queue.put(path)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    # Successful lines whose store rows are not committed yet; resume skips
+    # whatever the JSONL file marks done, so those must not get there first.
+    held: list[str] = []
+
+    def write(out, lines):
+        out.writelines(lines)
+        out.flush()
+
+    async def consume(out):
+        while True:
+            path = await queue.get()
+            if path is None:
+                return
+            record = await _transcribe_one(path, options, store)
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            if store is not None and record["ok"]:
+                held.append(line)
+                if not store.pending:
+                    write(out, held)
+                    held.clear()
+            else:
+                write(out, [line])
+            if record["ok"]:
+                stats.done += 1
+                try:
+                    stats.bytes += path.stat().st_size
+                except OSError:
+                    pass
+            else:
+                stats.failed += 1
+            if progress:
+                stats.report()
+
+    try:
+        with open(output, "a", encoding="utf-8") as out:
+            await asyncio.gather(produce(), *(consume(out) for _ in range(concurrency)))
+            if store is not None:
+                store.flush()
+                write(out, held)
+    finally:
+        await groq_stt.aclose_async_client()
+        if store is not None:
+            store.close()
+        if progress:
+            stats.report(final=True)
+    return stats.summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch transcription to JSONL")
+    parser.add_argument("source", help="directory, glob pattern or manifest file")
+    parser.add_argument("-o", "--output", required=True, help="JSONL output (appended; used to resume)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--model", default="whisper-large-v3-turbo", choices=groq_stt.STT_MODELS)
+    parser.add_argument("--language")
+    parser.add_argument("--prompt")
+    parser.add_argument("--response-format", default="json", choices=["json", "verbose_json", "text"])
+    parser.add_argument("--word-timestamps", action="store_true", help="request word granularity (verbose_json)")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--trim-silence", action="store_true")
+    parser.add_argument("--quiet", action="store_true", help="do not print progress")
+    parser.add_argument("--store", help="also append results to this SQLite transcript store")
+    args = parser.parse_args(argv)
+
+    granularities = ["segment", "word"] if args.word_timestamps else ["segment"]
+    summary = asyncio.run(
+        transcribe_many(
+            args.source,
+            args.output,
+            concurrency=args.concurrency,
+            model=args.model,
+            language=args.language,
+            response_format=args.response_format,
+            prompt=args.prompt,
+            timestamp_granularities=granularities,
+            temperature=args.temperature,
+            use_cache=not args.no_cache,
+            trim_silence=True if args.trim_silence else None,
+            progress=not args.quiet,
+            store_path=args.store,
+        )
+    )
+    print(json.dumps(summary))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+Content-addressed cache for Groq speech-to-text responses
+
+Entries are keyed by a streaming SHA-256 of the audio bytes plus every
+request parameter that changes the result (endpoint, model, language, prompt,
+temperature, response_format and timestamp granularities) and hold the raw
+Groq response body. Entries are written atomically (temp file + rename) so
+several worker processes can share one cache directory, and the directory is
+kept under a byte budget by evicting the least recently used entries.
+
+The cache holds transcripts of users' audio on disk, so it is off unless
+GROQ_STT_CACHE is set, and entries expire GROQ_STT_CACHE_MAX_AGE seconds
+after they were stored, however often they are read.
+
+Configuration:
+    GROQ_STT_CACHE             set to 1 to enable caching (default off)
+    GROQ_STT_CACHE_DIR         cache directory (default ~/.cache/ginto/groq-stt)
+    GROQ_STT_CACHE_MAX_BYTES   total size budget (default 256 MiB)
+    GROQ_STT_CACHE_MAX_AGE     seconds an entry is kept (default 7 days, 0 = no limit)
+"""
+
+import os
+import json
+import hashlib
+import time
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+PURGE_INTERVAL = 3600
+HASH_CHUNK_SIZE = 1024 * 1024
+ENTRY_SUFFIX = ".json"
+
+
+def hash_file(path: Path) -> str:
+    """Return the hex SHA-256 of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_MAX_BYTES, max_age: float = DEFAULT_MAX_AGE):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        # Size of the directory as last seen by this process; None until the
+        # first store triggers a scan. Other processes also write here, so
+        # eviction always rescans before deleting anything.
+        self._approx_bytes: Optional[int] = None
+        # Expired entries are removed on read and by evict(); stores also run
+        # evict() this often so entries nobody reads again do not linger.
+        self._next_purge = 0.0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, audio_hash: str, endpoint: str, params: dict) -> str:
+        """
+        Build the cache key for one request.
+
+        Args:
+            audio_hash: SHA-256 of the uploaded audio
+            endpoint: API endpoint path, e.g. "/audio/transcriptions"
+            params: Form fields sent alongside the file
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        material = json.dumps(
+            {"audio": audio_hash, "endpoint": endpoint, "params": params},
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / key[:2] / (key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the stored entry ({"content_type", "body"}) or None."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Reads bump the mtime, so the age comes from the entry itself.
+        # Entries written before "stored_at" existed count as expired.
+        if self.max_age and time.time() - entry.get("stored_at", 0) > self.max_age:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self.misses += 1
+                self.expired += 1
+            return None
+
+        # Bump the mtime so eviction treats the entry as recently used;
+        # atime is unreliable on relatime/noatime mounts.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, content_type: str, body: str) -> None:
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps(
+            {"content_type": content_type, "body": body, "stored_at": time.time()}
+        ).encode("utf-8")
+
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self.stores += 1
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan()[0]
+            else:
+                self._approx_bytes += len(payload)
+            over_budget = self._approx_bytes > self.max_bytes
+            now = time.monotonic()
+            purge_due = bool(self.max_age) and now >= self._next_purge
+            if purge_due:
+                self._next_purge = now + min(self.max_age, PURGE_INTERVAL)
+        if over_budget or purge_due:
+            self.evict()
+
+    def _scan(self) -> tuple[int, list[tuple[float, int, str]]]:
+        total = 0
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                total += st.st_size
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        return total, entries
+
+    def evict(self) -> int:
+        """Delete expired entries, then least recently used ones until the cache fits its budget."""
+        total, entries = self._scan()
+        removed = 0
+        if self.max_age:
+            # An entry last read before the cutoff was also stored before it.
+            cutoff = time.time() - self.max_age
+            live = []
+            for mtime, size, path in entries:
+                if mtime >= cutoff:
+                    live.append((mtime, size, path))
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            entries = live
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    # Another process evicted it first.
+                    pass
+                total -= size
+                removed += 1
+        with self._lock:
+            self._approx_bytes = total
+            self.evictions += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": str(self.directory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "approx_bytes": self._approx_bytes,
+                "max_bytes": self.max_bytes,
+                "max_age": self.max_age,
+            }
+
+
+_cache: Optional[TranscriptionCache] = None
+_cache_disabled = False
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[TranscriptionCache]:
+    """Return the process-wide cache, or None when disabled or unusable."""
+    global _cache, _cache_disabled
+    if _cache is not None or _cache_disabled:
+        return _cache
+    with _cache_lock:
+        if _cache is not None or _cache_disabled:
+            return _cache
+        if os.getenv("GROQ_STT_CACHE", "0").lower() in ("", "0", "false", "no", "off"):
+            _cache_disabled = True
+            return None
+        directory = os.path.expanduser(
+            os.getenv("GROQ_STT_CACHE_DIR", "~/.cache/ginto/groq-stt")
+        )
+        try:
+            max_bytes = int(os.getenv("GROQ_STT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        except ValueError:
+            max_bytes = DEFAULT_MAX_BYTES
+        try:
+            max_age = float(os.getenv("GROQ_STT_CACHE_MAX_AGE", DEFAULT_MAX_AGE))
+        except ValueError:
+            max_age = DEFAULT_MAX_AGE
+        try:
+            _cache = TranscriptionCache(Path(directory), max_bytes, max_age)
+        except OSError:
+            # An unwritable cache directory must never break transcription.
+            _cache_disabled = True
+        return _cache
@@ -0,0 +1,176 @@
+"""
+Chunk planning and result stitching for long-audio transcription
+
+Long recordings are split into overlapping chunks so they can be uploaded
+concurrently and stay below the API upload limit. Cut points are moved to the
+quietest frame near the nominal chunk boundary, so words are rarely split.
+After transcription the per-chunk verbose_json results are shifted back onto
+the original timeline and the overlap regions are de-duplicated.
+"""
+
+from typing import Iterator
+
+import numpy as np
+import soundfile as sf
+
+from src.audio_prep import compact_samples
+
+# Energy frames used to look for a quiet cut point.
+FRAME_SECONDS = 0.02
+
+# Words closer than this (in seconds) with the same text on both sides of a
+# boundary are treated as the same word transcribed twice.
+DUPLICATE_WORD_TOLERANCE = 0.3
+
+
+def _quietest_offset(samples: np.ndarray, samplerate: int) -> int:
+    """Return the sample offset of the lowest-energy frame in `samples`."""
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    frame = max(1, int(samplerate * FRAME_SECONDS))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return len(samples)
+    frames = samples[: n_frames * frame].reshape(n_frames, frame)
+    energy = np.einsum("ij,ij->i", frames, frames)
+    return int(np.argmin(energy)) * frame + frame // 2
+
+
+def plan_chunks(
+    sound: sf.SoundFile,
+    chunk_seconds: float,
+    overlap_seconds: float,
+    search_seconds: float,
+) -> list[tuple[int, int]]:
+    """
+    Plan overlapping chunk boundaries for an open sound file.
+
+    Each nominal cut point is moved to the quietest frame within the
+    `search_seconds` before it; the next chunk starts `overlap_seconds`
+    before that cut.
+
+    Args:
+        sound: Open soundfile handle (its position is changed)
+        chunk_seconds: Nominal chunk length
+        overlap_seconds: Audio shared by consecutive chunks
+        search_seconds: How far before the nominal cut to look for silence
+
+    Returns:
+        list: (start_frame, end_frame) pairs covering the whole file
+    """
+    sr = sound.samplerate
+    total = sound.frames
+    chunk = int(chunk_seconds * sr)
+    overlap = int(overlap_seconds * sr)
+    search = min(int(search_seconds * sr), chunk // 2)
+    if chunk <= overlap:
+        raise ValueError("chunk_seconds must be larger than overlap_seconds")
+
+    bounds = []
+    start = 0
+    while start < total:
+        target = start + chunk
+        if target >= total:
+            bounds.append((start, total))
+            break
+        window_start = max(start + overlap + 1, target - search)
+        sound.seek(window_start)
+        window = sound.read(target - window_start, dtype="float32", always_2d=True)
+        end = window_start + _quietest_offset(window, sr)
+        bounds.append((start, end))
+        start = end - overlap
+    return bounds
+
+
+def iter_encoded_chunks(
+    sound: sf.SoundFile, bounds: list[tuple[int, int]], codec: str = "flac"
+) -> Iterator[tuple[int, tuple[bytes, str, str]]]:
+    """
+    Yield (index, (encoded bytes, suffix, MIME type)) for each planned chunk.
+
+    Chunks are read one at a time and compacted to 16 kHz mono.
+    """
+    for index, (start, end) in enumerate(bounds):
+        sound.seek(start)
+        samples = sound.read(end - start, dtype="float32", always_2d=True)
+        yield index, compact_samples(samples, sound.samplerate, codec)
+
+
+def _shift(item: dict, offset: float) -> dict:
+    item = dict(item)
+    for key in ("start", "end"):
+        if isinstance(item.get(key), (int, float)):
+            item[key] = round(item[key] + offset, 3)
+    return item
+
+
+def _merged_text(results: list[dict], segments: list[dict], words: list[dict]) -> str:
+    if segments:
+        return " ".join(seg.get("text", "").strip() for seg in segments).strip()
+    if words:
+        return " ".join(word.get("word", "").strip() for word in words).strip()
+    return " ".join(data.get("text", "").strip() for data in results).strip()
+
+
+def merge_chunk_results(
+    results: list[dict], bounds_seconds: list[tuple[float, float]]
+) -> dict:
+    """
+    Stitch per-chunk verbose_json results onto one timeline.
+
+    The overlap between two chunks is split at its midpoint: segments and
+    words are kept from the chunk whose own range contains their midpoint
+    (segments) or start time (words).
+
+    Args:
+        results: verbose_json payloads, one per chunk, in chunk order
+        bounds_seconds: (start, end) of each chunk on the original timeline
+
+    Returns:
+        dict: A verbose_json-shaped payload for the whole file
+    """
+    n = len(results)
+    cuts = [
+        (bounds_seconds[i][1] + bounds_seconds[i + 1][0]) / 2 for i in range(n - 1)
+    ]
+
+    segments = []
+    words = []
+    language = None
+    for i, (data, (offset, _)) in enumerate(zip(results, bounds_seconds)):
+        lo = cuts[i - 1] if i > 0 else float("-inf")
+        hi = cuts[i] if i < n - 1 else float("inf")
+        language = language or data.get("language")
+
+        for seg in data.get("segments") or []:
+            seg = _shift(seg, offset)
+            mid = (seg.get("start", 0.0) + seg.get("end", 0.0)) / 2
+            if lo <= mid < hi:
+                segments.append(seg)
+
+        for word in data.get("words") or []:
+            word = _shift(word, offset)
+            start = word.get("start", 0.0)
+            if not lo <= start < hi:
+                continue
+            if words:
+                prev = words[-1]
+                same_text = prev.get("word", "").strip().lower() == word.get("word", "").strip().lower()
+                if same_text and abs(prev.get("start", 0.0) - start) <= DUPLICATE_WORD_TOLERANCE:
+                    continue
+            words.append(word)
+
+    for seg_id, seg in enumerate(segments):
+        seg["id"] = seg_id
+
+    merged = {
+        "task": "transcribe",
+        "language": language,
+        "duration": round(bounds_seconds[-1][1], 3) if bounds_seconds else 0.0,
+        "text": _merged_text(results, segments, words),
+        "segments": segments,
+        "chunks": n,
+    }
+    if words:
+        merged["words"] = words
+    return merged
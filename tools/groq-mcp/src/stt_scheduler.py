@@ -0,0 +1,352 @@
+"""
+Rate-limit-aware request scheduling for Groq speech-to-text calls
+
+Every upload goes through one process-wide RequestScheduler which:
+
+- follows the account's real quota from the headers on every response:
+  once x-ratelimit-remaining-requests drops below a tenth of
+  x-ratelimit-limit-requests, requests are spaced so the remainder lasts
+  until x-ratelimit-reset-requests, and all traffic pauses when a limit is
+  exhausted or a 429 carries retry-after,
+- optionally meters requests per minute and audio seconds per hour with
+  token buckets, for keys shared with other clients that the headers of
+  this process do not see,
+- retries 429, 5xx and transport errors with jittered exponential backoff
+  (transcription requests have no side effects, so resending is safe),
+- serves waiters in priority order so interactive requests overtake batch
+  backfills.
+
+Configuration:
+    GROQ_RATE_RPM                requests per minute (default 0 = unmetered)
+    GROQ_RATE_AUDIO_SECONDS      audio seconds per hour (default 0 = unmetered)
+    GROQ_MAX_RETRIES             retries after the first attempt (default 4)
+    GROQ_RETRY_BASE_DELAY        first backoff step in seconds (default 0.5)
+    GROQ_RETRY_MAX_DELAY         backoff ceiling in seconds (default 30)
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+import heapq
+import random
+import itertools
+import threading
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+# How often waiters that are not at the head of the queue re-check it from
+# the event loop (sync waiters are woken by the condition variable instead).
+ASYNC_POLL_SECONDS = 0.05
+
+# Requests are spaced out once fewer than this share of the request limit is
+# left in the current window.
+PACE_BELOW = 0.1
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit reset header into seconds.
+
+    Accepts plain seconds ("7.5") and Go-style durations ("2m59.56s", "120ms").
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in _DURATION_PART.findall(value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, per_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds if capacity else 0.0
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` can be taken (0 when it can be taken now)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        # A single request larger than the bucket may borrow against the
+        # future rather than waiting forever.
+        need = min(cost, self.capacity)
+        if self.tokens >= need:
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+    def take(self, cost: float) -> None:
+        if not self.unlimited:
+            self.tokens -= cost
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        audio_seconds_per_hour: float = 0,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute, 60.0)
+        self.audio = TokenBucket(audio_seconds_per_hour, 3600.0)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.blocked_until = 0.0
+        self.pace_interval = 0.0
+        self.next_slot = 0.0
+        self.retries = 0
+        self.throttled = 0
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+
+    # -- admission -------------------------------------------------------
+
+    def _try_take(self, audio_seconds: float) -> float:
+        now = time.monotonic()
+        wait = max(
+            self.blocked_until - now,
+            self.next_slot - now,
+            self.requests.wait_time(1, now),
+            self.audio.wait_time(audio_seconds, now),
+        )
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.audio.take(audio_seconds)
+        self.next_slot = now + self.pace_interval
+        return 0.0
+
+    def _leave(self, ticket: tuple[int, int]) -> None:
+        try:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+        except ValueError:
+            pass
+        self._cond.notify_all()
+
+    def acquire(self, audio_seconds: float = 0.0, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """Block until a request costing `audio_seconds` may be sent."""
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] == ticket:
+                        wait = self._try_take(audio_seconds)
+                        if wait <= 0:
+                            return
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._leave(ticket)
+
+    async def acquire_async(self, audio_seconds: float = 0.0, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """Event-loop friendly acquire sharing the same queue as acquire()."""
+        import asyncio
+
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+        try:
+            while True:
+                with self._cond:
+                    if self._waiters[0] == ticket:
+                        wait = self._try_take(audio_seconds)
+                        if wait <= 0:
+                            return
+                    else:
+                        wait = ASYNC_POLL_SECONDS
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            with self._cond:
+                self._leave(ticket)
+
+    # -- feedback from responses -----------------------------------------
+
+    def observe(self, response: httpx.Response) -> None:
+        """Pace or pause traffic according to the rate-limit headers of a response."""
+        headers = response.headers
+        pause = 0.0
+        self._pace(headers)
+
+        retry_after = parse_reset(headers.get("retry-after"))
+        if response.status_code == 429 and retry_after is not None:
+            pause = max(pause, retry_after)
+
+        for kind in ("requests", "tokens", "audio-seconds"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                continue
+            if exhausted:
+                reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+                pause = max(pause, reset if reset is not None else 1.0)
+
+        if pause > 0:
+            with self._cond:
+                self.throttled += 1
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+                self._cond.notify_all()
+
+    def _pace(self, headers) -> None:
+        """Spread the requests left in the window evenly once they run low."""
+        try:
+            limit = float(headers["x-ratelimit-limit-requests"])
+            remaining = float(headers["x-ratelimit-remaining-requests"])
+        except (KeyError, ValueError):
+            return
+        interval = 0.0
+        if 0 < remaining < limit * PACE_BELOW:
+            reset = parse_reset(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                interval = reset / remaining
+        with self._cond:
+            self.pace_interval = interval
+            if not interval:
+                self.next_slot = 0.0
+            self._cond.notify_all()
+
+    def backoff(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Delay before retry number `attempt` (0-based): retry-after or full-jitter backoff."""
+        if response is not None:
+            retry_after = parse_reset(response.headers.get("retry-after"))
+            if retry_after is not None:
+                return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    # -- request execution -----------------------------------------------
+
+    def call(
+        self,
+        send: Callable[[], httpx.Response],
+        audio_seconds: float = 0.0,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> httpx.Response:
+        """
+        Run `send` under the rate limits, retrying retryable failures.
+
+        `send` must be safe to call repeatedly (e.g. reopen the upload).
+        The last response is returned even when it is still an error.
+        """
+        import httpx
+
+        for attempt in range(self.max_retries + 1):
+            self.acquire(audio_seconds, priority)
+            try:
+                response = send()
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                self._count_retry()
+                time.sleep(self.backoff(attempt))
+                continue
+            self.observe(response)
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return response
+            self._count_retry()
+            time.sleep(self.backoff(attempt, response))
+        return response
+
+    async def acall(
+        self,
+        send: Callable[[], Awaitable[httpx.Response]],
+        audio_seconds: float = 0.0,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> httpx.Response:
+        import asyncio
+        import httpx
+
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(audio_seconds, priority)
+            try:
+                response = await send()
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                self._count_retry()
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            self.observe(response)
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return response
+            self._count_retry()
+            await asyncio.sleep(self.backoff(attempt, response))
+        return response
+
+    def _count_retry(self) -> None:
+        with self._cond:
+            self.retries += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "waiting": len(self._waiters),
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "blocked_for_s": round(max(0.0, self.blocked_until - now), 3),
+                "pace_interval_s": round(self.pace_interval, 3),
+                "request_tokens": None if self.requests.unlimited else round(self.requests.tokens, 2),
+                "audio_seconds_tokens": None if self.audio.unlimited else round(self.audio.tokens, 1),
+            }
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def get_scheduler() -> RequestScheduler:
+    """Return the process-wide scheduler, configured from the environment."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler(
+                    requests_per_minute=_env_number("GROQ_RATE_RPM", 0),
+                    audio_seconds_per_hour=_env_number("GROQ_RATE_AUDIO_SECONDS", 0),
+                    max_retries=int(_env_number("GROQ_MAX_RETRIES", 4)),
+                    base_delay=_env_number("GROQ_RETRY_BASE_DELAY", 0.5),
+                    max_delay=_env_number("GROQ_RETRY_MAX_DELAY", 30.0),
+                )
+    return _scheduler
@@ -0,0 +1,466 @@
+"""
+Incremental transcription of audio that is still arriving
+
+Long dictations should show text while the user is still speaking or while
+the upload is still in flight. A StreamingTranscriber reads PCM audio (a WAV
+stream or raw 16-bit samples) from a pipe or socket as it arrives and, each
+time `step_seconds` of new audio has accumulated, transcribes the part that
+is not settled yet: the tail window after the last committed segment.
+
+Segments that end well before the edge of the window (more than
+`stable_seconds` earlier) will not change when more audio arrives, so they
+are committed and emitted once as "final" events and dropped from the
+window; the rest is emitted as a "partial" event that replaces the previous
+partial. Only the unstable tail is ever uploaded again, windows are capped at
+`window_seconds` (the oldest segments are committed when the cap is hit), and
+windows without speech are committed without a request. Committed text is
+sent as the prompt of the next window so the model keeps its context.
+
+Events are JSON objects, one per line:
+    {"event": "partial", "start": 12.0, "end": 15.4, "text": "and then we"}
+    {"event": "final", "segment": 3, "start": 9.1, "end": 12.0, "text": "..."}
+    {"event": "done", "text": "...", "duration": 15.4, "requests": 8, "first_text_ms": 2380.5}
+    {"event": "error", "error": "..."}
+
+Run from tools/groq-mcp (web.php can proc_open this and forward the lines):
+    arecord -f S16_LE -r 16000 -c 1 | python -m src.stt_stream --format pcm
+    python -m src.stt_stream --format wav < dictation.wav
+"""
+
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+from typing import BinaryIO, Callable, Optional
+
+import numpy as np
+
+from src import groq_stt
+from src.audio_prep import TARGET_SAMPLERATE, StreamResampler, compact_samples
+from src.audio_source import AudioSource
+from src.stt_scheduler import PRIORITY_INTERACTIVE
+from src.utils import MCPError, make_error
+from src.vad import speech_spans
+
+DEFAULT_STEP_SECONDS = 2.0
+DEFAULT_WINDOW_SECONDS = 30.0
+DEFAULT_STABLE_SECONDS = 1.5
+
+# Tail windows shorter than this are not worth a request before EOF.
+MIN_WINDOW_SECONDS = 1.0
+# How much committed text is passed on as the prompt of the next window.
+PROMPT_CONTEXT_CHARS = 200
+# Bytes read from the input per call; about 0.25 s of 16 kHz 16-bit mono.
+READ_BYTES = 8192
+# How long run() waits for the reader after an error. A read blocked on an
+# input that sends nothing cannot be interrupted; the thread is a daemon and
+# ends when the caller closes the stream.
+READER_JOIN_SECONDS = 1.0
+
+# WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT and WAVE_FORMAT_EXTENSIBLE
+_WAV_PCM, _WAV_FLOAT, _WAV_EXTENSIBLE = 1, 3, 0xFFFE
+
+Emit = Callable[[dict], None]
+
+
+def _read_exact(stream: BinaryIO, n: int) -> bytes:
+    data = b""
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            raise EOFError("stream ended inside the WAV header")
+        data += chunk
+    return data
+
+
+def _check_layout(samplerate: int, channels: int) -> None:
+    if not isinstance(samplerate, int) or samplerate <= 0:
+        make_error(f"Invalid sample rate: {samplerate!r}")
+    if not isinstance(channels, int) or channels <= 0:
+        make_error(f"Invalid channel count: {channels!r}")
+
+
+def read_wav_header(stream: BinaryIO) -> tuple[int, int, np.dtype]:
+    """
+    Consume a WAV header up to the start of the sample data.
+
+    Streaming recorders write placeholder sizes into the header, so chunk
+    sizes are only used to skip chunks before "data"; the samples are then
+    read until the stream ends.
+
+    Returns:
+        tuple: (sample rate, channels, numpy dtype of one sample)
+    """
+    riff = _read_exact(stream, 12)
+    if riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        make_error("Streaming input is not a WAV file")
+    fmt = None
+    while True:
+        chunk_id, size = struct.unpack("<4sI", _read_exact(stream, 8))
+        if chunk_id == b"data":
+            break
+        body = _read_exact(stream, size + (size & 1))
+        if chunk_id == b"fmt ":
+            fmt = body
+    if fmt is None:
+        make_error("WAV stream has no fmt chunk before its data")
+
+    audio_format, channels, samplerate = struct.unpack("<HHI", fmt[:8])
+    bits = struct.unpack("<H", fmt[14:16])[0]
+    _check_layout(samplerate, channels)
+    if audio_format == _WAV_EXTENSIBLE and len(fmt) >= 26:
+        audio_format = struct.unpack("<H", fmt[24:26])[0]
+    if audio_format == _WAV_PCM and bits == 16:
+        return samplerate, channels, np.dtype("<i2")
+    if audio_format == _WAV_FLOAT and bits == 32:
+        return samplerate, channels, np.dtype("<f4")
+    make_error(f"Streaming supports 16-bit PCM and 32-bit float WAV, not format {audio_format} with {bits} bits")
+
+
+class StreamingTranscriber:
+    """
+    Transcribe audio incrementally and report partial and final segments.
+
+    Audio is downmixed and resampled to 16 kHz mono on arrival; only the
+    uncommitted tail is kept in memory.
+    """
+
+    def __init__(
+        self,
+        emit: Emit,
+        model: str = "whisper-large-v3-turbo",
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        temperature: float = 0.0,
+        step_seconds: float = DEFAULT_STEP_SECONDS,
+        window_seconds: float = DEFAULT_WINDOW_SECONDS,
+        stable_seconds: float = DEFAULT_STABLE_SECONDS,
+        priority: int = PRIORITY_INTERACTIVE,
+    ):
+        if model not in groq_stt.STT_MODELS:
+            make_error(f"Model '{model}' not found. Available models are: {', '.join(groq_stt.STT_MODELS)}")
+        if temperature < 0.0 or temperature > 1.0:
+            make_error("Temperature must be between 0.0 and 1.0")
+        if not 0 < stable_seconds < window_seconds or step_seconds <= 0:
+            make_error("Need step_seconds > 0 and 0 < stable_seconds < window_seconds")
+
+        self.emit = emit
+        self.prompt = prompt
+        self.step = int(step_seconds * TARGET_SAMPLERATE)
+        self.window = int(window_seconds * TARGET_SAMPLERATE)
+        self.stable = int(stable_seconds * TARGET_SAMPLERATE)
+        self.priority = priority
+        self.data = {"model": model, "response_format": "verbose_json", "temperature": str(temperature)}
+        if language:
+            self.data["language"] = language
+
+        # Audio after the last committed segment; self.committed is the
+        # timeline position (in samples) of its first sample.
+        self._blocks: list[np.ndarray] = []
+        self._received = 0
+        self._decoded = 0
+        self._eof = False
+        self._stop = threading.Event()
+        self._read_error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+        self.committed = 0
+        self.segments: list[dict] = []
+        self.requests = 0
+        self._partial = None
+        self._started = 0.0
+        self.first_text_ms: Optional[float] = None
+
+    # -- input -------------------------------------------------------------
+
+    def _reader(self, stream: BinaryIO, fmt: str, samplerate: int, channels: int, length: Optional[int]):
+        try:
+            stream = _Limited(stream, length)
+            if fmt == "wav":
+                samplerate, channels, dtype = read_wav_header(stream)
+            else:
+                dtype = np.dtype("<i2")
+            resampler = StreamResampler(samplerate, TARGET_SAMPLERATE)
+            frame_bytes = dtype.itemsize * channels
+            scale = 1 / 32768 if dtype.kind == "i" else 1.0
+            leftover = b""
+            while not self._stop.is_set():
+                chunk = stream.read1(READ_BYTES)
+                if not chunk:
+                    break
+                chunk = leftover + chunk
+                usable = len(chunk) - len(chunk) % frame_bytes
+                leftover = chunk[usable:]
+                if not usable:
+                    continue
+                frames = np.frombuffer(chunk[:usable], dtype=dtype).reshape(-1, channels)
+                mono = frames.mean(axis=1, dtype=np.float32) * np.float32(scale)
+                block = resampler.process(mono)
+                with self._cond:
+                    self._blocks.append(block)
+                    self._received += len(block)
+                    self._cond.notify()
+        except BaseException as e:
+            self._read_error = e
+        finally:
+            with self._cond:
+                self._eof = True
+                self._cond.notify()
+
+    def _take_window(self) -> tuple[np.ndarray, bool]:
+        """Wait until a step of new audio (or the end) arrived; return the uncommitted audio."""
+        with self._cond:
+            while not self._eof and self._received - self._decoded < self.step:
+                self._cond.wait()
+            self._decoded = self._received
+            return self._uncommitted(), self._eof
+
+    def _uncommitted(self) -> np.ndarray:
+        with self._cond:
+            if len(self._blocks) > 1:
+                self._blocks = [np.concatenate(self._blocks)]
+            return self._blocks[0] if self._blocks else np.zeros(0, np.float32)
+
+    def _commit(self, samples: int) -> None:
+        window = self._uncommitted()
+        with self._cond:
+            self._blocks = [window[samples:]] if samples < len(window) else []
+        self.committed += samples
+
+    # -- transcription -----------------------------------------------------
+
+    def _context_prompt(self) -> Optional[str]:
+        context = " ".join(seg["text"] for seg in self.segments)[-PROMPT_CONTEXT_CHARS:].strip()
+        return " ".join(part for part in (self.prompt, context) if part) or None
+
+    def _transcribe(self, window: np.ndarray) -> list[dict]:
+        content, suffix, mime_type = compact_samples(window, TARGET_SAMPLERATE)
+        data = dict(self.data)
+        prompt = self._context_prompt()
+        if prompt:
+            data["prompt"] = prompt
+        with AudioSource.from_bytes(content, f"stream{suffix}", mime_type) as source:
+            # Every window differs, so caching would only fill the cache.
+            response = groq_stt._post_audio(
+                "/audio/transcriptions", source, data, use_cache=False,
+                preprocess=False, trim_silence=False, priority=self.priority,
+            )
+        self.requests += 1
+        groq_stt._raise_for_groq_error(response)
+        payload = response.json()
+        segments = payload.get("segments")
+        if segments is None:
+            text = payload.get("text", "").strip()
+            segments = [{"start": 0.0, "end": len(window) / TARGET_SAMPLERATE, "text": text}] if text else []
+        return [seg for seg in segments if seg.get("text", "").strip()]
+
+    def _emit_text(self, event: dict) -> None:
+        if self.first_text_ms is None and event.get("text"):
+            self.first_text_ms = round((time.monotonic() - self._started) * 1000, 1)
+        self.emit(event)
+
+    def _step(self, window: np.ndarray, final: bool) -> None:
+        offset = self.committed / TARGET_SAMPLERATE
+        if not final and len(window) < MIN_WINDOW_SECONDS * TARGET_SAMPLERATE:
+            return
+        if not speech_spans(window, TARGET_SAMPLERATE):
+            # Keep the last stable_seconds: speech may be starting right there.
+            keep = 0 if final else self.stable
+            self._commit(max(0, len(window) - keep))
+            self._set_partial(None)
+            return
+
+        segments = self._transcribe(window)
+        horizon = (len(window) - self.stable) / TARGET_SAMPLERATE
+        if final:
+            settled, unsettled = segments, []
+        else:
+            # The last segment can always still grow; earlier ones are kept
+            # once they end before the unstable edge of the window.
+            count = 0
+            while count < len(segments) - 1 and float(segments[count]["end"]) <= horizon:
+                count += 1
+            if count == 0 and len(window) >= self.window:
+                count = max(1, len(segments) - 1)
+            settled, unsettled = segments[:count], segments[count:]
+
+        for seg in settled:
+            event = {
+                "event": "final",
+                "segment": len(self.segments),
+                "start": round(offset + float(seg["start"]), 3),
+                "end": round(offset + float(seg["end"]), 3),
+                "text": seg["text"].strip(),
+            }
+            self.segments.append(event)
+            self._emit_text(event)
+        if final:
+            self._commit(len(window))
+        elif settled:
+            end = int(float(settled[-1]["end"]) * TARGET_SAMPLERATE)
+            self._commit(min(max(end, 1), len(window)))
+        elif not segments and len(window) >= self.window:
+            self._commit(len(window) - self.stable)
+
+        if unsettled:
+            start = offset + float(unsettled[0]["start"])
+            self._set_partial({
+                "event": "partial",
+                "start": round(start, 3),
+                "end": round(offset + float(unsettled[-1]["end"]), 3),
+                "text": " ".join(seg["text"].strip() for seg in unsettled),
+            })
+        else:
+            self._set_partial(None)
+
+    def _set_partial(self, event: Optional[dict]) -> None:
+        text = event["text"] if event else ""
+        previous = self._partial["text"] if self._partial else ""
+        if text == previous:
+            return
+        self._partial = event
+        # An empty partial tells the client to clear what it showed.
+        self._emit_text(event or {"event": "partial", "start": round(self.committed / TARGET_SAMPLERATE, 3), "end": None, "text": ""})
+
+    def run(
+        self,
+        stream: BinaryIO,
+        fmt: str = "wav",
+        samplerate: int = TARGET_SAMPLERATE,
+        channels: int = 1,
+        length: Optional[int] = None,
+    ) -> dict:
+        """
+        Transcribe `stream` until it ends, emitting events as text settles.
+
+        Args:
+            stream: Binary stream carrying a WAV file ("wav") or raw signed
+                16-bit little-endian samples ("pcm")
+            fmt: "wav" or "pcm"
+            samplerate: Sample rate of raw PCM input
+            channels: Channel count of raw PCM input
+            length: Read at most this many bytes, for framed sockets
+
+        Returns:
+            dict: The "done" event, which is also emitted
+        """
+        if fmt not in ("wav", "pcm"):
+            make_error(f"Unsupported streaming format: {fmt} (use wav or pcm)")
+        if fmt == "pcm":
+            _check_layout(samplerate, channels)
+        self._started = time.monotonic()
+        reader = threading.Thread(
+            target=self._reader, args=(stream, fmt, samplerate, channels, length), name="stt-stream-reader", daemon=True
+        )
+        reader.start()
+        try:
+            while True:
+                window, final = self._take_window()
+                if self._read_error is not None:
+                    if isinstance(self._read_error, MCPError):
+                        raise self._read_error
+                    make_error(f"Reading the audio stream failed: {self._read_error}")
+                # A backlog (the input arrived faster than it was transcribed)
+                # is worked off one full window at a time.
+                while len(window) > self.window:
+                    self._step(window[: self.window], False)
+                    window = self._uncommitted()
+                self._step(window, final)
+                if final:
+                    break
+        except BaseException:
+            # Stop buffering audio nobody will transcribe.
+            self._stop.set()
+            reader.join(READER_JOIN_SECONDS)
+            raise
+        reader.join()
+
+        done = {
+            "event": "done",
+            "text": " ".join(seg["text"] for seg in self.segments),
+            "segments": len(self.segments),
+            "duration": round(self._received / TARGET_SAMPLERATE, 3),
+            "requests": self.requests,
+            "first_text_ms": self.first_text_ms,
+            "elapsed_ms": round((time.monotonic() - self._started) * 1000, 1),
+        }
+        self.emit(done)
+        return done
+
+
+class _Limited:
+    """Reader over at most `limit` bytes of a stream that returns data as soon as some arrived."""
+
+    def __init__(self, stream: BinaryIO, limit: Optional[int]):
+        self.stream = stream
+        self.remaining = limit
+
+    def _want(self, n: int) -> int:
+        return n if self.remaining is None else min(n, self.remaining)
+
+    def _account(self, data: bytes) -> bytes:
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    def read(self, n: int) -> bytes:
+        n = self._want(n)
+        return self._account(self.stream.read(n)) if n > 0 else b""
+
+    def read1(self, n: int) -> bytes:
+        n = self._want(n)
+        if n <= 0:
+            return b""
+        read1 = getattr(self.stream, "read1", self.stream.read)
+        return self._account(read1(n))
+
+
+def transcribe_stream(
+    stream: BinaryIO,
+    emit: Emit,
+    fmt: str = "wav",
+    samplerate: int = TARGET_SAMPLERATE,
+    channels: int = 1,
+    length: Optional[int] = None,
+    **options,
+) -> dict:
+    """Convenience wrapper: build a StreamingTranscriber from `options` and run it on `stream`."""
+    return StreamingTranscriber(emit, **options).run(stream, fmt, samplerate, channels, length)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe audio from stdin incrementally, printing NDJSON events")
+    parser.add_argument("--format", choices=["wav", "pcm"], default="wav")
+    parser.add_argument("--rate", type=int, default=TARGET_SAMPLERATE, help="sample rate of raw PCM input")
+    parser.add_argument("--channels", type=int, default=1, help="channels of raw PCM input")
+    parser.add_argument("--model", default="whisper-large-v3-turbo")
+    parser.add_argument("--language")
+    parser.add_argument("--prompt")
+    parser.add_argument("--step-seconds", type=float, default=DEFAULT_STEP_SECONDS)
+    parser.add_argument("--window-seconds", type=float, default=DEFAULT_WINDOW_SECONDS)
+    parser.add_argument("--stable-seconds", type=float, default=DEFAULT_STABLE_SECONDS)
+    args = parser.parse_args(argv)
+
+    def emit(event: dict) -> None:
+        sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+    try:
+        transcribe_stream(
+            sys.stdin.buffer, emit, args.format, args.rate, args.channels,
+            model=args.model, language=args.language, prompt=args.prompt,
+            step_seconds=args.step_seconds, window_seconds=args.window_seconds,
+            stable_seconds=args.stable_seconds,
+        )
+    except MCPError as e:
+        emit({"event": "error", "error": str(e)})
+        return 1
+    finally:
+        groq_stt.close_clients()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
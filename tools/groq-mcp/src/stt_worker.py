@@ -0,0 +1,355 @@
+"""
+Groq Speech to Text Worker
+
+Long-lived worker that keeps the interpreter, the groq_stt imports and the
+Groq HTTP client warm between jobs. Callers (the PHP /transcribe routes)
+connect to a UNIX domain socket and send one JSON job per line; every job is
+answered with exactly one JSON line on the same connection, so a client may
+pipeline several jobs over a single connection.
+
+Request:
+    {"id": "abc", "action": "transcribe", "args": {"input_file_path": "/tmp/a.wav", "model": "..."}}
+    {"id": "abc", "action": "translate", "args": {...}}
+    {"id": "abc", "action": "transcribe_chunked", "args": {...}}
+    {"id": "abc", "action": "transcribe", "args": {"filename": "a.webm"}, "content_length": 48213}
+    <48213 raw audio bytes>
+    {"id": "abc", "action": "transcribe_stream", "args": {"format": "pcm", "samplerate": 48000}}
+    <raw audio bytes as they are recorded, then shutdown(SHUT_WR)>
+    {"id": "abc", "action": "ping"}
+    {"id": "abc", "action": "stats"}
+
+Response:
+    {"id": "abc", "ok": true, "text": "..."}
+    {"id": "abc", "ok": false, "error": "..."}
+
+`args` accepts the keyword arguments of the matching groq_stt function,
+except output_directory and save_to_file: jobs never write files, the caller
+consumes the text from the reply.
+
+Instead of input_file_path a job may announce "content_length" and send the
+audio itself as that many raw bytes right after the JSON line; "filename" in
+args names its format. The bytes are spooled (in memory, or an anonymous temp
+file when large) and uploaded from there, so the caller never has to write
+the upload to disk first.
+
+"transcribe_stream" is the exception to one reply per job: the audio follows
+the job line while it is still being recorded, either "content_length" bytes
+or everything until the client shuts down its sending side, and the worker
+answers with event lines ({"id": "abc", "event": "partial" | "final", ...},
+see stt_stream.py) as text settles, followed by the usual reply line.
+
+The worker reads the files jobs name with its own privileges, so the socket
+must only be reachable by the web server. It is created with mode 0660 in a
+directory that has to be owned by the worker's user and not writable by
+anyone else (default /run/ginto, created 0750 when missing).
+
+Run from tools/groq-mcp:
+    python -m src.stt_worker --socket /run/ginto/groq-stt.sock
+"""
+
+import os
+import sys
+import json
+import time
+import stat
+import signal
+import inspect
+import logging
+import argparse
+import socketserver
+from typing import Optional
+
+from src import groq_stt
+from src.audio_prep import PREP_STATS
+from src.audio_source import AudioSource
+from src.stt_cache import get_cache
+from src.stt_scheduler import get_scheduler
+from src.stt_stream import StreamingTranscriber
+from src.utils import MCPError
+
+DEFAULT_SOCKET_PATH = "/run/ginto/groq-stt.sock"
+
+# Applied while binding, so the socket is never connectable by others.
+SOCKET_UMASK = 0o117
+
+# Upper bound for a single request line; jobs only carry paths and options.
+MAX_JOB_BYTES = 64 * 1024
+
+# Upper bound for audio sent inline after a job line.
+MAX_CONTENT_BYTES = int(os.getenv("GROQ_STT_MAX_CONTENT_BYTES", 1024 * 1024 * 1024))
+
+logger = logging.getLogger("groq_stt_worker")
+
+ACTIONS = {
+    "transcribe": groq_stt.transcribe_audio,
+    "transcribe_chunked": groq_stt.transcribe_audio_chunked,
+    "translate": groq_stt.translate_audio,
+}
+
+# Only forward keyword arguments the target function actually accepts so a
+# malformed job cannot smuggle unexpected parameters in. Jobs may not write
+# files, so the output arguments are never accepted.
+OUTPUT_ARGS = {"output_directory", "save_to_file"}
+ALLOWED_ARGS = {
+    name: set(inspect.signature(func).parameters) - OUTPUT_ARGS for name, func in ACTIONS.items()
+}
+STREAM_INPUT_ARGS = {"format", "samplerate", "channels"}
+ALLOWED_ARGS["transcribe_stream"] = (
+    set(inspect.signature(StreamingTranscriber).parameters) - {"emit", "priority"}
+) | STREAM_INPUT_ARGS
+
+
+def run_job(job: dict, audio: Optional[AudioSource] = None) -> dict:
+    """
+    Execute a single decoded job and build its reply.
+
+    Args:
+        job: Decoded request object
+        audio: Audio sent inline after the job line, if any; always closed
+
+    Returns:
+        dict: Reply object, always carrying "ok" and echoing "id" when given
+    """
+    try:
+        return _run_job(job, audio)
+    finally:
+        if audio is not None:
+            audio.close()
+
+
+def _run_job(job: dict, audio: Optional[AudioSource]) -> dict:
+    reply = {"id": job.get("id")} if "id" in job else {}
+    action = job.get("action")
+
+    if action == "ping":
+        reply.update(ok=True, pid=os.getpid())
+        return reply
+
+    if action == "stats":
+        cache = get_cache()
+        reply.update(
+            ok=True,
+            cache=cache.stats() if cache is not None else None,
+            preprocess=dict(PREP_STATS),
+            scheduler=get_scheduler().stats(),
+        )
+        return reply
+
+    func = ACTIONS.get(action)
+    if func is None:
+        reply.update(ok=False, error=f"unknown action: {action}")
+        return reply
+
+    args = job.get("args") or {}
+    if not isinstance(args, dict):
+        reply.update(ok=False, error="args must be an object")
+        return reply
+    unknown = set(args) - ALLOWED_ARGS[action]
+    if unknown:
+        reply.update(ok=False, error=f"unsupported arguments: {', '.join(sorted(unknown))}")
+        return reply
+    args = dict(args)
+    if audio is not None:
+        if "input_file_path" in args:
+            reply.update(ok=False, error="input_file_path and inline audio are exclusive")
+            return reply
+        args["input_file_path"] = audio
+    elif "input_file_path" not in args:
+        reply.update(ok=False, error="missing input_file_path")
+        return reply
+
+    args["save_to_file"] = False
+
+    started = time.monotonic()
+    try:
+        result = func(**args)
+    except MCPError as e:
+        reply.update(ok=False, error=str(e))
+        return reply
+    except Exception as e:
+        logger.exception("Job %s failed", reply.get("id"))
+        reply.update(ok=False, error=f"internal error: {e}")
+        return reply
+
+    reply.update(ok=True, text=result.text, elapsed_ms=round((time.monotonic() - started) * 1000, 1))
+    return reply
+
+
+def warm_up():
+    """Import what groq_stt loads on first use, so the first job does not pay for it."""
+    import httpx  # noqa: F401
+    import mcp.types  # noqa: F401
+    import src.stt_chunking  # noqa: F401
+    import src.vad  # noqa: F401
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_JOB_BYTES + 1)
+            if not line:
+                return
+            if len(line) > MAX_JOB_BYTES:
+                self._send({"ok": False, "error": "request too large"})
+                return
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError("job must be an object")
+            except ValueError:
+                self._send({"ok": False, "error": "invalid json"})
+                continue
+            if job.get("action") == "transcribe_stream":
+                if not self._stream_job(job):
+                    return
+                continue
+            if "content_length" not in job:
+                self._send(run_job(job))
+                continue
+
+            length = job["content_length"]
+            if not isinstance(length, int) or not 0 < length <= MAX_CONTENT_BYTES:
+                # The framing is lost, so the connection cannot be reused.
+                self._send({"id": job.get("id"), "ok": False, "error": "invalid content_length"})
+                return
+            args = job.get("args") if isinstance(job.get("args"), dict) else {}
+            filename = args.get("filename") if isinstance(args.get("filename"), str) else "audio"
+            try:
+                audio = AudioSource.from_stream(self.rfile, os.path.basename(filename), length=length)
+            except (EOFError, OSError) as e:
+                logger.warning("Inline audio for job %s truncated: %s", job.get("id"), e)
+                return
+            self._send(run_job(job, audio))
+
+    def _stream_job(self, job: dict) -> bool:
+        """Run a transcribe_stream job; return whether the connection can take another job."""
+        reply = {"id": job.get("id")} if "id" in job else {}
+        length = job.get("content_length")
+        if length is not None and (not isinstance(length, int) or not 0 < length <= MAX_CONTENT_BYTES):
+            self._send({**reply, "ok": False, "error": "invalid content_length"})
+            return False
+        args = job.get("args") or {}
+        unknown = set(args) - ALLOWED_ARGS["transcribe_stream"] if isinstance(args, dict) else None
+        if unknown is None or unknown:
+            error = "args must be an object" if unknown is None else f"unsupported arguments: {', '.join(sorted(unknown))}"
+            self._send({**reply, "ok": False, "error": error})
+            return False
+        options = {key: value for key, value in args.items() if key not in STREAM_INPUT_ARGS}
+
+        def emit(event: dict) -> None:
+            if event.get("event") != "done":
+                self._send({**reply, **event})
+
+        started = time.monotonic()
+        try:
+            done = StreamingTranscriber(emit, **options).run(
+                self.rfile, args.get("format", "wav"), args.get("samplerate", 16000), args.get("channels", 1), length
+            )
+        except MCPError as e:
+            reply.update(ok=False, error=str(e))
+        except Exception as e:
+            logger.exception("Streaming job %s failed", reply.get("id"))
+            reply.update(ok=False, error=f"internal error: {e}")
+        else:
+            reply.update(
+                ok=True,
+                text=done["text"],
+                first_text_ms=done["first_text_ms"],
+                elapsed_ms=round((time.monotonic() - started) * 1000, 1),
+            )
+        self._send(reply)
+        # Without a length the audio ran to EOF, and after an error the rest
+        # of it may still be unread.
+        return length is not None and reply["ok"]
+
+    def _send(self, reply: dict):
+        self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class WorkerServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def prepare_socket_dir(socket_path: str) -> None:
+    """
+    Create the socket's directory if needed and check that it is private.
+
+    Raises:
+        MCPError: When the directory is not owned by this user, is writable
+            by others, or a non-socket file is in the way
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    try:
+        os.makedirs(directory, mode=0o750, exist_ok=True)
+    except OSError as e:
+        raise MCPError(f"Cannot create socket directory {directory}: {e}")
+    st = os.stat(directory)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise MCPError(
+            f"Socket directory {directory} must be owned by uid {os.getuid()} and not writable by others"
+        )
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise MCPError(f"{socket_path} exists and is not a socket")
+    os.unlink(socket_path)
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH):
+    prepare_socket_dir(socket_path)
+
+    warm_up()
+    umask = os.umask(SOCKET_UMASK)
+    try:
+        server = WorkerServer(socket_path, JobHandler)
+    finally:
+        os.umask(umask)
+    logger.info("groq_stt worker listening on %s (pid=%s)", socket_path, os.getpid())
+
+    def _stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        groq_stt.close_clients()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+        logger.info("groq_stt worker stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resident Groq speech-to-text worker")
+    parser.add_argument(
+        "--socket",
+        default=os.getenv("GROQ_STT_SOCKET", DEFAULT_SOCKET_PATH),
+        help="UNIX socket path to listen on (default: $GROQ_STT_SOCKET or %(default)s)",
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=args.log_level.upper(),
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    try:
+        serve(args.socket)
+    except MCPError as e:
+        logger.error("%s", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
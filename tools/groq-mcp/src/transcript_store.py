@@ -0,0 +1,350 @@
+"""
+SQLite transcript store with a full-text index
+
+Transcripts are appended to one SQLite database instead of loose
+timestamped files. Each row is keyed by the SHA-256 of the audio plus the
+request parameters that shape the result (task, model, language, prompt,
+temperature, response format and timestamp granularities), so storing the
+same request again replaces the old row rather than piling up copies.
+Segments and word timings are kept as JSON next to the text, and an FTS5
+index over the text and source name serves search.
+
+The database runs in WAL mode so readers never wait for a writer, lookups by
+hash go through the unique (audio_hash, params_key) index, and bulk loads
+(stt_batch) are buffered and written in batches, one transaction each.
+
+Configuration:
+    GROQ_STT_STORE             path of the database; when set, save_to_file
+                               results go here instead of loose files
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+from src.utils import MCPError, make_error
+
+DEFAULT_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    audio_hash TEXT NOT NULL,
+    params_key TEXT NOT NULL,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    language TEXT,
+    params TEXT NOT NULL,
+    source_name TEXT,
+    text TEXT NOT NULL,
+    segments TEXT,
+    words TEXT,
+    duration REAL,
+    elapsed_ms REAL,
+    created_at REAL NOT NULL,
+    UNIQUE (audio_hash, params_key)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_fts USING fts5(
+    text, source_name,
+    content='transcripts', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS transcripts_ai AFTER INSERT ON transcripts BEGIN
+    INSERT INTO transcripts_fts (rowid, text, source_name) VALUES (new.id, new.text, new.source_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS transcripts_ad AFTER DELETE ON transcripts BEGIN
+    INSERT INTO transcripts_fts (transcripts_fts, rowid, text, source_name)
+    VALUES ('delete', old.id, old.text, old.source_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS transcripts_au AFTER UPDATE ON transcripts BEGIN
+    INSERT INTO transcripts_fts (transcripts_fts, rowid, text, source_name)
+    VALUES ('delete', old.id, old.text, old.source_name);
+    INSERT INTO transcripts_fts (rowid, text, source_name) VALUES (new.id, new.text, new.source_name);
+END;
+"""
+
+_COLUMNS = (
+    "audio_hash", "params_key", "task", "model", "language", "params", "source_name",
+    "text", "segments", "words", "duration", "elapsed_ms", "created_at",
+)
+
+_UPSERT = (
+    f"INSERT INTO transcripts ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)}) "
+    "ON CONFLICT (audio_hash, params_key) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in _COLUMNS[2:])
+)
+
+_SELECT = "SELECT id, " + ", ".join(_COLUMNS) + " FROM transcripts"
+
+
+def make_params_key(task: str, params: dict) -> str:
+    """Digest of the request parameters that identify a transcript of one audio file."""
+    material = json.dumps({"task": task, "params": params}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def make_record(
+    audio_hash: str,
+    task: str,
+    params: dict,
+    result,
+    source_name: Optional[str] = None,
+    elapsed_ms: Optional[float] = None,
+) -> dict:
+    """
+    Build a store record from a Groq result.
+
+    Args:
+        audio_hash: SHA-256 of the audio
+        task: "transcribe" or "translate"
+        params: Form fields sent with the request (must include "model")
+        result: The decoded JSON payload, or the plain text for response_format="text"
+        source_name: Name of the uploaded file
+        elapsed_ms: How long the request took
+    """
+    payload = result if isinstance(result, dict) else {"text": str(result)}
+    return {
+        "audio_hash": audio_hash,
+        "params_key": make_params_key(task, params),
+        "task": task,
+        "model": params.get("model", ""),
+        "language": payload.get("language") or params.get("language"),
+        "params": json.dumps(params, sort_keys=True),
+        "source_name": source_name,
+        "text": payload.get("text", ""),
+        "segments": json.dumps(payload["segments"]) if payload.get("segments") else None,
+        "words": json.dumps(payload["words"]) if payload.get("words") else None,
+        "duration": payload.get("duration"),
+        "elapsed_ms": elapsed_ms,
+        "created_at": time.time(),
+    }
+
+
+def _row_to_dict(row: sqlite3.Row) -> dict:
+    record = dict(row)
+    for key in ("params", "segments", "words"):
+        if record.get(key):
+            record[key] = json.loads(record[key])
+    return record
+
+
+class TranscriptStore:
+    def __init__(self, path: Path, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = Path(path)
+        self.batch_size = max(1, batch_size)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the worker's threads, serialized by a lock.
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._pending: list[tuple] = []
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._conn.close()
+            if "fts5" in str(e).lower():
+                make_error("The transcript store needs SQLite with FTS5 support")
+            raise
+
+    # -- writing -----------------------------------------------------------
+
+    def add(self, record: dict) -> None:
+        """Queue a record; it is written with the next batch or on flush()."""
+        with self._lock:
+            self._pending.append(tuple(record.get(column) for column in _COLUMNS))
+            if len(self._pending) >= self.batch_size:
+                self._write_pending()
+
+    def add_many(self, records: Iterable[dict]) -> int:
+        """Write records in batches of batch_size, one transaction per batch."""
+        count = 0
+        for record in records:
+            self.add(record)
+            count += 1
+        self.flush()
+        return count
+
+    def put(self, record: dict) -> int:
+        """Write one record immediately and return its row id."""
+        with self._lock:
+            self._write_pending()
+            row = tuple(record.get(column) for column in _COLUMNS)
+            self._conn.execute(_UPSERT, row)
+            found = self._conn.execute(
+                "SELECT id FROM transcripts WHERE audio_hash = ? AND params_key = ?",
+                (record["audio_hash"], record["params_key"]),
+            ).fetchone()
+            return found["id"]
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write_pending()
+
+    @property
+    def pending(self) -> int:
+        """Records queued by add() and not yet committed."""
+        with self._lock:
+            return len(self._pending)
+
+    def _write_pending(self) -> None:
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(_UPSERT, rows)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            # Keep them for the next attempt rather than dropping the batch.
+            self._pending[:0] = rows
+            raise
+        self._conn.execute("COMMIT")
+
+    # -- reading -----------------------------------------------------------
+
+    def get(self, audio_hash: str, task: str, params: dict) -> Optional[dict]:
+        """Return the transcript for exactly this audio and request, if stored."""
+        with self._lock:
+            row = self._conn.execute(
+                _SELECT + " WHERE audio_hash = ? AND params_key = ?",
+                (audio_hash, make_params_key(task, params)),
+            ).fetchone()
+        return _row_to_dict(row) if row is not None else None
+
+    def lookup(self, audio_hash: str, model: Optional[str] = None) -> list[dict]:
+        """Return every stored transcript of an audio file, newest first."""
+        query = _SELECT + " WHERE audio_hash = ?"
+        args: list = [audio_hash]
+        if model:
+            query += " AND model = ?"
+            args.append(model)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created_at DESC", args).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def search(self, query: str, limit: int = 20, model: Optional[str] = None) -> list[dict]:
+        """
+        Full-text search over transcript text and source names.
+
+        Args:
+            query: FTS5 query, e.g. 'invoice NEAR/5 overdue' or '"exact phrase"'
+            limit: Maximum number of hits
+            model: Only return transcripts made with this model
+
+        Returns:
+            list: Hits, best match first, each with "id", "audio_hash",
+            "source_name", "model", "created_at", "rank" and a "snippet"
+            with matches wrapped in [ ]
+        """
+        sql = (
+            "SELECT t.id, t.audio_hash, t.source_name, t.model, t.task, t.created_at, "
+            "bm25(transcripts_fts) AS rank, "
+            "snippet(transcripts_fts, 0, '[', ']', '...', 16) AS snippet "
+            "FROM transcripts_fts JOIN transcripts t ON t.id = transcripts_fts.rowid "
+            "WHERE transcripts_fts MATCH ?"
+        )
+        args: list = [query]
+        if model:
+            sql += " AND t.model = ?"
+            args.append(model)
+        sql += " ORDER BY rank LIMIT ?"
+        args.append(limit)
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, args).fetchall()
+        except sqlite3.OperationalError as e:
+            make_error(f"Invalid transcript search query ({query}): {e}")
+        return [dict(row) for row in rows]
+
+    def get_by_id(self, transcript_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(_SELECT + " WHERE id = ?", (transcript_id,)).fetchone()
+        return _row_to_dict(row) if row is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self._conn.execute("SELECT count(*) FROM transcripts").fetchone()[0]
+            pending = len(self._pending)
+        return {"path": str(self.path), "transcripts": count, "pending": pending}
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_pending()
+            self._conn.close()
+
+    def __enter__(self) -> "TranscriptStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_store: Optional[TranscriptStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[TranscriptStore]:
+    """Return the process-wide store configured by GROQ_STT_STORE, or None when unset."""
+    global _store
+    path = os.getenv("GROQ_STT_STORE")
+    if not path:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TranscriptStore(Path(os.path.expanduser(path)))
+    return _store
+
+
+def main(argv=None):
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the transcript store")
+    parser.add_argument("--db", default=os.getenv("GROQ_STT_STORE"), help="database (default: $GROQ_STT_STORE)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    search = sub.add_parser("search", help="full-text search")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--model")
+    lookup = sub.add_parser("lookup", help="transcripts of an audio file (by hash or path)")
+    lookup.add_argument("audio", help="SHA-256 of the audio, or a path to hash")
+    lookup.add_argument("--model")
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    if not args.db:
+        parser.error("no database: pass --db or set GROQ_STT_STORE")
+    with TranscriptStore(Path(os.path.expanduser(args.db))) as store:
+        if args.command == "search":
+            try:
+                result = store.search(args.query, args.limit, args.model)
+            except MCPError as e:
+                parser.exit(1, f"{e}\n")
+        elif args.command == "lookup":
+            audio_hash = args.audio
+            if os.path.isfile(audio_hash):
+                from src.stt_cache import hash_file
+
+                audio_hash = hash_file(Path(audio_hash))
+            result = store.lookup(audio_hash, args.model)
+        else:
+            result = store.stats()
+    json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,87 @@
 # Borrowed from https://github.com/elevenlabs/elevenlabs-mcp
 
+# Heavy dependencies (rapidfuzz, soundfile, sounddevice and mcp.types, which
+# alone takes about a second to import) are imported where they are used, so
+# importing this module stays cheap for callers that only transcribe.
+
+from __future__ import annotations
+
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-from rapidfuzz import fuzz
-import soundfile as sf
-import sounddevice as sd
-from mcp.types import TextContent
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from mcp.types import TextContent
 
 class MCPError(Exception):
     pass
 
-def play_audio(file_path: str) -> TextContent:
+def make_text_content(text: str) -> TextContent:
+    """Build an MCP text result, importing mcp.types on first use."""
+    from mcp.types import TextContent
+
+    return TextContent(type="text", text=text)
+
+_playback = None
+_playback_lock = threading.Lock()
+
+
+def play_audio(file_path: str, blocking: bool = True, device: Optional[str] = None) -> TextContent:
     """
     Play an audio file using sounddevice and soundfile.
-    
+
+    The file is streamed block by block (see audio_playback), so playback
+    starts immediately and memory use does not depend on its length. A new
+    call stops whatever is still playing.
+
     Args:
         file_path: Path to the audio file to play
-        
+        blocking: Wait until playback is finished; otherwise return at once
+            and let stop_audio() cancel it
+        device: sounddevice output device, or "null" to play headless
+
     Returns:
         TextContent with success message
     """
+    global _playback
+
     # Validate and get the file path
     path = handle_input_file(file_path, audio_content_check=True)
-    
+
+    from src.audio_playback import Playback
+
+    with _playback_lock:
+        if _playback is not None:
+            _playback.stop()
+        try:
+            _playback = playback = Playback(path, device=device).start()
+        except Exception as e:
+            _playback = None
+            make_error(f"Error playing audio file: {str(e)}")
+
+    if not blocking:
+        return make_text_content(f"Playing audio file: {path} ({playback.duration:.1f}s)")
     try:
-        # Read the audio file
-        data, samplerate = sf.read(path)
-        
-        # Play the audio (this will block until playback is finished)
-        sd.play(data, samplerate)
-        sd.wait()  # Wait until playback is finished
-        
-        return TextContent(
-            type="text",
-            text=f"Successfully played audio file: {path}"
-        )
-    except Exception as e:
-        make_error(f"Error playing audio file: {str(e)}")
+        playback.wait()
+    except KeyboardInterrupt:
+        playback.stop()
+        raise
+    if playback.error is not None:
+        make_error(f"Error playing audio file: {str(playback.error)}")
+    return make_text_content(f"Successfully played audio file: {path}")
+
+
+def stop_audio() -> TextContent:
+    """Stop the playback started by play_audio, if any."""
+    with _playback_lock:
+        playback = _playback
+        if playback is None or not playback.active:
+            return make_text_content("No audio is playing")
+        playback.stop()
+    return make_text_content(f"Stopped audio file: {playback.path} at {playback.position:.1f}s")
 
 
 def make_error(error_text: str):
@@ -93,86 +137,176 @@ def make_output_path(
     return output_path
 
 
+AUDIO_EXTENSIONS = frozenset({
+    ".wav",
+    ".mp3",
+    ".m4a",
+    ".aac",
+    ".ogg",
+    ".webm",
+    ".flac",
+    ".mp4",
+    ".avi",
+    ".mov",
+    ".wmv",
+})
+
+IMAGE_EXTENSIONS = frozenset({
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".gif",
+    ".bmp",
+    ".tiff",
+    ".webp",
+})
+
+# How many directory levels below the missing file's parent are searched for
+# suggestions, and how many directory indexes are kept in memory.
+SIMILAR_FILES_MAX_DEPTH = 2
+DIRECTORY_INDEX_CACHE_SIZE = 32
+
+
+def _file_kind(name: str) -> Optional[str]:
+    suffix = os.path.splitext(name)[1].lower()
+    if suffix in AUDIO_EXTENSIONS:
+        return "audio"
+    if suffix in IMAGE_EXTENSIONS:
+        return "image"
+    return None
+
+
+class DirectoryIndex:
+    """
+    Audio and image file names under a directory, down to `max_depth` levels.
+
+    The mtime of every scanned directory is recorded; adding, removing or
+    renaming an entry changes its directory's mtime, so comparing them is
+    enough to tell whether the index is still current without rescanning.
+    """
+
+    def __init__(self, root: str, max_depth: int = SIMILAR_FILES_MAX_DEPTH):
+        self.root = root
+        self.max_depth = max_depth
+        self.dir_mtimes: dict[str, int] = {}
+        # kind -> (file names, full paths), kept as parallel lists so names
+        # can be handed to rapidfuzz as one batch.
+        self.files: dict[str, tuple[list[str], list[str]]] = {"audio": ([], []), "image": ([], [])}
+        self._scan()
+
+    def _scan(self) -> None:
+        stack = [(self.root, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                self.dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if depth < self.max_depth:
+                                    stack.append((entry.path, depth + 1))
+                                continue
+                            kind = _file_kind(entry.name)
+                            if kind is not None and entry.is_file():
+                                names, paths = self.files[kind]
+                                names.append(entry.name)
+                                paths.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                # Unreadable or vanished while scanning; skip it.
+                continue
+
+    def is_current(self) -> bool:
+        for directory, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+_directory_indexes: "OrderedDict[tuple[str, int], DirectoryIndex]" = OrderedDict()
+_directory_index_lock = threading.Lock()
+
+
+def get_directory_index(directory: Path, max_depth: int = SIMILAR_FILES_MAX_DEPTH) -> DirectoryIndex:
+    """Return a current index of `directory`, reusing the cached one while it is still valid."""
+    key = (os.path.abspath(directory), max_depth)
+    with _directory_index_lock:
+        index = _directory_indexes.get(key)
+        if index is not None:
+            _directory_indexes.move_to_end(key)
+    if index is not None and index.is_current():
+        return index
+
+    # Scan outside the lock so one large directory does not block lookups
+    # of other directories.
+    index = DirectoryIndex(key[0], max_depth)
+    with _directory_index_lock:
+        _directory_indexes[key] = index
+        _directory_indexes.move_to_end(key)
+        while len(_directory_indexes) > DIRECTORY_INDEX_CACHE_SIZE:
+            _directory_indexes.popitem(last=False)
+    return index
+
+
 def find_similar_filenames(
-    target_file: str, directory: Path, threshold: int = 70
-) -> list[tuple[str, int]]:
+    target_file: str,
+    directory: Path,
+    threshold: int = 70,
+    kind: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> list[tuple[Path, float]]:
     """
     Find files with names similar to the target file using fuzzy matching.
 
     Args:
         target_file (str): The reference filename to compare against
-        directory (str): Directory to search in (defaults to current directory)
+        directory (str): Directory to search in, down to SIMILAR_FILES_MAX_DEPTH levels
         threshold (int): Similarity threshold (0 to 100, where 100 is identical)
+        kind (str): "audio" or "image" to only consider those files; both by default
+        limit (int): Return at most this many matches
 
     Returns:
-        list: List of similar filenames with their similarity scores
+        list: List of similar file paths with their similarity scores, best first
     """
+    from rapidfuzz import fuzz, process
+
     target_filename = os.path.basename(target_file)
+    index = get_directory_index(directory)
     similar_files = []
-    for root, _, files in os.walk(directory):
-        for filename in files:
-            if (
-                filename == target_filename
-                and os.path.join(root, filename) == target_file
-            ):
-                continue
-            similarity = fuzz.token_sort_ratio(target_filename, filename)
-
-            if similarity >= threshold:
-                file_path = Path(root) / filename
-                similar_files.append((file_path, similarity))
+    for file_kind in [kind] if kind else ["audio", "image"]:
+        names, paths = index.files[file_kind]
+        # One batched call; candidates below the cutoff are rejected inside
+        # rapidfuzz without building a result.
+        matches = process.extract(
+            target_filename, names, scorer=fuzz.token_sort_ratio, score_cutoff=threshold, limit=limit
+        )
+        similar_files.extend((Path(paths[position]), similarity) for _, similarity, position in matches)
 
     similar_files.sort(key=lambda x: x[1], reverse=True)
 
-    return similar_files
+    return similar_files[:limit] if limit else similar_files
 
 
 def try_find_similar_files(
     filename: str, directory: Path, take_n: int = 5, check_image: bool = False
 ) -> list[Path]:
-    similar_files = find_similar_filenames(filename, directory)
-    if not similar_files:
-        return []
-
-    filtered_files = []
-
-    for path, _ in similar_files[:take_n]:
-        if check_image and check_image_file(path):
-            filtered_files.append(path)
-        elif not check_image and check_audio_file(path):
-            filtered_files.append(path)
-
-    return filtered_files
+    similar_files = find_similar_filenames(
+        filename, directory, kind="image" if check_image else "audio", limit=take_n
+    )
+    return [path for path, _ in similar_files]
 
 
 def check_audio_file(path: Path) -> bool:
-    audio_extensions = {
-        ".wav",
-        ".mp3",
-        ".m4a",
-        ".aac",
-        ".ogg",
-        ".webm",
-        ".flac",
-        ".mp4",
-        ".avi",
-        ".mov",
-        ".wmv",
-    }
-    return path.suffix.lower() in audio_extensions
+    return path.suffix.lower() in AUDIO_EXTENSIONS
 
 
 def check_image_file(path: Path) -> bool:
-    image_extensions = {
-        ".jpg",
-        ".jpeg",
-        ".png",
-        ".gif",
-        ".bmp",
-        ".tiff",
-        ".webp",
-    }
-    return path.suffix.lower() in image_extensions
+    return path.suffix.lower() in IMAGE_EXTENSIONS
 
 
 def handle_input_file(file_path: str, audio_content_check: bool = False, image_content_check: bool = False) -> Path:
@@ -184,7 +318,7 @@ def handle_input_file(file_path: str, audio_content_check: bool = False, image_c
     if not path.exists() and path.parent.exists():
         parent_directory = path.parent
         similar_files = try_find_similar_files(path.name, parent_directory)
-        similapir_files_formatted = ",".join([str(file) for file in similar_files])
+        similar_files_formatted = ",".join([str(file) for file in similar_files])
         if similar_files:
             make_error(
                 f"File ({path}) does not exist. Did you mean any of these files: {similar_files_formatted}?"
@@ -0,0 +1,187 @@
+"""
+Energy-based voice activity detection and silence trimming
+
+Groq bills by audio duration and latency grows with it, so leading, trailing
+and long internal silences are cut out before upload. Detection is a
+vectorized pass over fixed-size frames: frames whose energy rises clearly
+above the estimated noise floor count as speech, short pauses are kept so
+words are not glued together, and every kept span is padded a little.
+
+Trimming returns an OffsetMap that translates timestamps on the trimmed
+timeline back onto the original recording, so verbose_json segment and word
+times still point at the right place in the user's file.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+FRAME_SECONDS = 0.03
+# Speech must exceed the noise floor by this much...
+NOISE_MARGIN_DB = 12.0
+# ...and be within this range of the loudest frame.
+DYNAMIC_RANGE_DB = 45.0
+# Absolute floor for digital silence.
+MIN_ENERGY_DB = -70.0
+
+
+class OffsetMap:
+    """
+    Piecewise-linear map from the trimmed timeline to the original one.
+
+    Each kept span starts at trimmed_starts[i] on the trimmed timeline and at
+    original_starts[i] on the original timeline.
+    """
+
+    def __init__(self, trimmed_starts: np.ndarray, original_starts: np.ndarray):
+        self.trimmed_starts = np.asarray(trimmed_starts, dtype=np.float64)
+        self.original_starts = np.asarray(original_starts, dtype=np.float64)
+
+    def to_original(self, t, is_end: bool = False):
+        """
+        Map a time (or array of times) in seconds onto the original timeline.
+
+        A time exactly on a span boundary belongs to the following span, or
+        to the preceding one when `is_end` is set (end timestamps).
+        """
+        t = np.asarray(t, dtype=np.float64)
+        side = "left" if is_end else "right"
+        idx = np.clip(np.searchsorted(self.trimmed_starts, t, side=side) - 1, 0, None)
+        return self.original_starts[idx] + (t - self.trimmed_starts[idx])
+
+
+class TrimResult(NamedTuple):
+    samples: np.ndarray
+    offset_map: OffsetMap
+    original_seconds: float
+    kept_seconds: float
+
+    @property
+    def seconds_removed(self) -> float:
+        return self.original_seconds - self.kept_seconds
+
+
+def frame_size(samplerate: int) -> int:
+    return max(1, int(samplerate * FRAME_SECONDS))
+
+
+def frame_energy_db(samples: np.ndarray, frame: int) -> np.ndarray:
+    """Energy in dB of each whole `frame`-sample frame of a mono signal; a partial tail is ignored."""
+    n_frames = len(samples) // frame
+    frames = samples[: n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    return 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame + 1e-12)
+
+
+def speech_spans(
+    samples: np.ndarray,
+    samplerate: int,
+    min_silence: float = 0.6,
+    padding: float = 0.2,
+) -> list[tuple[int, int]]:
+    """
+    Find speech in a mono signal.
+
+    Args:
+        samples: Mono float samples
+        samplerate: Sample rate of `samples`
+        min_silence: Pauses shorter than this many seconds are kept
+        padding: Seconds of context kept around every speech span
+
+    Returns:
+        list: (start, end) sample indices of the spans to keep
+    """
+    frame = frame_size(samplerate)
+    return spans_from_energy(frame_energy_db(samples, frame), frame, len(samples), min_silence, padding)
+
+
+def spans_from_energy(
+    energy_db: np.ndarray,
+    frame: int,
+    total: int,
+    min_silence: float = 0.6,
+    padding: float = 0.2,
+) -> list[tuple[int, int]]:
+    """
+    speech_spans() from per-frame energies, for callers that read the signal in blocks.
+
+    Args:
+        energy_db: frame_energy_db() of every whole frame, in order
+        frame: Frame length in samples
+        total: Number of samples in the signal
+    """
+    n_frames = len(energy_db)
+    if n_frames == 0:
+        return [(0, total)] if total else []
+
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + NOISE_MARGIN_DB, energy_db.max() - DYNAMIC_RANGE_DB, MIN_ENERGY_DB)
+    speech = energy_db > threshold
+    if not speech.any():
+        return []
+
+    # Grow speech by the padding on both sides, then fill short pauses.
+    pad = int(round(padding / FRAME_SECONDS))
+    if pad:
+        speech = np.convolve(speech, np.ones(2 * pad + 1, dtype=bool), mode="same") > 0
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2]
+    gap_frames = int(round(min_silence / FRAME_SECONDS))
+    spans = [[starts[0], ends[0]]]
+    for start, end in zip(starts[1:], ends[1:]):
+        if start - spans[-1][1] < gap_frames:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+
+    return [(int(s) * frame, min(int(e) * frame, total) if e < n_frames else total) for s, e in spans]
+
+
+def trim_silence(
+    samples: np.ndarray,
+    samplerate: int,
+    min_silence: float = 0.6,
+    padding: float = 0.2,
+) -> TrimResult:
+    """Drop silent spans from a mono signal and return the kept audio with its offset map."""
+    spans = kept_spans(speech_spans(samples, samplerate, min_silence, padding), len(samples))
+    kept = np.concatenate([samples[start:end] for start, end in spans])
+    return TrimResult(
+        kept,
+        offset_map_for(spans, samplerate),
+        len(samples) / samplerate,
+        len(kept) / samplerate,
+    )
+
+
+def kept_spans(spans: list[tuple[int, int]], total: int) -> list[tuple[int, int]]:
+    """The spans to upload: nothing that looks like speech keeps the whole signal."""
+    # Sending the audio untouched lets the API decide, rather than
+    # uploading an empty file.
+    return spans or [(0, total)]
+
+
+def offset_map_for(spans: list[tuple[int, int]], samplerate: int) -> OffsetMap:
+    """OffsetMap for audio made of `spans` (sample indices) laid end to end."""
+    lengths = np.array([end - start for start, end in spans])
+    trimmed_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) / samplerate
+    original_starts = np.array([start for start, _ in spans]) / samplerate
+    return OffsetMap(trimmed_starts, original_starts)
+
+
+def remap_verbose_json(data: dict, offset_map: OffsetMap) -> dict:
+    """Return a copy of a verbose_json payload with timestamps on the original timeline."""
+    data = dict(data)
+    for key in ("segments", "words"):
+        items = data.get(key)
+        if not items:
+            continue
+        remapped = []
+        for item in items:
+            item = dict(item)
+            for field in ("start", "end"):
+                if isinstance(item.get(field), (int, float)):
+                    item[field] = round(float(offset_map.to_original(item[field], field == "end")), 3)
+            remapped.append(item)
+        data[key] = remapped
+    return data
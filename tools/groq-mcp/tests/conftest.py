@@ -0,0 +1,49 @@
+"""
+Shared setup for the groq-mcp tests.
+
+The tests import the package the way the worker and the benches do
+(`src.*`, `bench.*`) and talk to bench.mock_groq instead of the real API, so
+they need neither network access nor a Groq key.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+GROQ_MCP_DIR = Path(__file__).resolve().parent.parent
+if str(GROQ_MCP_DIR) not in sys.path:
+    sys.path.insert(0, str(GROQ_MCP_DIR))
+
+
+@pytest.fixture
+def mock_groq(monkeypatch, tmp_path):
+    """
+    Factory: mock_groq(**state) starts a bench.mock_groq server and points
+    src.groq_stt at it, with the response cache off and fresh client pools.
+    """
+    from bench.mock_groq import MockGroqServer, MockState
+    from src import groq_stt, stt_cache, stt_scheduler
+
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("BASE_OUTPUT_PATH", str(tmp_path))
+    monkeypatch.setattr(stt_cache, "_cache", None)
+    monkeypatch.setattr(stt_cache, "_cache_disabled", True)
+    monkeypatch.setattr(stt_scheduler, "_scheduler", stt_scheduler.RequestScheduler())
+    groq_stt.close_clients()
+    servers = []
+
+    def start(**state) -> MockGroqServer:
+        server = MockGroqServer(state=MockState(**state))
+        server.start()
+        servers.append(server)
+        monkeypatch.setattr(groq_stt, "GROQ_API_BASE", server.base_url)
+        return server
+
+    yield start
+    groq_stt.close_clients()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
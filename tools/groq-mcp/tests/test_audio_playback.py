@@ -0,0 +1,166 @@
+"""Streaming playback on the null device, and the ring buffer behind it."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src.audio_playback import Playback, RingBuffer
+
+SAMPLERATE = 8000
+
+
+@pytest.fixture
+def wav(tmp_path):
+    """Factory: wav(seconds) writes a stereo 16-bit WAV and returns its path."""
+
+    def write(seconds: float):
+        frames = int(seconds * SAMPLERATE)
+        ramp = (np.arange(frames) % 30000).astype(np.int16)
+        path = tmp_path / f"tone-{seconds}.wav"
+        sf.write(path, np.stack([ramp, -ramp], axis=1), SAMPLERATE, subtype="PCM_16")
+        return path
+
+    return write
+
+
+def frames(start: int, count: int, channels: int = 1) -> np.ndarray:
+    return np.repeat(np.arange(start, start + count, dtype=np.float32)[:, None], channels, axis=1)
+
+
+# -- RingBuffer --------------------------------------------------------------
+
+def test_ring_buffer_wraps_around():
+    buffer = RingBuffer(5, 1)
+    assert buffer.write(frames(0, 3))
+    out = np.empty((2, 1), np.float32)
+    assert buffer.read_into(out) == 2
+    assert out[:, 0].tolist() == [0, 1]
+
+    # Four more frames: two fit at the end, two wrap to the start.
+    assert buffer.write(frames(3, 4))
+    out = np.empty((5, 1), np.float32)
+    assert buffer.read_into(out) == 5
+    assert out[:, 0].tolist() == [2, 3, 4, 5, 6]
+
+    # The read side wraps too, and a short read zero-fills the rest.
+    assert buffer.write(frames(7, 4))
+    out = np.full((6, 1), -1, np.float32)
+    assert buffer.read_into(out) == 4
+    assert out[:, 0].tolist() == [7, 8, 9, 10, 0, 0]
+
+
+def test_ring_buffer_blocks_writer_until_read():
+    buffer = RingBuffer(4, 2)
+    received = []
+
+    writer = threading.Thread(target=lambda: (buffer.write(frames(0, 50, 2)), buffer.close()))
+    writer.start()
+    out = np.empty((3, 2), np.float32)
+    deadline = time.monotonic() + 5
+    while not buffer.drained and time.monotonic() < deadline:
+        n = buffer.read_into(out)
+        received.extend(out[:n, 0].tolist())
+        assert out[:n, 1].tolist() == out[:n, 0].tolist()
+    writer.join(1)
+    assert received == list(range(50))
+
+
+def test_ring_buffer_cancel_releases_writer():
+    buffer = RingBuffer(4, 1)
+    result = []
+    writer = threading.Thread(target=lambda: result.append(buffer.write(frames(0, 10))))
+    writer.start()
+    time.sleep(0.05)
+    assert writer.is_alive()
+    buffer.cancel()
+    writer.join(1)
+    assert result == [False]
+    assert buffer.drained
+
+
+# -- Playback ----------------------------------------------------------------
+
+def test_plays_to_completion(wav):
+    path = wav(3.0)
+    playback = Playback(path, device="null", realtime=False, block_frames=256, buffer_seconds=0.1).start()
+    assert playback.wait(timeout=10)
+    assert not playback.active
+    assert playback.error is None
+    assert playback.frames_played == sf.info(str(path)).frames
+    assert playback.position == pytest.approx(3.0)
+    assert not playback._feeder.is_alive()
+
+
+def test_int16_playback(wav):
+    with Playback(wav(1.0), device="null", dtype="int16", realtime=False) as playback:
+        assert playback.wait(timeout=10)
+    assert playback.frames_played == SAMPLERATE
+
+
+def test_stop_mid_stream(wav):
+    playback = Playback(wav(30.0), device="null", block_frames=400, buffer_seconds=0.5).start()
+    deadline = time.monotonic() + 5
+    while playback.frames_played == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert playback.active
+    started = time.monotonic()
+    playback.stop()
+    assert time.monotonic() - started < 1.0
+    assert not playback.active
+    assert 0 < playback.position < 2.0
+    # The feeder was blocked on a full buffer; stopping must release it.
+    assert not playback._feeder.is_alive()
+    assert playback.wait(timeout=0)
+
+
+def test_double_stop(wav):
+    playback = Playback(wav(30.0), device="null").start()
+    playback.stop()
+    position = playback.position
+    playback.stop()
+    assert not playback.active
+    assert playback.position == position
+
+
+def test_stop_after_completion(wav):
+    playback = Playback(wav(0.5), device="null", realtime=False).start()
+    assert playback.wait(timeout=10)
+    playback.stop()
+    assert playback.frames_played == SAMPLERATE // 2
+
+
+def test_natural_drain_closes_the_device(wav):
+    # Nobody calls wait() or stop(): the stream must still be released.
+    playback = Playback(wav(0.5), device="null", realtime=False, block_frames=256).start()
+    stream = playback._stream
+    assert wait_for(lambda: playback.closed)
+    assert stream.closed
+    # The callback ended the stream; its thread is gone without a stop().
+    assert not stream._thread.is_alive()
+    assert not playback._feeder.is_alive()
+    assert playback.frames_played == SAMPLERATE // 2
+    assert playback.wait(timeout=0)
+
+
+def wait_for(check, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_play_audio_tool_is_cancellable(wav):
+    from src import utils
+
+    path = wav(30.0)
+    result = utils.play_audio(str(path), blocking=False, device="null")
+    assert result.text.startswith("Playing audio file")
+    assert utils.stop_audio().text.startswith("Stopped audio file")
+    assert utils.stop_audio().text == "No audio is playing"
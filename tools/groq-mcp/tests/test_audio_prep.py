@@ -0,0 +1,98 @@
+"""Compaction: lossy input is left alone, and silence trimming streams in blocks."""
+
+from __future__ import annotations
+
+import tracemalloc
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import audio_prep, vad
+from src.audio_source import AudioSource
+
+SPEECH = [(3.0, 7.0), (30.0, 31.5), (50.0, 58.0)]
+
+
+def recording(path, seconds: float = 70.0, samplerate: int = 44100, channels: int = 2, **kwargs):
+    """Low noise with tone bursts at SPEECH, written to `path`."""
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    signal = 0.001 * np.random.default_rng(0).standard_normal(len(t)).astype(np.float32)
+    for start, end in SPEECH:
+        inside = (t >= start) & (t < end)
+        signal[inside] += 0.3 * np.sin(2 * np.pi * 300 * t[inside]).astype(np.float32)
+    sf.write(path, np.repeat(signal[:, None], channels, axis=1), samplerate, **kwargs)
+    return AudioSource.from_path(path)
+
+
+def never(*args, **kwargs):
+    raise AssertionError("lossy input was decoded")
+
+
+@pytest.mark.parametrize("fmt,suffix", [("MP3", ".mp3"), ("OGG", ".ogg")])
+def test_lossy_input_is_not_decoded(fmt, suffix, tmp_path, monkeypatch):
+    if fmt not in sf.available_formats():
+        pytest.skip(f"libsndfile cannot write {fmt}")
+    source = recording(tmp_path / f"note{suffix}", seconds=5, format=fmt)
+    monkeypatch.setattr(audio_prep, "_mono_blocks", never)
+    assert audio_prep.prepare_audio(source) is None
+
+    # Recognised from the header too, when the name does not say.
+    source.rename("note.bin")
+    assert audio_prep.prepare_audio(source) is None
+
+
+def test_lossy_input_is_decoded_to_trim(tmp_path):
+    if "OGG" not in sf.available_formats():
+        pytest.skip("libsndfile cannot write OGG")
+    # Mono at 16 kHz: libsndfile's Vorbis encoder can crash on long stereo writes.
+    source = recording(tmp_path / "note.ogg", samplerate=16000, channels=1, format="OGG")
+    prepared = audio_prep.prepare_audio(source, trim_silence=True)
+    assert prepared is not None and prepared.seconds_removed > 30
+    prepared.upload.close()
+
+
+def test_wav_is_compacted(tmp_path):
+    source = recording(tmp_path / "note.wav", seconds=5, subtype="PCM_16")
+    prepared = audio_prep.prepare_audio(source)
+    assert prepared.upload.suffix == ".flac"
+    assert prepared.upload.size < source.size / 4
+    prepared.upload.close()
+
+
+def test_flac_at_target_rate_is_left_alone(tmp_path, monkeypatch):
+    source = recording(tmp_path / "note.flac", seconds=5, samplerate=16000, channels=1)
+    monkeypatch.setattr(audio_prep, "_mono_blocks", never)
+    assert audio_prep.prepare_audio(source) is None
+
+
+def test_streamed_trim_matches_whole_signal(tmp_path):
+    source = recording(tmp_path / "note.wav", subtype="FLOAT")
+    prepared = audio_prep.prepare_audio(source, trim_silence=True)
+
+    with sf.SoundFile(tmp_path / "note.wav") as sound:
+        whole = np.concatenate(list(audio_prep._mono_blocks(sound)))
+    expected = vad.trim_silence(whole, audio_prep.TARGET_SAMPLERATE)
+
+    assert prepared.seconds_removed == pytest.approx(expected.seconds_removed)
+    np.testing.assert_allclose(prepared.offset_map.trimmed_starts, expected.offset_map.trimmed_starts)
+    np.testing.assert_allclose(prepared.offset_map.original_starts, expected.offset_map.original_starts)
+    with prepared.upload.open() as reader:
+        uploaded, _ = sf.read(reader, dtype="float32")
+    # Equal up to the FLAC encoder's 16-bit quantisation.
+    np.testing.assert_allclose(uploaded, expected.samples, atol=2 / 32768)
+    prepared.upload.close()
+
+
+def test_trim_memory_does_not_grow_with_duration(tmp_path):
+    # Ten minutes: the decoded 16 kHz signal alone would be 38 MB of float32.
+    source = recording(tmp_path / "long.wav", seconds=600, samplerate=16000, channels=1, subtype="PCM_16")
+    tracemalloc.start()
+    try:
+        prepared = audio_prep.prepare_audio(source, trim_silence=True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert prepared.seconds_removed > 500
+    prepared.upload.close()
+    assert peak < 8 * 1024 * 1024, f"peak {peak / 1e6:.1f} MB"
@@ -0,0 +1,56 @@
+"""The shared clients keep connections to the API open across calls."""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from bench.stt_bench import make_sample
+from src import groq_stt
+
+
+@pytest.fixture
+def sample(tmp_path):
+    return str(make_sample(tmp_path, seconds=0.5))
+
+
+def transcribe(sample: str):
+    return groq_stt.transcribe_audio(sample, response_format="json", save_to_file=False)
+
+
+def test_sequential_calls_share_one_connection(mock_groq, sample):
+    server = mock_groq()
+    for _ in range(10):
+        assert "mock transcribe" in transcribe(sample).text
+    stats = server.state.stats()
+    assert stats["requests"] == 10
+    assert stats["connections"] == 1
+
+
+def test_concurrent_calls_stay_within_the_pool(mock_groq, sample, monkeypatch):
+    monkeypatch.setenv("GROQ_MAX_CONNECTIONS", "2")
+    server = mock_groq(latency_ms=50)
+    with concurrent.futures.ThreadPoolExecutor(6) as executor:
+        results = list(executor.map(lambda _: transcribe(sample), range(24)))
+    assert all("mock transcribe" in result.text for result in results)
+    stats = server.state.stats()
+    assert stats["requests"] == 24
+    assert stats["connections"] == 2
+
+
+def test_async_calls_share_one_connection(mock_groq, sample):
+    server = mock_groq()
+
+    async def run():
+        try:
+            for _ in range(6):
+                await groq_stt.transcribe_audio_async(sample, response_format="json", save_to_file=False)
+        finally:
+            await groq_stt.aclose_async_client()
+
+    asyncio.run(run())
+    stats = server.state.stats()
+    assert stats["requests"] == 6
+    assert stats["connections"] == 1
@@ -0,0 +1,17 @@
+"""Importing what the web.php fallback needs stays cheap and does not load heavy dependencies."""
+
+from __future__ import annotations
+
+import pytest
+
+from bench.import_budget import DEFAULT_BUDGET_MS, DEFAULT_MODULES, best_of
+
+
+@pytest.mark.parametrize("module", DEFAULT_MODULES)
+def test_import_budget(module):
+    total, loaded, slowest = best_of(module, runs=3)
+    assert not loaded, f"{module} imports {', '.join(loaded)} eagerly"
+    assert total <= DEFAULT_BUDGET_MS, (
+        f"importing {module} took {total:.1f} ms (budget {DEFAULT_BUDGET_MS:.0f} ms); slowest: "
+        + ", ".join(f"{name} {ms:.1f} ms" for ms, name in slowest)
+    )
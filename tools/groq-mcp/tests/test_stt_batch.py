@@ -0,0 +1,153 @@
+"""Batch resume: completed files are matched by resolved path, however the source was spelled."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import shutil
+import threading
+from pathlib import Path
+
+import pytest
+
+from bench.stt_bench import make_sample
+from src import stt_batch
+from src.stt_cache import hash_file
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    """Three short WAVs in tmp_path/recordings, each with different audio."""
+    directory = tmp_path / "recordings"
+    directory.mkdir()
+    for n in range(3):
+        shutil.copy(make_sample(tmp_path, seconds=0.5 + 0.1 * n), directory / f"note-{n}.wav")
+    return directory
+
+
+def run(source, output) -> dict:
+    return asyncio.run(stt_batch.transcribe_many(str(source), str(output), concurrency=2, progress=False))
+
+
+def records(output) -> list[dict]:
+    return [json.loads(line) for line in output.read_text().splitlines()]
+
+
+def test_resume_with_another_spelling_of_the_source(mock_groq, recordings, tmp_path, monkeypatch):
+    server = mock_groq()
+    output = tmp_path / "out.jsonl"
+
+    monkeypatch.chdir(recordings)
+    assert run("*.wav", output)["done"] == 3
+    assert sorted(r["path"] for r in records(output)) == [str(recordings / f"note-{n}.wav") for n in range(3)]
+
+    # The same files through an absolute path, from elsewhere, and through a symlink.
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "link").symlink_to(recordings)
+    for source in (recordings, "recordings", tmp_path / "link", "link/*.wav"):
+        summary = run(source, output)
+        assert (summary["done"], summary["skipped"]) == (0, 3), source
+    assert server.state.stats()["requests"] == 3
+
+
+def test_resume_reads_relative_records(mock_groq, recordings, tmp_path, monkeypatch):
+    server = mock_groq()
+    output = tmp_path / "out.jsonl"
+    # A record written before paths were resolved.
+    output.write_text(json.dumps({"path": "recordings/note-0.wav", "ok": True, "text": ""}) + "\n")
+
+    monkeypatch.chdir(tmp_path)
+    summary = run(recordings, output)
+    assert (summary["done"], summary["skipped"]) == (2, 1)
+    assert server.state.stats()["requests"] == 2
+
+
+def test_failed_files_are_retried(mock_groq, recordings, tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text(json.dumps({"path": str(recordings / "note-0.wav"), "ok": False, "error": "x"}) + "\n")
+    mock_groq()
+    summary = run(recordings, output)
+    assert (summary["done"], summary["skipped"]) == (3, 0)
+
+
+def test_crash_never_marks_unstored_files_done(mock_groq, recordings, tmp_path, monkeypatch):
+    from src.transcript_store import TranscriptStore
+
+    mock_groq()
+    output, db = tmp_path / "out.jsonl", tmp_path / "t.db"
+    transcribe_one = stt_batch._transcribe_one
+    calls = []
+
+    async def crash_on_third(path, options, store=None):
+        calls.append(path)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return await transcribe_one(path, options, store)
+
+    def killed(store):
+        # A killed process never gets to write the rows still buffered.
+        store._pending.clear()
+        store._conn.close()
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        patch.setattr(stt_batch, "_transcribe_one", crash_on_third)
+        patch.setattr(TranscriptStore, "close", killed)
+        asyncio.run(stt_batch.transcribe_many(str(recordings), str(output), concurrency=1, progress=False,
+                                              store_path=str(db)))
+
+    def stored() -> set:
+        with TranscriptStore(db) as store:
+            return {row["source_name"] for row in store._conn.execute("SELECT source_name FROM transcripts")}
+
+    def done() -> set:
+        return {Path(r["path"]).name for r in records(output) if r["ok"]} if output.exists() else set()
+
+    assert done() <= stored()
+
+    summary = asyncio.run(stt_batch.transcribe_many(str(recordings), str(output), concurrency=1, progress=False,
+                                                    store_path=str(db)))
+    assert summary["done"] + summary["skipped"] == 3
+    assert done() == stored() == {f"note-{n}.wav" for n in range(3)}
+
+
+def test_reading_files_stays_off_the_event_loop(mock_groq, recordings, tmp_path, monkeypatch):
+    from src import groq_stt
+    from src.audio_source import AudioSource
+
+    mock_groq()
+    loop_thread = threading.get_ident()
+    readers = []
+    prepare, sha256 = groq_stt._prepare_transcription, AudioSource.sha256
+
+    def record_thread(func):
+        def wrapper(*args, **kwargs):
+            readers.append((func.__name__, threading.get_ident()))
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(groq_stt, "_prepare_transcription", record_thread(prepare))
+    monkeypatch.setattr(AudioSource, "sha256", record_thread(sha256))
+    summary = asyncio.run(stt_batch.transcribe_many(str(recordings), str(tmp_path / "out.jsonl"), progress=False,
+                                                    store_path=str(tmp_path / "t.db")))
+
+    assert summary["done"] == 3
+    assert {name for name, _ in readers} == {"_prepare_transcription", "sha256"}
+    assert loop_thread not in {thread for _, thread in readers}
+    assert {r["audio_hash"] for r in records(tmp_path / "out.jsonl")} == {
+        hash_file(recordings / f"note-{n}.wav") for n in range(3)
+    }
+
+
+def test_result_entry_point(mock_groq, recordings):
+    from src import groq_stt
+
+    mock_groq()
+    path = recordings / "note-0.wav"
+    result = asyncio.run(groq_stt.transcribe_audio_result_async(str(path), response_format="verbose_json",
+                                                                with_hash=True))
+    assert isinstance(result.payload, dict) and "text" in result.payload
+    assert result.data["response_format"] == "verbose_json"
+    assert (result.source_name, result.audio_hash) == ("note-0.wav", hash_file(path))
+
+    text = asyncio.run(groq_stt.transcribe_audio_result_async(str(path), response_format="text"))
+    assert isinstance(text.payload, str) and text.audio_hash is None
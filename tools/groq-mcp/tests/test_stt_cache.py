@@ -0,0 +1,89 @@
+"""Response cache: opt-in, and entries expire after GROQ_STT_CACHE_MAX_AGE."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+import pytest
+
+from src import stt_cache
+from src.stt_cache import TranscriptionCache
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch, tmp_path):
+    """Reset the process-wide cache and point GROQ_STT_CACHE_DIR into tmp_path."""
+    monkeypatch.setattr(stt_cache, "_cache", None)
+    monkeypatch.setattr(stt_cache, "_cache_disabled", False)
+    monkeypatch.setenv("GROQ_STT_CACHE_DIR", str(tmp_path / "cache"))
+    for name in ("GROQ_STT_CACHE", "GROQ_STT_CACHE_MAX_AGE"):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path / "cache"
+
+
+def entries(directory) -> list:
+    return sorted(p.name for p in directory.rglob("*.json"))
+
+
+def test_off_by_default(fresh_cache):
+    assert stt_cache.get_cache() is None
+    assert not fresh_cache.exists()
+
+
+def test_opt_in_with_default_max_age(fresh_cache, monkeypatch):
+    monkeypatch.setenv("GROQ_STT_CACHE", "1")
+
+    cache = stt_cache.get_cache()
+    assert cache is not None
+    assert cache.directory == fresh_cache
+    assert cache.max_age == stt_cache.DEFAULT_MAX_AGE > 0
+
+
+def test_max_age_from_environment(fresh_cache, monkeypatch):
+    monkeypatch.setenv("GROQ_STT_CACHE", "1")
+    monkeypatch.setenv("GROQ_STT_CACHE_MAX_AGE", "60")
+    assert stt_cache.get_cache().max_age == 60
+
+
+def test_expired_entry_is_a_miss_and_removed(tmp_path, monkeypatch):
+    cache = TranscriptionCache(tmp_path, max_age=60)
+    cache.put("ab" * 32, "application/json", '{"text": "hi"}')
+    assert cache.get("ab" * 32)["body"] == '{"text": "hi"}'
+
+    # Reading keeps the entry recently used but does not extend its life.
+    stored = time.time()
+    monkeypatch.setattr(stt_cache.time, "time", lambda: stored + 61)
+    assert cache.get("ab" * 32) is None
+    assert entries(tmp_path) == []
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 1, 1)
+
+
+def test_entry_without_stored_at_counts_as_expired(tmp_path):
+    cache = TranscriptionCache(tmp_path, max_age=60)
+    path = cache._entry_path("cd" * 32)
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({"content_type": "application/json", "body": "{}"}))
+    assert cache.get("cd" * 32) is None
+
+
+def test_no_max_age_keeps_entries(tmp_path, monkeypatch):
+    cache = TranscriptionCache(tmp_path, max_age=0)
+    cache.put("ef" * 32, "application/json", "{}")
+    stored = time.time()
+    monkeypatch.setattr(stt_cache.time, "time", lambda: stored + 10 * 365 * 86400)
+    assert cache.get("ef" * 32) is not None
+
+
+def test_store_purges_entries_nobody_reads(tmp_path):
+    cache = TranscriptionCache(tmp_path, max_age=60)
+    cache.put("01" * 32, "application/json", "{}")
+    old = cache._entry_path("01" * 32)
+    past = time.time() - 120
+    os.utime(old, (past, past))
+
+    # A fresh process purges on its first store, even under the byte budget.
+    TranscriptionCache(tmp_path, max_age=60).put("02" * 32, "application/json", "{}")
+    assert entries(tmp_path) == ["02" * 32 + ".json"]
@@ -0,0 +1,116 @@
+"""Chunking: cuts land in quiet frames, and overlaps are stitched at their midpoint without repeats."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src.stt_chunking import merge_chunk_results, plan_chunks
+
+SAMPLERATE = 16000
+QUIET = [(8.5, 8.7), (17.2, 17.4)]
+
+
+@pytest.fixture
+def sound(tmp_path):
+    """25 s of loud noise with two short silences at QUIET."""
+    signal = 0.3 * np.random.default_rng(0).standard_normal(25 * SAMPLERATE).astype(np.float32)
+    for start, end in QUIET:
+        signal[int(start * SAMPLERATE):int(end * SAMPLERATE)] = 0.0
+    sf.write(tmp_path / "long.wav", signal, SAMPLERATE, subtype="FLOAT")
+    with sf.SoundFile(tmp_path / "long.wav") as sound:
+        yield sound
+
+
+def test_cuts_move_to_the_quiet_frames(sound):
+    bounds = plan_chunks(sound, chunk_seconds=10, overlap_seconds=1, search_seconds=3)
+
+    assert len(bounds) == 3
+    assert bounds[0][0] == 0 and bounds[-1][1] == sound.frames
+    for (start, end), (next_start, _) in zip(bounds, bounds[1:]):
+        assert end - next_start == SAMPLERATE
+    for (_, end), (quiet_start, quiet_end) in zip(bounds, QUIET):
+        assert quiet_start * SAMPLERATE <= end <= quiet_end * SAMPLERATE
+
+
+def test_short_file_is_one_chunk(sound):
+    assert plan_chunks(sound, chunk_seconds=60, overlap_seconds=1, search_seconds=3) == [(0, sound.frames)]
+
+
+def test_overlap_must_be_shorter_than_a_chunk(sound):
+    with pytest.raises(ValueError):
+        plan_chunks(sound, chunk_seconds=1, overlap_seconds=1, search_seconds=1)
+
+
+# Two chunks, 0-10 s and 9-20 s: the overlap 9-10 s is cut at 9.5 s.
+BOUNDS = [(0.0, 10.0), (9.0, 20.0)]
+FIRST = {
+    "language": "english",
+    "text": "Hello world. We went over there.",
+    "segments": [
+        {"id": 0, "start": 0.0, "end": 5.0, "text": " Hello world."},
+        {"id": 1, "start": 5.0, "end": 9.8, "text": " We went over there."},
+    ],
+    "words": [
+        {"word": "Hello", "start": 0.5, "end": 0.9},
+        {"word": "world", "start": 1.0, "end": 1.4},
+        {"word": "over", "start": 9.2, "end": 9.4},
+        {"word": "there", "start": 9.45, "end": 9.8},
+    ],
+}
+SECOND = {
+    "language": "english",
+    "text": "over there. Now we are done.",
+    "segments": [
+        # Midpoint 9.4 s: before the cut, so the first chunk's copy wins.
+        {"id": 0, "start": 0.0, "end": 0.8, "text": " over there."},
+        {"id": 1, "start": 0.8, "end": 6.0, "text": " Now we are done."},
+    ],
+    "words": [
+        {"word": "over", "start": 0.2, "end": 0.4},
+        # Heard again just after the cut: the same word, shifted by 70 ms.
+        {"word": "There", "start": 0.52, "end": 0.8},
+        {"word": "Now", "start": 1.0, "end": 1.2},
+        {"word": "done", "start": 3.0, "end": 3.4},
+    ],
+}
+
+
+def test_merge_cuts_the_overlap_at_its_midpoint():
+    merged = merge_chunk_results([FIRST, SECOND], BOUNDS)
+
+    assert [(s["id"], s["start"], s["end"], s["text"]) for s in merged["segments"]] == [
+        (0, 0.0, 5.0, " Hello world."),
+        (1, 5.0, 9.8, " We went over there."),
+        (2, 9.8, 15.0, " Now we are done."),
+    ]
+    assert merged["text"] == "Hello world. We went over there. Now we are done."
+    assert (merged["duration"], merged["chunks"], merged["language"]) == (20.0, 2, "english")
+
+
+def test_merge_drops_a_word_repeated_across_the_cut():
+    merged = merge_chunk_results([FIRST, SECOND], BOUNDS)
+    assert [(w["word"], w["start"]) for w in merged["words"]] == [
+        ("Hello", 0.5), ("world", 1.0), ("over", 9.2), ("there", 9.45), ("Now", 10.0), ("done", 12.0),
+    ]
+
+
+def test_merge_keeps_a_repeat_further_apart():
+    first = {"words": [{"word": "no", "start": 9.0, "end": 9.3}]}
+    second = {"words": [{"word": "no", "start": 0.9, "end": 1.2}]}
+    merged = merge_chunk_results([first, second], BOUNDS)
+    assert [(w["word"], w["start"]) for w in merged["words"]] == [("no", 9.0), ("no", 9.9)]
+    assert merged["text"] == "no no"
+
+
+def test_merge_plain_text_chunks():
+    merged = merge_chunk_results([{"text": " first part "}, {"text": "second part"}], BOUNDS)
+    assert merged["text"] == "first part second part"
+    assert merged["segments"] == [] and "words" not in merged
+
+
+def test_merge_leaves_inputs_alone():
+    merge_chunk_results([FIRST, SECOND], BOUNDS)
+    assert SECOND["segments"][1] == {"id": 1, "start": 0.8, "end": 6.0, "text": " Now we are done."}
+    assert SECOND["words"][2]["start"] == 1.0
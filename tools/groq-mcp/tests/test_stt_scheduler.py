@@ -0,0 +1,81 @@
+"""Rate-limit scheduling: unmetered defaults and pacing from the x-ratelimit-* headers."""
+
+from __future__ import annotations
+
+import time
+
+import httpx
+
+from src import stt_scheduler
+from src.stt_scheduler import RequestScheduler
+
+
+def quota(limit: int, remaining: int, reset: str, status: int = 200) -> httpx.Response:
+    return httpx.Response(status, headers={
+        "x-ratelimit-limit-requests": str(limit),
+        "x-ratelimit-remaining-requests": str(remaining),
+        "x-ratelimit-reset-requests": reset,
+    })
+
+
+def test_unmetered_by_default(monkeypatch):
+    monkeypatch.delenv("GROQ_RATE_RPM", raising=False)
+    monkeypatch.delenv("GROQ_RATE_AUDIO_SECONDS", raising=False)
+    monkeypatch.setattr(stt_scheduler, "_scheduler", None)
+
+    scheduler = stt_scheduler.get_scheduler()
+    assert scheduler.requests.unlimited and scheduler.audio.unlimited
+    started = time.monotonic()
+    for _ in range(100):
+        scheduler.acquire(audio_seconds=600)
+    assert time.monotonic() - started < 0.5
+
+
+def test_explicit_limits_still_meter(monkeypatch):
+    monkeypatch.setenv("GROQ_RATE_RPM", "30")
+    monkeypatch.setattr(stt_scheduler, "_scheduler", None)
+
+    scheduler = stt_scheduler.get_scheduler()
+    assert scheduler.requests.capacity == 30
+    for _ in range(30):
+        assert scheduler._try_take(0) == 0
+    assert scheduler._try_take(0) > 0
+
+
+def test_plenty_remaining_does_not_pace():
+    scheduler = RequestScheduler()
+    scheduler.observe(quota(14400, 14000, "2m0s"))
+    assert scheduler.pace_interval == 0
+    assert scheduler._try_take(0) == 0
+    assert scheduler._try_take(0) == 0
+
+
+def test_low_remaining_spreads_requests_over_the_reset():
+    scheduler = RequestScheduler()
+    scheduler.observe(quota(100, 5, "10s"))
+    assert scheduler.pace_interval == 2.0
+    assert scheduler.stats()["pace_interval_s"] == 2.0
+
+    assert scheduler._try_take(0) == 0
+    wait = scheduler._try_take(0)
+    assert 1.9 < wait <= 2.0
+
+    # A fresh window lifts the pacing straight away.
+    scheduler.observe(quota(100, 99, "59s"))
+    assert scheduler.pace_interval == 0
+    assert scheduler._try_take(0) == 0
+
+
+def test_exhausted_limit_pauses_until_reset():
+    scheduler = RequestScheduler()
+    scheduler.observe(quota(100, 0, "1.5s", status=429))
+    assert scheduler.throttled == 1
+    assert 1.4 < scheduler._try_take(0) <= 1.5
+
+
+def test_missing_or_malformed_headers_are_ignored():
+    scheduler = RequestScheduler()
+    scheduler.observe(httpx.Response(200))
+    scheduler.observe(quota(100, "lots", "soon"))
+    assert scheduler.pace_interval == 0
+    assert scheduler.blocked_until == 0
@@ -0,0 +1,68 @@
+"""Incremental transcription: the reader stops with the run, and bad layouts are errors."""
+
+from __future__ import annotations
+
+import io
+import struct
+import threading
+import time
+
+import pytest
+
+from src import stt_stream
+from src.stt_stream import StreamingTranscriber
+from src.utils import MCPError
+
+
+class EndlessSilence:
+    """A live input that never ends: 16-bit PCM zeros, a little at a time."""
+
+    def __init__(self):
+        self.reads = 0
+
+    def read(self, n: int) -> bytes:
+        self.reads += 1
+        time.sleep(0.001)
+        return bytes(min(n, 4096))
+
+    read1 = read
+
+
+def readers() -> list:
+    return [t for t in threading.enumerate() if t.name == "stt-stream-reader"]
+
+
+def wav_header(channels: int, samplerate: int = 16000) -> bytes:
+    fmt = struct.pack("<HHIIHH", 1, channels, samplerate, samplerate * channels * 2, channels * 2, 16)
+    return b"RIFF" + struct.pack("<I", 0) + b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + bytes(4)
+
+
+def test_failed_step_stops_the_reader(monkeypatch):
+    def fail(self, window, final):
+        raise MCPError("upload failed")
+
+    monkeypatch.setattr(StreamingTranscriber, "_step", fail)
+    stream = EndlessSilence()
+    with pytest.raises(MCPError, match="upload failed"):
+        StreamingTranscriber(lambda event: None).run(stream, "pcm")
+    assert readers() == []
+    reads = stream.reads
+    time.sleep(0.05)
+    assert stream.reads == reads
+
+
+@pytest.mark.parametrize("samplerate,channels", [(16000, 0), (0, 1), (16000, -2)])
+def test_invalid_pcm_layout_is_rejected(samplerate, channels):
+    with pytest.raises(MCPError, match="Invalid"):
+        StreamingTranscriber(lambda event: None).run(io.BytesIO(bytes(64)), "pcm", samplerate, channels)
+    assert readers() == []
+
+
+def test_wav_without_channels_is_rejected():
+    with pytest.raises(MCPError, match="Invalid channel count: 0"):
+        stt_stream.read_wav_header(io.BytesIO(wav_header(channels=0) + bytes(64)))
+
+    events = []
+    with pytest.raises(MCPError, match="Invalid channel count"):
+        StreamingTranscriber(events.append).run(io.BytesIO(wav_header(channels=0) + bytes(64)), "wav")
+    assert events == []
@@ -0,0 +1,70 @@
+"""Worker hardening: jobs cannot write files, and the socket is private from the start."""
+
+from __future__ import annotations
+
+import os
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+
+from bench.stt_bench import make_sample
+from conftest import GROQ_MCP_DIR
+from src import stt_worker
+
+
+@pytest.mark.parametrize("arg", ["output_directory", "save_to_file"])
+def test_output_arguments_are_rejected(arg, tmp_path):
+    job = {"action": "transcribe", "args": {"input_file_path": "/dev/null", arg: True}}
+    assert stt_worker.run_job(job) == {"ok": False, "error": f"unsupported arguments: {arg}"}
+
+
+def test_jobs_never_save(mock_groq, tmp_path):
+    mock_groq()
+    sample = make_sample(tmp_path, seconds=0.5)
+    before = set(tmp_path.iterdir())
+    reply = stt_worker.run_job({"action": "transcribe", "args": {"input_file_path": str(sample)}})
+    assert reply["ok"], reply
+    # BASE_OUTPUT_PATH is tmp_path; nothing was written there.
+    assert set(tmp_path.iterdir()) == before
+
+
+def start_worker(socket_path) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "src.stt_worker", "--socket", str(socket_path), "--log-level", "WARNING"],
+        cwd=GROQ_MCP_DIR, env=dict(os.environ, GROQ_API_KEY="test"), stderr=subprocess.PIPE, text=True,
+    )
+
+
+def test_socket_is_created_private(tmp_path):
+    socket_path = tmp_path / "run" / "groq-stt.sock"
+    worker = start_worker(socket_path)
+    try:
+        deadline = time.monotonic() + 15
+        while not socket_path.exists():
+            assert worker.poll() is None and time.monotonic() < deadline, worker.stderr.read()
+            time.sleep(0.02)
+        assert stat.S_IMODE(socket_path.stat().st_mode) == 0o660
+        assert stat.S_IMODE(socket_path.parent.stat().st_mode) & 0o027 == 0
+    finally:
+        worker.terminate()
+        worker.wait(10)
+
+
+def test_refuses_a_shared_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o1777)
+    worker = start_worker(shared / "groq-stt.sock")
+    assert worker.wait(15) == 1
+    assert "not writable by others" in worker.stderr.read()
+
+
+def test_only_replaces_a_stale_socket(tmp_path):
+    socket_path = tmp_path / "groq-stt.sock"
+    socket_path.write_text("not a socket")
+    with pytest.raises(stt_worker.MCPError):
+        stt_worker.prepare_socket_dir(str(socket_path))
+    assert socket_path.read_text() == "not a socket"
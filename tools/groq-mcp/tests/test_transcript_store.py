@@ -0,0 +1,127 @@
+"""Transcript store: upserts keep the FTS index in step, search ranks hits, lookups and the CLI."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+
+import pytest
+
+from src import transcript_store
+from src.stt_cache import hash_file
+from src.transcript_store import TranscriptStore, make_record
+from src.utils import MCPError
+
+PARAMS = {"model": "whisper-large-v3-turbo", "response_format": "json"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    with TranscriptStore(tmp_path / "transcripts.db") as store:
+        yield store
+
+
+def record(audio_hash: str, text: str, params: dict = PARAMS, name: str = "note.wav", **extra) -> dict:
+    return dict(make_record(audio_hash, "transcribe", params, {"text": text}, name), **extra)
+
+
+def ids(hits) -> list:
+    return [hit["audio_hash"] for hit in hits]
+
+
+def test_upsert_replaces_row_and_index(store):
+    first = store.put(record("a" * 64, "the quarterly report is late"))
+    second = store.put(record("a" * 64, "the budget review moved to friday"))
+
+    assert first == second
+    assert store.stats()["transcripts"] == 1
+    assert store.search("quarterly") == []
+    assert ids(store.search("budget")) == ["a" * 64]
+    # The FTS table holds exactly one entry for the row, with the new text.
+    fts = store._conn.execute("SELECT rowid, text FROM transcripts_fts").fetchall()
+    assert [tuple(row) for row in fts] == [(first, "the budget review moved to friday")]
+
+
+def test_other_params_are_another_row(store):
+    store.put(record("a" * 64, "hello there"))
+    store.put(record("a" * 64, "hello there", dict(PARAMS, language="en")))
+    assert len(store.lookup("a" * 64)) == 2
+    assert store.get("a" * 64, "transcribe", dict(PARAMS, language="en"))["params"]["language"] == "en"
+    assert store.get("a" * 64, "translate", PARAMS) is None
+
+
+def test_search_ranks_best_match_first(store):
+    store.put(record("1" * 64, "a long meeting about many things where the invoice came up once " * 3))
+    store.put(record("2" * 64, "invoice invoice overdue invoice"))
+    store.put(record("3" * 64, "nothing relevant here"))
+    store.put(record("4" * 64, "the invoice is overdue", dict(PARAMS, model="whisper-large-v3")))
+
+    hits = store.search("invoice")
+    assert ids(hits) == ["2" * 64, "4" * 64, "1" * 64]
+    assert hits[0]["rank"] <= hits[1]["rank"] <= hits[2]["rank"]
+    assert "[invoice]" in hits[0]["snippet"]
+    assert ids(store.search("invoice", limit=1)) == ["2" * 64]
+    assert ids(store.search("invoice", model="whisper-large-v3")) == ["4" * 64]
+    assert ids(store.search('"invoice is overdue"')) == ["4" * 64]
+    # Source names are indexed too.
+    store.put(record("5" * 64, "unrelated", name="standup-monday.wav"))
+    assert ids(store.search("standup")) == ["5" * 64]
+
+
+def test_invalid_query_is_an_mcp_error(store):
+    with pytest.raises(MCPError):
+        store.search('"unbalanced')
+
+
+def test_lookup_newest_first(store):
+    store.put(record("a" * 64, "old", created_at=1.0))
+    store.put(record("a" * 64, "new", dict(PARAMS, model="whisper-large-v3"), created_at=2.0))
+    store.put(record("b" * 64, "other audio"))
+
+    assert [row["text"] for row in store.lookup("a" * 64)] == ["new", "old"]
+    assert [row["text"] for row in store.lookup("a" * 64, model="whisper-large-v3")] == ["new"]
+    assert store.lookup("c" * 64) == []
+
+
+def test_add_writes_in_batches(tmp_path):
+    with TranscriptStore(tmp_path / "t.db", batch_size=3) as store:
+        for n in range(4):
+            store.add(record(f"{n}" * 64, f"text {n}"))
+        assert store.pending == 1
+        assert store.stats()["transcripts"] == 3
+        store.flush()
+        assert store.pending == 0
+        assert store.stats()["transcripts"] == 4
+
+
+def test_failed_batch_stays_pending(tmp_path):
+    store = TranscriptStore(tmp_path / "t.db", batch_size=2)
+    store.add(record("a" * 64, "kept"))
+    broken = record("b" * 64, "broken")
+    broken["text"] = None  # violates NOT NULL
+    with pytest.raises(sqlite3.IntegrityError):
+        store.add(broken)
+    assert store.pending == 2
+    assert store.stats()["transcripts"] == 0
+    store._pending.pop()
+    store.close()
+    with TranscriptStore(tmp_path / "t.db") as store:
+        assert [row["text"] for row in store.lookup("a" * 64)] == ["kept"]
+
+
+def test_cli_search_and_lookup(tmp_path, capsys):
+    audio = tmp_path / "note.wav"
+    audio.write_bytes(b"RIFF not really audio")
+    db = tmp_path / "t.db"
+    with TranscriptStore(db) as store:
+        store.put(record(hash_file(audio), "call the plumber tomorrow"))
+
+    transcript_store.main(["--db", str(db), "search", "plumber"])
+    hits = json.loads(capsys.readouterr().out)
+    assert [hit["snippet"] for hit in hits] == ["call the [plumber] tomorrow"]
+
+    transcript_store.main(["--db", str(db), "lookup", str(audio)])
+    assert [row["text"] for row in json.loads(capsys.readouterr().out)] == ["call the plumber tomorrow"]
+
+    transcript_store.main(["--db", str(db), "stats"])
+    assert json.loads(capsys.readouterr().out)["transcripts"] == 1
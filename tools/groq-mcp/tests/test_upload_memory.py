@@ -0,0 +1,80 @@
+"""Large uploads stream from disk or a spool instead of being held in memory."""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import subprocess
+import sys
+from pathlib import Path
+
+from conftest import GROQ_MCP_DIR
+
+INPUT_BYTES = 500 * 1024 * 1024
+# Peak RSS may grow by this much over a small warm-up upload.
+RSS_BUDGET = 64 * 1024 * 1024
+
+# Runs in a fresh interpreter so the peak RSS is the client's alone.
+CHILD = """
+import sys, json, asyncio, resource
+from src import groq_stt
+
+small, big = sys.argv[1:]
+options = dict(response_format="json", save_to_file=False, preprocess=False)
+
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+groq_stt.transcribe_audio(small, **options)
+baseline = peak()
+results = {}
+# Only the first call consults the cache (and so hashes the input); the
+# others would be cache hits.
+results["path"] = groq_stt.transcribe_audio(big, **options).text
+options["use_cache"] = False
+with open(big, "rb") as pipe:
+    results["stream"] = groq_stt.transcribe_audio(pipe, filename="big.wav", **options).text
+results["async"] = asyncio.run(groq_stt.transcribe_audio_async(big, **options)).text
+print(json.dumps({"growth": peak() - baseline, "results": results}))
+"""
+
+
+def sparse_wav(path: Path, size: int) -> Path:
+    """A 16 kHz mono PCM WAV of `size` bytes whose samples are a hole in the file."""
+    data = size - 44
+    header = b"RIFF" + struct.pack("<I", size - 8) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, 16000, 32000, 2, 16)
+    header += b"data" + struct.pack("<I", data)
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(size)
+    return path
+
+
+def test_large_upload_keeps_memory_flat(mock_groq, tmp_path):
+    server = mock_groq()
+    small = sparse_wav(tmp_path / "small.wav", 64 * 1024)
+    big = sparse_wav(tmp_path / "big.wav", INPUT_BYTES)
+    env = dict(
+        os.environ,
+        GROQ_API_BASE=server.base_url,
+        # The cache hashes the upload, so the hashing pass is covered too.
+        GROQ_STT_CACHE="1",
+        GROQ_STT_CACHE_DIR=str(tmp_path / "cache"),
+        TMPDIR=str(tmp_path),
+    )
+
+    child = subprocess.run(
+        [sys.executable, "-c", CHILD, str(small), str(big)],
+        cwd=GROQ_MCP_DIR, env=env, capture_output=True, text=True, timeout=300,
+    )
+    assert child.returncode == 0, child.stderr
+    report = json.loads(child.stdout.splitlines()[-1])
+
+    # The mock reports the size of the multipart body it received.
+    for how, text in report["results"].items():
+        assert text.startswith("mock transcribe of "), (how, text)
+        assert int(text.split()[3]) > INPUT_BYTES, (how, text)
+    assert server.state.stats()["requests"] == 4
+    assert report["growth"] < RSS_BUDGET, f"peak RSS grew by {report['growth'] / 2**20:.0f} MiB"
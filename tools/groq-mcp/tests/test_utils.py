@@ -0,0 +1,85 @@
+"""Similar-file lookup: the directory index goes two levels deep and is rebuilt when a directory changes."""
+
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+
+import pytest
+
+from src import utils
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    """Recordings at depths 0 to 3 under tmp_path/root, with an empty index cache."""
+    monkeypatch.setattr(utils, "_directory_indexes", OrderedDict())
+    root = tmp_path / "root"
+    deepest = root / "one" / "two" / "three"
+    deepest.mkdir(parents=True)
+    for directory, name in [(root, "meeting-0.wav"), (root / "one", "meeting-1.mp3"),
+                            (root / "one" / "two", "meeting-2.flac"), (deepest, "meeting-3.wav")]:
+        (directory / name).write_bytes(b"")
+    (root / "one" / "cover.png").write_bytes(b"")
+    (root / "notes.txt").write_bytes(b"")
+    return root
+
+
+def names(index, kind: str = "audio") -> list[str]:
+    return sorted(index.files[kind][0])
+
+
+def bump_mtime(directory) -> None:
+    """Move a directory's mtime on by a second, so coarse timestamps cannot hide a change."""
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_index_stops_at_depth_two(tree):
+    index = utils.DirectoryIndex(str(tree))
+    assert names(index) == ["meeting-0.wav", "meeting-1.mp3", "meeting-2.flac"]
+    assert names(index, "image") == ["cover.png"]
+    assert str(tree / "one" / "two" / "three") not in index.dir_mtimes
+
+    assert names(utils.DirectoryIndex(str(tree), max_depth=0)) == ["meeting-0.wav"]
+    assert names(utils.DirectoryIndex(str(tree), max_depth=3))[-1] == "meeting-3.wav"
+
+
+def test_index_is_reused_until_a_directory_changes(tree):
+    index = utils.get_directory_index(tree)
+    assert utils.get_directory_index(tree) is index
+
+    # A change below the depth limit is not part of the index.
+    (tree / "one" / "two" / "three" / "meeting-4.wav").write_bytes(b"")
+    bump_mtime(tree / "one" / "two" / "three")
+    assert utils.get_directory_index(tree) is index
+
+    (tree / "one" / "two" / "meeting-5.wav").write_bytes(b"")
+    bump_mtime(tree / "one" / "two")
+    assert not index.is_current()
+    rebuilt = utils.get_directory_index(tree)
+    assert rebuilt is not index and "meeting-5.wav" in names(rebuilt)
+    assert utils.get_directory_index(tree) is rebuilt
+
+    (tree / "one" / "meeting-1.mp3").rename(tree / "one" / "standup-1.mp3")
+    bump_mtime(tree / "one")
+    assert names(utils.get_directory_index(tree)) == ["meeting-0.wav", "meeting-2.flac", "meeting-5.wav", "standup-1.mp3"]
+
+
+def test_removed_directory_invalidates(tree):
+    index = utils.get_directory_index(tree)
+    for path in (tree / "one" / "two" / "three").iterdir():
+        path.unlink()
+    (tree / "one" / "two" / "three").rmdir()
+    (tree / "one" / "two" / "meeting-2.flac").unlink()
+    (tree / "one" / "two").rmdir()
+    assert not index.is_current()
+    assert "meeting-2.flac" not in names(utils.get_directory_index(tree))
+
+
+def test_similar_filenames_cover_subdirectories(tree):
+    matches = utils.find_similar_filenames("meeting-2.wav", tree, threshold=50, kind="audio")
+    assert {path.name for path, _ in matches} == {"meeting-0.wav", "meeting-1.mp3", "meeting-2.flac"}
+    assert matches[0][1] >= matches[-1][1]
+    assert utils.try_find_similar_files("meeting-2.wav", tree, take_n=1) == [matches[0][0]]
+    assert utils.try_find_similar_files("cover.jpg", tree, check_image=True) == [tree / "one" / "cover.png"]
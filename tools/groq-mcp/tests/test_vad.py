@@ -0,0 +1,97 @@
+"""Offset mapping: timestamps on the trimmed audio land back on the original timeline."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from src import vad
+
+SAMPLERATE = 16000
+# Speech kept at 1-3 s, 5-6 s and 10-12 s; the trimmed audio is 5 s long and
+# its spans start at 0, 2 and 3 s.
+SPANS = [(1 * SAMPLERATE, 3 * SAMPLERATE), (5 * SAMPLERATE, 6 * SAMPLERATE), (10 * SAMPLERATE, 12 * SAMPLERATE)]
+GAPS = [(3.0, 5.0), (6.0, 10.0)]
+
+
+@pytest.fixture
+def offset_map():
+    return vad.offset_map_for(SPANS, SAMPLERATE)
+
+
+def test_map_from_spans(offset_map):
+    np.testing.assert_array_equal(offset_map.trimmed_starts, [0.0, 2.0, 3.0])
+    np.testing.assert_array_equal(offset_map.original_starts, [1.0, 5.0, 10.0])
+
+
+@pytest.mark.parametrize("t,start,end", [
+    (0.0, 1.0, 1.0),
+    (0.5, 1.5, 1.5),
+    # Exactly on an edge: a start opens the next span, an end closes the previous one.
+    (2.0, 5.0, 3.0),
+    (3.0, 10.0, 6.0),
+    (2.5, 5.5, 5.5),
+    (5.0, 12.0, 12.0),
+])
+def test_span_edges(offset_map, t, start, end):
+    assert offset_map.to_original(t) == pytest.approx(start)
+    assert offset_map.to_original(t, is_end=True) == pytest.approx(end)
+
+
+def test_nothing_maps_into_a_removed_gap(offset_map):
+    times = np.linspace(0, 5, 5001)
+    for is_end in (False, True):
+        mapped = offset_map.to_original(times, is_end)
+        assert np.all(np.diff(mapped) >= 0)
+        for low, high in GAPS:
+            assert not np.any((mapped > low) & (mapped < high)), (is_end, low, high)
+        # Only starts land on a gap's far edge, only ends on its near edge.
+        lands_on = set(np.round(mapped, 6)) & {3.0, 5.0, 6.0, 10.0}
+        assert lands_on == ({3.0, 6.0} if is_end else {5.0, 10.0})
+
+
+def test_outside_the_trimmed_audio(offset_map):
+    assert offset_map.to_original(-0.25) == pytest.approx(0.75)
+    assert offset_map.to_original(5.5, is_end=True) == pytest.approx(12.5)
+
+
+def test_remap_verbose_json(offset_map):
+    payload = {
+        "text": "one two three",
+        "duration": 5.0,
+        "segments": [{"id": 0, "start": 0.2, "end": 2.0, "text": "one two"}, {"id": 1, "start": 3.0, "end": 4.25, "text": "three"}],
+        "words": [
+            {"word": "one", "start": 0.2, "end": 1.0},
+            {"word": "two", "start": 1.5, "end": 2.0},
+            {"word": "three", "start": 3.0, "end": 4.25},
+            {"word": "?", "start": None, "end": "n/a"},
+        ],
+    }
+    remapped = vad.remap_verbose_json(payload, offset_map)
+
+    assert [(s["start"], s["end"]) for s in remapped["segments"]] == [(1.2, 3.0), (10.0, 11.25)]
+    assert [(w["start"], w["end"]) for w in remapped["words"]] == [(1.2, 2.0), (2.5, 3.0), (10.0, 11.25), (None, "n/a")]
+    assert remapped["text"] == payload["text"] and remapped["duration"] == 5.0
+    # The input is left as it was.
+    assert payload["segments"][0]["end"] == 2.0 and payload["words"][2]["start"] == 3.0
+
+
+def test_remap_without_timestamps(offset_map):
+    assert vad.remap_verbose_json({"text": "hi"}, offset_map) == {"text": "hi"}
+    assert vad.remap_verbose_json({"text": "", "segments": []}, offset_map) == {"text": "", "segments": []}
+
+
+def test_trim_silence_round_trip():
+    t = np.arange(8 * SAMPLERATE) / SAMPLERATE
+    signal = 0.001 * np.random.default_rng(0).standard_normal(len(t)).astype(np.float32)
+    burst = (t >= 5.0) & (t < 6.0)
+    signal[burst] += 0.3 * np.sin(2 * np.pi * 300 * t[burst]).astype(np.float32)
+
+    result = vad.trim_silence(signal, SAMPLERATE)
+    assert result.seconds_removed > 5
+
+    # The burst's first loud sample maps back to where it was recorded.
+    def first_loud(samples) -> float:
+        return int(np.argmax(np.abs(samples) > 0.1)) / SAMPLERATE
+
+    assert result.offset_map.to_original(first_loud(result.samples)) == pytest.approx(first_loud(signal))